@@ -0,0 +1,118 @@
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, NamedTuple
+
+
+class Alert(NamedTuple):
+    alert_id: int
+    user_id: int
+    symbol: str
+    direction: str
+    threshold: float
+
+    def triggered_by(self, price: float) -> bool:
+        return price > self.threshold if self.direction == '>' else price < self.threshold
+
+
+class SymbolAlerts:
+    """Пороги одного символа в двух отсортированных списках.
+
+    Хранятся только ещё не сработавшие условия, поэтому при новой цене
+    срабатывает хвост каждого списка: для "<" - пороги выше цены, для ">" -
+    пороги ниже цены (они лежат с обратным знаком, чтобы тоже быть хвостом).
+    Поиск границы - bisect, удаление хвоста - O(k).
+    """
+
+    __slots__ = ('below_keys', 'below_ids', 'above_keys', 'above_ids')
+
+    def __init__(self):
+        self.below_keys: List[float] = []
+        self.below_ids: List[int] = []
+        self.above_keys: List[float] = []
+        self.above_ids: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.below_ids) + len(self.above_ids)
+
+    def _lists(self, alert: Alert):
+        if alert.direction == '>':
+            return self.above_keys, self.above_ids, -alert.threshold
+        return self.below_keys, self.below_ids, alert.threshold
+
+    def extend(self, alerts: Iterable[Alert]):
+        """Массовая загрузка: одна сортировка вместо вставки по одному"""
+        for direction, keys, ids in (('<', self.below_keys, self.below_ids), ('>', self.above_keys, self.above_ids)):
+            sign = -1 if direction == '>' else 1
+            pairs = list(zip(keys, ids))
+            pairs.extend((sign * alert.threshold, alert.alert_id) for alert in alerts if alert.direction == direction)
+            pairs.sort()
+            keys[:] = [key for key, _ in pairs]
+            ids[:] = [alert_id for _, alert_id in pairs]
+
+    def add(self, alert: Alert):
+        keys, ids, key = self._lists(alert)
+        i = bisect_right(keys, key)
+        keys.insert(i, key)
+        ids.insert(i, alert.alert_id)
+
+    def remove(self, alert: Alert):
+        keys, ids, key = self._lists(alert)
+        i = bisect_left(keys, key)
+        while ids[i] != alert.alert_id:
+            i += 1
+        del keys[i], ids[i]
+
+    def pop_triggered(self, price: float) -> List[int]:
+        fired = []
+        for keys, ids, key in ((self.below_keys, self.below_ids, price),
+                               (self.above_keys, self.above_ids, -price)):
+            i = bisect_right(keys, key)
+            if i < len(keys):
+                fired.extend(ids[i:])
+                del keys[i:], ids[i:]
+        return fired
+
+
+class AlertEngine:
+    """Ценовые оповещения пользователей, проверка за O(log n + k) на символ.
+
+    Списки оповещений по пользователям движок не держит - они нужны только
+    командам /alerts и читаются из базы.
+    """
+
+    def __init__(self):
+        self.alerts: Dict[int, Alert] = {}
+        self.by_symbol: Dict[str, SymbolAlerts] = {}
+
+    def __len__(self) -> int:
+        return len(self.alerts)
+
+    def load(self, alerts: Iterable[Alert]):
+        by_symbol: Dict[str, List[Alert]] = {}
+        for alert in alerts:
+            self.alerts[alert.alert_id] = alert
+            by_symbol.setdefault(alert.symbol, []).append(alert)
+        for symbol, symbol_alerts in by_symbol.items():
+            self.by_symbol.setdefault(symbol, SymbolAlerts()).extend(symbol_alerts)
+
+    def add(self, alert: Alert):
+        self.alerts[alert.alert_id] = alert
+        self.by_symbol.setdefault(alert.symbol, SymbolAlerts()).add(alert)
+
+    def remove(self, alert_id: int) -> Alert:
+        alert = self.alerts[alert_id]
+        symbol_alerts = self.by_symbol[alert.symbol]
+        symbol_alerts.remove(alert)
+        if not symbol_alerts:
+            del self.by_symbol[alert.symbol]
+        del self.alerts[alert_id]
+        return alert
+
+    def check(self, symbol: str, price: float) -> List[Alert]:
+        """Сработавшие при цене price оповещения; они удаляются из движка"""
+        symbol_alerts = self.by_symbol.get(symbol)
+        if symbol_alerts is None:
+            return []
+        fired = [self.alerts.pop(alert_id) for alert_id in symbol_alerts.pop_triggered(price)]
+        if not symbol_alerts:
+            del self.by_symbol[symbol]
+        return fired
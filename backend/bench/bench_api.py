@@ -0,0 +1,262 @@
+"""Набор замеров всех эндпоинтов API с сохранением результатов в JSON.
+
+База создаётся generate_dataset.py (--start..--end, по умолчанию 14 лет) или
+берётся готовая (--db). Каждая конфигурация сервиса запускается в отдельном
+процессе, чтобы флаги окружения читались при импорте и пиковый RSS считался
+отдельно:
+
+    sqlite       RATE_STORE=0 RESPONSE_CACHE=0 - чтение из SQLite в пуле потоков
+    store        RATE_STORE=1 RESPONSE_CACHE=0 - снимок курсов в памяти
+    store+cache  RATE_STORE=1 RESPONSE_CACHE=1 - как в бою
+
+Сценарий - один эндпоинт с меняющимися параметрами (случайными, но
+одинаковыми между запусками при одном --seed). --concurrency клиентов
+отправляют --requests запросов через httpx.ASGITransport в том же процессе;
+печатаются запросов/с, p50/p99 и пиковый RSS процесса (ru_maxrss) после
+сценария.
+
+Результаты с коммитом и параметрами пишутся в --output; с --compare
+печатается сравнение с прежним файлом, и падение запросов/с больше чем на
+--threshold % отмечается как регрессия (код выхода 1).
+
+    python bench/bench_api.py --output before.json
+    python bench/bench_api.py --output after.json --compare before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from generate_dataset import CURRENCIES, create_database, trading_days  # noqa: E402
+
+CONFIGS = {
+    "sqlite": {"RATE_STORE": "0", "RESPONSE_CACHE": "0"},
+    "store": {"RATE_STORE": "1", "RESPONSE_CACHE": "0"},
+    "store+cache": {"RATE_STORE": "1", "RESPONSE_CACHE": "1"},
+}
+CODES = [code for code, *_ in CURRENCIES]
+POPULAR = ["USD", "EUR", "CNY", "GBP", "JPY", "KZT", "TRY", "AMD"]
+
+
+def api_date(day: date) -> str:
+    return day.strftime("%d/%m/%Y")
+
+
+def scenarios(first: date, last: date, rng: random.Random) -> dict:
+    """Сценарий -> функция, возвращающая (метод, путь, тело) очередного запроса"""
+    days = list(trading_days(first, last))
+
+    def random_day(margin: int = 0) -> date:
+        return days[rng.randrange(margin, len(days))]
+
+    def batch(size: int) -> list:
+        return [{"from_currency": rng.choice(POPULAR), "to_currency": rng.choice(CODES),
+                 "amount": 100, "date": api_date(random_day())} for _ in range(size)]
+
+    return {
+        "currencies": lambda: ("GET", "/api/currencies", None),
+        "currency": lambda: ("GET", f"/api/currencies/{rng.choice(CODES)}", None),
+        "currency_as_of": lambda: ("GET", f"/api/currencies/{rng.choice(CODES)}?as_of={api_date(random_day())}", None),
+        "history_30d": lambda: ("GET", f"/api/currencies/{rng.choice(POPULAR)}/history?days=30", None),
+        "history_365d": lambda: ("GET", f"/api/currencies/{rng.choice(POPULAR)}/history?days=365", None),
+        "history_range_1y": lambda: (lambda end: (
+            "GET", f"/api/currencies/{rng.choice(CODES)}/history_range"
+                   f"?start={api_date(end - timedelta(days=365))}&end={api_date(end)}", None))(random_day(300)),
+        "history_range_all_auto": lambda: (
+            "GET", f"/api/currencies/{rng.choice(POPULAR)}/history_range"
+                   f"?start={api_date(first)}&end={api_date(last)}&resolution=auto", None),
+        "convert": lambda: ("GET", f"/api/convert?from_currency={rng.choice(POPULAR)}"
+                                   f"&to_currency={rng.choice(CODES)}&amount=100", None),
+        "convert_as_of": lambda: ("GET", f"/api/convert?from_currency={rng.choice(POPULAR)}"
+                                         f"&to_currency={rng.choice(CODES)}&amount=100&as_of={api_date(random_day())}",
+                                  None),
+        "convert_batch_100": lambda: ("POST", "/api/convert/batch", batch(100)),
+        "crossrates": lambda: ("GET", "/api/crossrates", None),
+        "as_of_bulk": lambda: ("POST", "/api/currencies/as_of",
+                               {"codes": rng.sample(POPULAR, 4), "dates": [api_date(random_day()) for _ in range(50)]}),
+    }
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run_scenario(client, make_request, requests: int, concurrency: int, warmup: int) -> dict:
+    # Параметры всех запросов готовятся заранее, чтобы их построение не попадало в замер
+    planned = [make_request() for _ in range(warmup + requests)]
+    for method, path, body in planned[:warmup]:
+        response = await client.request(method, path, json=body)
+        assert response.status_code == 200, (path, response.status_code, response.text[:200])
+
+    samples = []
+    queue = iter(planned[warmup:])
+
+    async def worker():
+        for method, path, body in queue:
+            started = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            samples.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, (path, response.status_code, response.text[:200])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    samples.sort()
+    return {
+        "requests": len(samples),
+        "rps": len(samples) / elapsed,
+        "p50_ms": statistics.median(samples),
+        "p99_ms": samples[max(0, int(len(samples) * 0.99) - 1)],
+        "max_ms": samples[-1],
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def child_main(args, first: date, last: date) -> dict:
+    import logging
+
+    import httpx
+    import main
+
+    logging.disable(logging.INFO)
+    main.DatabaseManager.init()
+    if main.RATE_STORE_ENABLED:
+        main.CurrencyService.reload_store()
+    results = {"rss_after_load_mb": peak_rss_mb(), "scenarios": {}}
+    selected = scenarios(first, last, random.Random(args.seed))
+    names = args.scenarios.split(",") if args.scenarios else list(selected)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name in names:
+            results["scenarios"][name] = await run_scenario(
+                client, selected[name], args.requests, args.concurrency, args.warmup)
+    main.DatabaseManager.close()
+    return results
+
+
+def git_revision() -> dict:
+    root = Path(__file__).resolve().parents[2]
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> int:
+    """Печатает изменения относительно baseline; результат - число регрессий"""
+    print(f"\nсравнение с {baseline['meta'].get('commit') or 'прежним запуском'}")
+    print(f"{'конфигурация / сценарий':<40}{'запросов/с':>26}{'p99, мс':>22}")
+    regressions = 0
+    for config, result in current["results"].items():
+        old_config = baseline["results"].get(config)
+        if old_config is None:
+            continue
+        for name, new in result["scenarios"].items():
+            old = old_config["scenarios"].get(name)
+            if old is None:
+                continue
+            change = (new["rps"] / old["rps"] - 1) * 100
+            mark = ""
+            if change < -threshold:
+                regressions += 1
+                mark = "  регрессия"
+            print(f"{config + ' / ' + name:<40}{old['rps']:>9.0f} -> {new['rps']:<7.0f}{change:+5.0f}%"
+                  f"{old['p99_ms']:>9.2f} -> {new['p99_ms']:<9.2f}{mark}")
+    return regressions
+
+
+def main_process(args):
+    first, last = date(args.start, 1, 1), date(args.end, 12, 31)
+    tmp = None
+    if args.db:
+        db_path = args.db
+    else:
+        tmp = tempfile.TemporaryDirectory()
+        db_path = Path(tmp.name) / "currency.db"
+        started = time.perf_counter()
+        rows = create_database(db_path, "iso", first, last, args.seed)
+        print(f"база {args.start}-{args.end}: {rows} строк, {len(CURRENCIES)} валют, "
+              f"{time.perf_counter() - started:.1f} с")
+
+    configs = args.configs.split(",")
+    report = {
+        "meta": {
+            **git_revision(),
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "dataset": {"start": args.start, "end": args.end, "seed": args.seed,
+                        "db": str(args.db) if args.db else None},
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "results": {},
+    }
+    for config in configs:
+        env = dict(os.environ, CURRENCY_DB=str(db_path), **CONFIGS[config])
+        command = [sys.executable, __file__, "--child", "--start", str(args.start), "--end", str(args.end),
+                   "--seed", str(args.seed), "--requests", str(args.requests),
+                   "--concurrency", str(args.concurrency), "--warmup", str(args.warmup)]
+        if args.scenarios:
+            command += ["--scenarios", args.scenarios]
+        output = subprocess.run(command, env=env, capture_output=True, text=True)
+        if output.returncode:
+            print(output.stderr, file=sys.stderr)
+            raise SystemExit(f"конфигурация {config} завершилась с ошибкой")
+        result = json.loads(output.stdout.splitlines()[-1])
+        report["results"][config] = result
+
+        print(f"\n{config}: {args.concurrency} клиентов, по {args.requests} запросов, "
+              f"RSS после загрузки {result['rss_after_load_mb']:.0f} МБ")
+        print(f"{'сценарий':<26}{'запросов/с':>12}{'p50, мс':>10}{'p99, мс':>10}{'RSS, МБ':>10}")
+        for name, row in result["scenarios"].items():
+            print(f"{name:<26}{row['rps']:>12.0f}{row['p50_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['peak_rss_mb']:>10.0f}")
+
+    if args.output:
+        args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+        print(f"\nрезультаты записаны в {args.output}")
+    regressions = 0
+    if args.compare:
+        regressions = compare(report, json.loads(args.compare.read_text()), args.threshold)
+    if tmp is not None:
+        tmp.cleanup()
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", type=Path, help="готовая база вместо сгенерированной")
+    parser.add_argument("--start", type=int, default=2012, help="первый год базы")
+    parser.add_argument("--end", type=int, default=2025, help="последний год базы")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--configs", default=",".join(CONFIGS), help="через запятую: " + ", ".join(CONFIGS))
+    parser.add_argument("--scenarios", help="через запятую, по умолчанию все")
+    parser.add_argument("--requests", type=int, default=2000, help="запросов на сценарий")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--output", type=Path, help="файл для результатов в JSON")
+    parser.add_argument("--compare", type=Path, help="JSON прежнего запуска для сравнения")
+    parser.add_argument("--threshold", type=float, default=10, help="падение запросов/с, %%, считающееся регрессией")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(child_main(args, date(args.start, 1, 1), date(args.end, 12, 31)))))
+    else:
+        sys.exit(main_process(args))
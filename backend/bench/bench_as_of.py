@@ -0,0 +1,127 @@
+"""Проверка и замер запросов as_of через ASGI-клиент httpx.
+
+В наборе generate_dataset курсов нет по воскресеньям, понедельникам и
+1-8 января, как у ЦБ. На такие даты должен отдаваться курс последнего дня
+с курсом: воскресенье и понедельник - субботний, новогодние праздники -
+курс конца декабря. Ответы /api/currencies/{code}?as_of=, /api/convert?as_of=
+и POST /api/currencies/as_of сверяются с выборкой из таблицы currency; затем
+--dates дат по нескольким валютам разрешаются одним пакетным запросом и
+отдельными запросами.
+
+    python bench/bench_as_of.py --dates 5000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from generate_dataset import create_database  # noqa: E402
+
+START, END = date(2012, 1, 10), date(2025, 12, 27)
+CODES = ["USD", "EUR", "CNY", "JPY", "RUB"]
+
+
+def expected(conn, code: str, day: date):
+    """(дата курса, курс) за последний день с курсом не позже day"""
+    if code == "RUB":
+        return day, 1.0
+    row = conn.execute("""
+        SELECT date, value / nominal FROM currency
+        WHERE currency_code = ? AND date <= ? ORDER BY date DESC LIMIT 1
+    """, (code, day.isoformat())).fetchone()
+    return (date.fromisoformat(row[0]), row[1]) if row else (None, None)
+
+
+def label(day):
+    return f"{day:%d/%m/%Y}" if day else None
+
+
+async def run(main, conn, args):
+    rng = random.Random(3)
+    days = [START + timedelta(days=rng.randrange((END - START).days + 30)) for _ in range(args.dates)]
+    sunday = date(2024, 3, 10)
+    monday, new_year = sunday + timedelta(days=1), date(2024, 1, 5)
+    days += [sunday, monday, new_year, START - timedelta(days=5)]
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Выходные и праздники: курс последнего дня с курсом
+        for day, rate_day in ((sunday, date(2024, 3, 9)), (monday, date(2024, 3, 9)), (new_year, date(2023, 12, 30))):
+            body = (await client.get("/api/currencies/USD", params={"as_of": label(day)})).json()
+            assert body["last_updated"].startswith(rate_day.isoformat()), (day, body)
+            assert abs(body["rate"] - expected(conn, "USD", day)[1]) < 1e-9, body
+        body = (await client.get("/api/convert", params={"from_currency": "EUR", "to_currency": "USD",
+                                                         "amount": 10, "as_of": label(sunday)})).json()
+        rate = expected(conn, "EUR", sunday)[1] / expected(conn, "USD", sunday)[1]
+        assert abs(body["rate"] - rate) < 1e-9, body
+        missing = await client.get("/api/currencies/USD", params={"as_of": label(START - timedelta(days=5))})
+        assert missing.status_code == 404, missing.text
+        future = await client.get("/api/convert", params={"from_currency": "USD", "to_currency": "EUR", "amount": 1,
+                                                          "as_of": label(date.today() + timedelta(days=2))})
+        assert future.status_code == 400, future.text
+
+        payload = {"codes": CODES, "dates": [label(day) for day in days]}
+        response = await client.post("/api/currencies/as_of", json=payload)
+        assert response.status_code == 200, response.text
+        body = response.json()
+        assert body["dates"] == payload["dates"]
+        for item in body["currencies"]:
+            for day, rate_date, rate in zip(days, item["rate_dates"], item["rates"]):
+                rate_day, expected_rate = expected(conn, item["code"], day)
+                assert rate_date == label(rate_day), (item["code"], day, rate_date)
+                assert rate == expected_rate or abs(rate - expected_rate) < 1e-9, (item["code"], day, rate)
+        unknown = await client.post("/api/currencies/as_of", json={"codes": ["XXX"], "dates": ["01/02/2020"]})
+        assert unknown.status_code == 404, unknown.text
+        print(f"{len(days)} дат x {len(CODES)} валют, выходные, праздники и даты до начала данных разрешены верно")
+
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            await client.post("/api/currencies/as_of", json=payload)
+        bulk = (time.perf_counter() - started) / args.repeat
+
+        sample = days[:args.single]
+        started = time.perf_counter()
+        for day in sample:
+            await client.get("/api/currencies/USD", params={"as_of": label(day)})
+        single = (time.perf_counter() - started) / len(sample)
+
+    lookups = len(days) * len(CODES)
+    print(f"POST /api/currencies/as_of     {bulk * 1000:8.1f} мс на {lookups} курсов ({bulk / lookups * 1e6:.1f} мкс/курс)")
+    print(f"GET /api/currencies/{{code}}     {single * 1e6:8.0f} мкс на курс отдельным запросом")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dates", type=int, default=5000)
+    parser.add_argument("--single", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    db_path = Path(tmp.name) / "currency.db"
+    create_database(db_path, "iso", START, END)
+    os.environ.update(CURRENCY_DB=str(db_path), RESPONSE_CACHE="0")
+
+    import logging  # noqa: E402
+    import main  # noqa: E402
+
+    logging.disable(logging.INFO)
+    main.DatabaseManager.init()
+    conn = sqlite3.connect(db_path)
+    for mode in ("SQLite", "RateStore"):
+        if mode == "RateStore":
+            main.CurrencyService.reload_store()
+        print(f"--- {mode}")
+        asyncio.run(run(main, conn, args))
+    conn.close()
+    tmp.cleanup()
@@ -0,0 +1,137 @@
+"""Нагрузочный тест кэша ответов API через ASGI-клиент httpx в одном процессе.
+
+Запросы к /api/currencies, /api/currencies/{code}, /history и /history_range
+по разным валютам идут в --concurrency параллельных клиентов. Замер
+выполняется без кэша, с кэшем и с If-None-Match (ответы 304). Перед замером
+проверяется, что ответы из кэша совпадают с ответами без кэша, что после
+загрузки новых курсов кэш сбрасывается, и что кэш держится в пределах
+max_bytes, вытесняя давно не запрошенные ответы.
+
+    python bench/bench_cache.py --requests 20000 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from generate_dataset import create_database  # noqa: E402
+
+CODES = ("USD", "EUR", "CNY", "GBP", "JPY", "KZT", "TRY", "AMD")
+
+
+def make_paths():
+    paths = ["/api/currencies"]
+    for code in CODES:
+        paths += [
+            f"/api/currencies/{code}",
+            f"/api/currencies/{code}/history?days=30",
+            f"/api/currencies/{code}/history?days=365",
+            f"/api/currencies/{code}/history_range?start=01/01/2020&end=31/12/2020",
+        ]
+    return paths
+
+
+async def load(client, paths, total: int, concurrency: int, etags=None):
+    queue = iter(range(total))
+    statuses = {}
+
+    async def worker():
+        for i in queue:
+            path = paths[i % len(paths)]
+            headers = {"If-None-Match": etags[path]} if etags else None
+            response = await client.get(path, headers=headers)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return total / (time.perf_counter() - started), statuses
+
+
+def check_limits(main):
+    """Бюджет по байтам, LRU и пропуск слишком больших тел"""
+    cache = main.ResponseCache(main.UPDATE_TRIGGER, max_bytes=1000, max_entry_bytes=400)
+    for i in range(4):
+        cache.put((0, f"/{i}", ""), b"x" * 300)
+        cache.get((0, "/0", ""))
+    assert list(cache.entries) == [(0, "/2", ""), (0, "/3", ""), (0, "/0", "")], list(cache.entries)
+    assert cache.size == 900
+    cache.put((0, "/big", ""), b"x" * 401)
+    assert (0, "/big", "") not in cache.entries and cache.size == 900
+    cache.invalidate()
+    assert cache.size == 0
+    print("кэш: бюджет по байтам, LRU и пропуск больших ответов работают")
+
+
+async def run(main, args):
+    paths = make_paths()
+    cache = main.response_cache
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        cache.enabled = False
+        plain = {path: (await client.get(path)).content for path in paths}
+        cache.enabled = True
+        first = {path: await client.get(path) for path in paths}
+        cached = {path: await client.get(path) for path in paths}
+        for path in paths:
+            assert first[path].status_code == cached[path].status_code == 200, path
+            assert first[path].content == cached[path].content == plain[path], path
+            assert first[path].headers["etag"] == cached[path].headers["etag"]
+        assert cache.hits == len(paths), (cache.hits, cache.misses)
+        max_age = int(cached[paths[0]].headers["cache-control"].rsplit("=", 1)[1])
+        assert 0 < max_age <= 12 * 3600, max_age
+        etags = {path: cached[path].headers["etag"] for path in paths}
+        not_modified = await client.get(paths[1], headers={"If-None-Match": etags[paths[1]]})
+        assert not_modified.status_code == 304 and not not_modified.content
+
+        # Новые курсы за последний день: ответы по USD меняются, кэш сброшен
+        with main.DatabaseManager.connection() as conn:
+            last_date, name, value, nominal = conn.execute(
+                "SELECT date, currency_name, value, nominal FROM currency "
+                "WHERE currency_code = 'USD' ORDER BY date DESC LIMIT 1").fetchone()
+        main.CurrencyService.upsert_rates([(last_date, "USD", name, value + 1, nominal)])
+        assert not cache.entries
+        changed = await client.get("/api/currencies/USD")
+        assert changed.headers["etag"] != etags["/api/currencies/USD"]
+        unchanged = await client.get("/api/currencies/EUR", headers={"If-None-Match": etags["/api/currencies/EUR"]})
+        assert unchanged.status_code == 304, "ETag неизменившегося ответа должен пережить загрузку"
+        etags = {path: (await client.get(path)).headers["etag"] for path in paths}
+        print(f"{len(paths)} адресов: ответы из кэша совпадают, max-age {max_age} с, сброс после загрузки работает")
+
+        results = {}
+        cache.enabled = False
+        results["без кэша"] = await load(client, paths, args.requests, args.concurrency)
+        cache.enabled = True
+        results["кэш"] = await load(client, paths, args.requests, args.concurrency)
+        results["кэш + If-None-Match"] = await load(client, paths, args.requests, args.concurrency, etags)
+
+    print(f"\n{args.requests} запросов, {args.concurrency} параллельных клиентов")
+    for name, (rps, statuses) in results.items():
+        print(f"{name:<22}{rps:>10.0f} запросов/с   {statuses}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    db_path = Path(tmp.name) / "currency.db"
+    create_database(db_path, "iso", date(2012, 1, 1), date(2025, 12, 31))
+    os.environ["CURRENCY_DB"] = str(db_path)
+
+    import main  # noqa: E402
+
+    main.DatabaseManager.init()
+    main.CurrencyService.reload_store()
+    check_limits(main)
+    asyncio.run(run(main, args))
+    tmp.cleanup()
@@ -0,0 +1,162 @@
+"""Параллельные запросы к API при чтении из SQLite (RATE_STORE=0, RESPONSE_CACHE=0).
+
+1. Лёгкие запросы /api/currencies/{code} идут в --concurrency клиентов, пока
+   --heavy клиентов запрашивают историю за 10 лет. Печатаются запросов/с и
+   p50/p99 лёгких запросов: если обработчики блокируют цикл событий, лёгкие
+   запросы ждут тяжёлые.
+2. Загрузка курсов за год (upsert_rates в отдельном потоке, как у задачи
+   планировщика), пока --concurrency клиентов запрашивают курсы: при записи
+   без WAL читатели ждут блокировку файла БД.
+3. Запуск сервиса (startup), когда ЦБ отвечает с задержкой --upstream-latency:
+   один клиент всё это время запрашивает курс, печатается максимальная
+   задержка его ответа.
+
+Приложение вызывается в процессе через httpx.ASGITransport.
+
+    python bench/bench_concurrency.py --concurrency 16 --heavy 4
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from cbr_stub import CbrStub  # noqa: E402
+from generate_dataset import create_database, generate_rows  # noqa: E402
+
+CODES = ("USD", "EUR", "CNY", "GBP", "JPY", "KZT", "TRY", "AMD")
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[max(0, int(len(samples) * 0.99) - 1)]
+
+
+async def mixed_load(client, duration: float, concurrency: int, heavy: int):
+    deadline = time.perf_counter() + duration
+    light_samples = []
+    heavy_count = 0
+    end = date.today() - timedelta(days=1)
+    heavy_path = f"/api/currencies/USD/history_range?start={end - timedelta(days=3650):%d/%m/%Y}&end={end:%d/%m/%Y}"
+
+    # Время ответа считается с момента постановки запроса, вместе с ожиданием
+    # в цикле событий: sleep(0) отдаёт управление, как сокет у настоящего сервера
+    async def light_worker(i):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await asyncio.sleep(0)
+            response = await client.get(f"/api/currencies/{CODES[i % len(CODES)]}")
+            assert response.status_code == 200, response.text
+            light_samples.append((time.perf_counter() - started) * 1000)
+            i += 1
+
+    async def heavy_worker():
+        nonlocal heavy_count
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(0)
+            response = await client.get(heavy_path)
+            assert response.status_code == 200, response.text
+            heavy_count += 1
+
+    await asyncio.gather(*(light_worker(i) for i in range(concurrency)), *(heavy_worker() for _ in range(heavy)))
+    p50, p99 = percentiles(light_samples)
+    return len(light_samples) / duration, p50, p99, heavy_count / duration
+
+
+async def write_probe(main, client, concurrency: int):
+    """Задержки чтения, пока в отдельном потоке идёт запись курсов за год"""
+    end = date.today() - timedelta(days=1)
+    rows = [(day.isoformat(), code, name, value * 1.001, nominal)
+            for day, code, name, value, nominal in generate_rows(end - timedelta(days=365), end)]
+    samples = []
+    writer = asyncio.create_task(asyncio.to_thread(main.CurrencyService.upsert_rates, rows))
+    started = time.perf_counter()
+
+    async def reader(i):
+        while not writer.done():
+            requested = time.perf_counter()
+            await asyncio.sleep(0)
+            response = await client.get(f"/api/currencies/{CODES[i % len(CODES)]}")
+            assert response.status_code == 200, response.text
+            samples.append((time.perf_counter() - requested) * 1000)
+            i += 1
+
+    await asyncio.gather(writer, *(reader(i) for i in range(concurrency)))
+    p50, p99 = percentiles(samples)
+    return len(rows), time.perf_counter() - started, len(samples), p50, p99, max(samples)
+
+
+async def startup_probe(main, client):
+    """Максимальная задержка запроса, пока идёт запуск и начальное обновление"""
+    samples = []
+
+    async def probe():
+        while True:
+            # Запрос запланирован через 10 мс; задержка считается от этого момента
+            planned = time.perf_counter() + 0.01
+            await asyncio.sleep(0.01)
+            await client.get("/api/currencies/USD")
+            samples.append((time.perf_counter() - planned) * 1000)
+            background = getattr(main.app.state, "initial_update", None)
+            if startup.done() and (background is None or background.done()):
+                return
+
+    started = time.perf_counter()
+    probe_task = asyncio.create_task(probe())
+    startup = asyncio.create_task(main.startup())
+    await asyncio.gather(startup, probe_task)
+    ready = time.perf_counter() - started
+    return ready, max(samples), len(samples)
+
+
+async def run(main, args):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        rps, p50, p99, heavy_rps = await mixed_load(client, args.duration, args.concurrency, args.heavy)
+        print(f"{args.concurrency} клиентов /api/currencies/{{code}} + {args.heavy} клиентов истории за 10 лет, "
+              f"{args.duration:.0f} с")
+        print(f"  лёгкие: {rps:8.0f} запросов/с, p50 {p50:.2f} мс, p99 {p99:.2f} мс; тяжёлые: {heavy_rps:.1f} запросов/с")
+
+        rows, elapsed, count, p50, p99, worst = await write_probe(main, client, args.concurrency)
+        print(f"запись {rows} курсов за {elapsed:.1f} с; чтение за это время: {count} запросов, "
+              f"p50 {p50:.2f} мс, p99 {p99:.2f} мс, максимум {worst:.0f} мс")
+
+        ready, worst, count = await startup_probe(main, client)
+        print(f"запуск при задержке ЦБ {args.upstream_latency:.1f} с: обновление завершено за {ready:.1f} с, "
+              f"{count} запросов, максимальная задержка ответа {worst:.0f} мс")
+    if hasattr(main, "shutdown"):
+        await main.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--heavy", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--upstream-latency", type=float, default=2.0)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    db_path = Path(tmp.name) / "currency.db"
+    yesterday = date.today() - timedelta(days=1)
+    create_database(db_path, "iso", yesterday - timedelta(days=3650), yesterday)
+    os.environ.update(CURRENCY_DB=str(db_path), RATE_STORE="0", RESPONSE_CACHE="0")
+
+    import logging  # noqa: E402
+    import main  # noqa: E402
+
+    logging.disable(logging.INFO)
+    main.DatabaseManager.init()
+    with CbrStub(generate_rows(yesterday - timedelta(days=10), date.today()), latency=args.upstream_latency) as stub:
+        main.CBR_URL = stub.daily_url
+        main.CBR_DYNAMIC_URL = stub.dynamic_url
+        asyncio.run(run(main, args))
+    tmp.cleanup()
@@ -0,0 +1,139 @@
+"""Проверка и замер /api/convert/batch и /api/crossrates через ASGI-клиент httpx.
+
+Результаты пакетной конвертации сверяются с расчётом по таблице currency
+(с RUB как базой и датами "не позже"), матрица кросс-курсов - с курсами
+пар. Затем сравнивается время --pairs конвертаций отдельными запросами
+/api/convert и одним пакетом.
+
+    python bench/bench_convert.py --pairs 5000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from generate_dataset import create_database  # noqa: E402
+
+
+def expected_rate(conn, code: str, iso_date: str):
+    """Рублей за единицу валюты за последний день с курсами не позже iso_date"""
+    if code == "RUB":
+        return 1.0
+    day = conn.execute("SELECT MAX(date) FROM currency WHERE date <= ?", (iso_date,)).fetchone()[0]
+    row = conn.execute("SELECT value / nominal FROM currency WHERE currency_code = ? AND date = ?",
+                       (code, day)).fetchone()
+    return row[0] if row else None
+
+
+def close(a: float, b: float) -> bool:
+    return abs(a - b) <= 1e-9 * max(1.0, abs(b))
+
+
+async def run(main, conn, args):
+    codes = ["RUB"] + [row[0] for row in conn.execute(
+        "SELECT DISTINCT currency_code FROM currency WHERE date = (SELECT MAX(date) FROM currency)")]
+    last_date = conn.execute("SELECT MAX(date) FROM currency").fetchone()[0]
+    rng = random.Random(1)
+    days = [date.fromisoformat(last_date) - timedelta(days=rng.randrange(3650)) for _ in range(20)]
+    items = []
+    for _ in range(args.pairs):
+        item = {"from_currency": rng.choice(codes), "to_currency": rng.choice(codes).lower(),
+                "amount": round(rng.uniform(1, 10000), 2)}
+        if rng.random() < 0.5:
+            item["date"] = f"{rng.choice(days):%d/%m/%Y}"
+        items.append(item)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Одиночная конвертация: единица USD стоит курс USD в рублях
+        usd = expected_rate(conn, "USD", last_date)
+        response = (await client.get("/api/convert", params={"from_currency": "USD", "to_currency": "RUB",
+                                                              "amount": 2})).json()
+        assert close(response["rate"], usd) and close(response["result"], 2 * usd), response
+        response = (await client.get("/api/convert", params={"from_currency": "RUB", "to_currency": "USD",
+                                                              "amount": 100})).json()
+        assert close(response["rate"], 1 / usd), response
+
+        response = await client.post("/api/convert/batch", json=items)
+        assert response.status_code == 200, response.text
+        for item, result in zip(items, response.json()):
+            iso_date = main.to_iso_date(item["date"]) if "date" in item else last_date
+            rate = expected_rate(conn, item["from_currency"], iso_date) / \
+                expected_rate(conn, item["to_currency"].upper(), iso_date)
+            assert close(result["rate"], rate) and close(result["result"], item["amount"] * rate), (item, result)
+
+        bad = await client.post("/api/convert/batch", json=[{"from_currency": "USD", "to_currency": "XXX", "amount": 1}])
+        assert bad.status_code == 404 and "XXX" in bad.json()["detail"], bad.text
+        bad = await client.post("/api/convert/batch", json=[{"from_currency": "USD", "to_currency": "EUR",
+                                                             "amount": 1, "date": "31/02/2020"}])
+        assert bad.status_code == 400, bad.text
+        early = await client.post("/api/convert/batch", json=[{"from_currency": "USD", "to_currency": "EUR",
+                                                               "amount": 1, "date": "01/01/1990"}])
+        assert early.status_code == 404, early.text
+
+        matrix = (await client.get("/api/crossrates", params={"codes": "usd,EUR,RUB,CNY,usd"})).json()
+        assert matrix["codes"] == ["USD", "EUR", "RUB", "CNY"], matrix["codes"]
+        for i, a in enumerate(matrix["codes"]):
+            for j, b in enumerate(matrix["codes"]):
+                rate = expected_rate(conn, a, last_date) / expected_rate(conn, b, last_date)
+                assert close(matrix["rates"][i][j], rate), (a, b)
+        full = (await client.get("/api/crossrates", params={"date": f"{days[0]:%d/%m/%Y}"})).json()
+        assert full["codes"][0] == "RUB" and len(full["rates"]) == len(full["codes"])
+        print(f"{args.pairs} пар в {len(days)} датах и матрица кросс-курсов совпадают с расчётом по БД")
+
+        started = time.perf_counter()
+        for item in items:
+            if "date" not in item:
+                await client.get("/api/convert", params=item)
+        single_count = sum("date" not in item for item in items)
+        single = (time.perf_counter() - started) / single_count
+
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            await client.post("/api/convert/batch", json=items)
+        batch = (time.perf_counter() - started) / args.repeat
+
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            await client.get("/api/crossrates")
+        matrix_time = (time.perf_counter() - started) / args.repeat
+
+    print(f"/api/convert по одной паре   {single * 1e6:9.0f} мкс/пару ({single_count} запросов)")
+    print(f"/api/convert/batch           {batch / args.pairs * 1e6:9.1f} мкс/пару ({batch * 1000:.0f} мс на пакет)")
+    print(f"/api/crossrates, {len(full['codes'])}x{len(full['codes'])}    {matrix_time * 1000:9.2f} мс")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pairs", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    db_path = Path(tmp.name) / "currency.db"
+    create_database(db_path, "iso", date(2012, 1, 1), date(2025, 12, 31))
+    os.environ.update(CURRENCY_DB=str(db_path), RESPONSE_CACHE="0")
+
+    import logging  # noqa: E402
+    import main  # noqa: E402
+
+    logging.disable(logging.INFO)
+    main.DatabaseManager.init()
+    conn = sqlite3.connect(db_path)
+    for mode in ("SQLite", "RateStore"):
+        if mode == "RateStore":
+            main.CurrencyService.reload_store()
+        print(f"--- {mode}")
+        asyncio.run(run(main, conn, args))
+    conn.close()
+    tmp.cleanup()
@@ -0,0 +1,195 @@
+"""Проверка и замер потоковой выгрузки /api/export.
+
+Приложение вызывается напрямую по ASGI, куски ответа считаются и
+отбрасываются, как их забирал бы клиент по сети (httpx.ASGITransport
+собирает тело целиком и исказил бы замер памяти). Каждый формат выгружает
+всю таблицу в отдельном процессе; печатаются время, размер и прирост пикового
+RSS процесса (ru_maxrss) за время выгрузки. Для сравнения режим "buffered"
+собирает ту же CSV-выгрузку в памяти целиком. Замер идёт на базе за
+--short-years последних лет и за весь период: при потоковой выгрузке прирост
+RSS от размера таблицы не зависит.
+
+Перед замером выгрузки с фильтром по валютам и датам сверяются с таблицей
+currency, а число строк полной выгрузки - с COUNT(*).
+
+    python bench/bench_export.py --start 2012 --end 2025
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from generate_dataset import create_database  # noqa: E402
+
+
+async def call(app, query: str, on_chunk):
+    """GET /api/export?query; on_chunk(bytes) для каждого куска тела, результат - статус"""
+    status = None
+    finished = asyncio.Event()
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            on_chunk(message.get("body", b""))
+            if not message.get("more_body", False):
+                finished.set()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/api/export", "raw_path": b"/api/export", "root_path": "", "query_string": query.encode(),
+        "headers": [(b"host", b"bench")], "server": ("bench", 80), "client": ("127.0.0.1", 1),
+    }
+    await app(scope, receive, send)
+    return status
+
+
+async def fetch(app, query: str):
+    parts = []
+    status = await call(app, query, parts.append)
+    return status, b"".join(parts)
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def child(mode: str):
+    """Полная выгрузка в текущем процессе; результат - JSON в stdout"""
+    import logging
+    import main
+
+    logging.disable(logging.INFO)
+    main.DatabaseManager.init()
+    fmt = "csv" if mode == "buffered" else mode
+    asyncio.run(fetch(main.app, f"format={fmt}&codes=USD&start=01/01/2020&end=31/01/2020"))
+    before = peak_rss_mb()
+
+    size = lines = 0
+
+    def count(chunk: bytes):
+        nonlocal size, lines
+        size += len(chunk)
+        lines += chunk.count(b"\n")
+
+    started = time.perf_counter()
+    if mode == "buffered":
+        with main.DatabaseManager.connection() as conn:
+            body = b"".join(main.export.csv_chunks(main.export.batches(conn, None, None, None)))
+        count(body)
+        status = 200
+    else:
+        status = asyncio.run(call(main.app, f"format={mode}", count))
+    elapsed = time.perf_counter() - started
+    print(json.dumps({"status": status, "bytes": size, "lines": lines, "seconds": elapsed,
+                      "rss_before": before, "rss_peak": peak_rss_mb()}))
+
+
+def expected_rows(conn, codes, start: str, end: str):
+    return conn.execute(f"""
+        SELECT date, currency_code, currency_name, nominal, value, value / nominal FROM currency
+        WHERE currency_code IN ({', '.join('?' * len(codes))}) AND date BETWEEN ? AND ?
+        ORDER BY currency_code, date
+    """, (*codes, start, end)).fetchall()
+
+
+def check(main, conn):
+    rows = expected_rows(conn, ["EUR", "USD", "AMD"], "2020-02-13", "2021-07-02")
+    query = "codes=usd,EUR,AMD&start=13/02/2020&end=02/07/2021"
+
+    status, body = asyncio.run(fetch(main.app, f"format=csv&{query}"))
+    assert status == 200, status
+    reader = csv.reader(io.StringIO(body.decode()))
+    assert tuple(next(reader)) == main.export.COLUMNS
+    got = [(d, c, n, float(nom), float(v), float(r)) for d, c, n, nom, v, r in reader]
+    assert got == rows, (got[:2], rows[:2])
+
+    status, body = asyncio.run(fetch(main.app, f"format=ndjson&{query}"))
+    assert status == 200, status
+    got = [tuple(json.loads(line).values()) for line in body.decode().splitlines()]
+    assert got == rows, (got[:2], rows[:2])
+
+    status, body = asyncio.run(fetch(main.app, "format=csv&codes=USD&start=01/01/1990&end=05/01/1990"))
+    assert status == 200 and body == b"date,code,name,nominal,value,rate\n", body
+    assert asyncio.run(fetch(main.app, "format=csv&codes=XXX"))[0] == 404
+    assert asyncio.run(fetch(main.app, "format=csv&start=02/01/2021&end=01/01/2021"))[0] == 400
+    assert asyncio.run(fetch(main.app, "format=xml"))[0] == 422
+    parquet = asyncio.run(fetch(main.app, f"format=parquet&{query}"))
+    if main.export.parquet_available():
+        import pyarrow.parquet as pq
+        table = pq.read_table(io.BytesIO(parquet[1]))
+        assert [tuple(row.values()) for row in table.to_pylist()] == rows
+    else:
+        assert parquet[0] == 501, parquet[0]
+    print(f"выгрузки CSV, NDJSON{', Parquet' if main.export.parquet_available() else ''} "
+          f"с фильтром по валютам и датам совпадают с таблицей ({len(rows)} строк)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--start", type=int, default=2012)
+    parser.add_argument("--end", type=int, default=2025)
+    parser.add_argument("--short-years", type=int, default=2)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        sys.exit()
+
+    tmp = tempfile.TemporaryDirectory()
+    db_path = Path(tmp.name) / "currency.db"
+    short_path = Path(tmp.name) / "short.db"
+    short_start = args.end - args.short_years + 1
+    totals = {
+        short_path: (short_start, create_database(short_path, "iso", date(short_start, 1, 1), date(args.end, 12, 31))),
+        db_path: (args.start, create_database(db_path, "iso", date(args.start, 1, 1), date(args.end, 12, 31))),
+    }
+    env = dict(os.environ, CURRENCY_DB=str(db_path), RATE_STORE="0", RESPONSE_CACHE="0")
+    os.environ.update(env)
+
+    import logging  # noqa: E402
+    import main  # noqa: E402
+
+    logging.disable(logging.INFO)
+    main.DatabaseManager.init()
+    conn = sqlite3.connect(db_path)
+    check(main, conn)
+    conn.close()
+
+    modes = ["csv", "ndjson", "buffered"] + (["parquet"] if main.export.parquet_available() else [])
+    for path, (first_year, total) in totals.items():
+        print(f"\nполная выгрузка {total} строк ({first_year}-{args.end})")
+        for mode in modes:
+            output = subprocess.run([sys.executable, __file__, "--child", mode], env=dict(env, CURRENCY_DB=str(path)),
+                                    capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.splitlines()[-1])
+            assert result["status"] == 200, result
+            if mode != "parquet":
+                assert result["lines"] == total + (0 if mode == "ndjson" else 1), (mode, result["lines"], total)
+            print(f"{mode:<9}{result['seconds']:7.2f} с  {result['bytes'] / 2 ** 20:7.1f} МБ  "
+                  f"пиковый RSS {result['rss_before']:6.1f} -> {result['rss_peak']:6.1f} МБ "
+                  f"(+{result['rss_peak'] - result['rss_before']:.1f})")
+    tmp.cleanup()
@@ -0,0 +1,97 @@
+"""Загрузка истории через XML_daily (запрос на день) и XML_dynamic (запрос на валюту).
+
+Сначала разбирает записанные ответы ЦБ из bench/fixtures через локальную
+заглушку, затем грузит один и тот же синтетический период обоими способами и
+сравнивает число запросов, время и содержимое баз. Заглушка, как и ЦБ,
+отдаёт на выходные последние установленные курсы, поэтому совпадение баз
+проверяет, что XML_daily не пишет их копии под датами выходных.
+
+    python bench/bench_ingest.py --years 3 --latency 0.05
+"""
+import argparse
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import enject  # noqa: E402
+from cbr_stub import CbrStub  # noqa: E402
+from generate_dataset import generate_rows  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+def check_fixtures():
+    """Разбор записанных ответов ЦБ теми же функциями, что и при загрузке"""
+    with CbrStub(fixtures_dir=FIXTURES) as stub:
+        session = enject.create_session(1)
+        limiter = enject.RateLimiter(0)
+
+        rows = enject.fetch_day(session, limiter, date(2024, 1, 13), stub.daily_url)
+        by_code = {row[1]: row for row in rows}
+        assert len(rows) == 8, rows
+        assert by_code["USD"] == ("2024-01-13", "USD", "Доллар США", 88.6846, 1.0), by_code["USD"]
+        assert by_code["VND"][3:] == (36.4147, 10000.0), by_code["VND"]
+        # На воскресенье ЦБ отдаёт курсы с ValCurs Date субботы - день без курсов
+        sunday = enject.parse_rates(stub.fixtures["XML_daily_13.01.2024"], date(2024, 1, 14))
+        assert sunday == [], sunday
+
+        catalog = enject.fetch_catalog(session, limiter, [date(2024, 1, 13)], stub.daily_url)
+        assert catalog["R01235"] == ("USD", "Доллар США"), catalog
+
+        dynamic = enject.fetch_dynamic(session, limiter, "R01235", "USD", "Доллар США",
+                                       date(2024, 1, 9), date(2024, 1, 20), stub.dynamic_url)
+        assert [row[0] for row in dynamic][:2] == ["2024-01-10", "2024-01-11"], dynamic
+        assert len(dynamic) == 9 and dynamic[3][3] == by_code["USD"][3], dynamic
+        session.close()
+    print("Записанные ответы ЦБ разобраны корректно")
+
+
+def load(mode: str, stub: CbrStub, db_path: Path, start: date, end: date, concurrency: int):
+    enject.create_db(str(db_path))
+    stub.requests.clear()
+    started = time.perf_counter()
+    if mode == "daily":
+        enject.collect_data_for_period(start, end, concurrency, rate=0, db_path=str(db_path), url=stub.daily_url)
+    else:
+        enject.collect_dynamic_for_period(start, end, concurrency, rate=0, db_path=str(db_path),
+                                          daily_url=stub.daily_url, dynamic_url=stub.dynamic_url)
+    return time.perf_counter() - started, sum(stub.requests.values())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка заглушки на запрос, с")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    check_fixtures()
+
+    start, end = date(2025 - args.years + 1, 1, 1), date(2025, 12, 31)
+    rows = list(generate_rows(start, end))
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp, CbrStub(rows, latency=args.latency) as stub:
+        for mode in ("daily", "dynamic"):
+            results[mode] = load(mode, stub, Path(tmp) / f"{mode}.db", start, end, args.concurrency)
+
+        daily = sqlite3.connect(Path(tmp) / "daily.db")
+        daily.execute(f"ATTACH DATABASE '{Path(tmp) / 'dynamic.db'}' AS dyn")
+        columns = "date, currency_code, currency_name, value, nominal"
+        # Строки, которые есть только в одной из баз, в обе стороны
+        missing = daily.execute(f"""
+            SELECT (SELECT COUNT(*) FROM (SELECT {columns} FROM currency EXCEPT SELECT {columns} FROM dyn.currency))
+                 + (SELECT COUNT(*) FROM (SELECT {columns} FROM dyn.currency EXCEPT SELECT {columns} FROM currency))
+        """).fetchone()[0]
+        empty_days = daily.execute("SELECT COUNT(*) FROM backfill_empty").fetchone()[0]
+        daily.close()
+
+    print(f"\nПериод {start} - {end}, задержка заглушки {args.latency * 1000:.0f} мс, потоков {args.concurrency}")
+    print(f"{'режим':<10}{'запросов':>10}{'время, с':>12}")
+    for mode, (elapsed, requests_count) in results.items():
+        print(f"{mode:<10}{requests_count:>10}{elapsed:>12.2f}")
+    print(f"Расхождений между режимами: {missing}, дней без курсов в XML_daily: {empty_days}")
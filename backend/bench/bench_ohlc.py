@@ -0,0 +1,143 @@
+"""Проверка и замер /api/currencies/{code}/history_range?resolution= через ASGI-клиент httpx.
+
+Недельные и месячные свечи из ответа сверяются с расчётом по дневному ряду
+из таблицы currency, в том числе для периодов, обрезанных границами запроса,
+и после загрузки новых курсов (таблица currency_ohlc обновляется при записи).
+Затем для истории за весь набор данных сравниваются размер ответа и время
+запроса по дням и с resolution=auto.
+
+    python bench/bench_ohlc.py --repeat 50
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from generate_dataset import create_database  # noqa: E402
+
+START, END = date(2012, 1, 1), date(2025, 12, 31)
+RANGES = [(START, END), (date(2020, 2, 13), date(2021, 7, 2)), (date(2024, 3, 4), date(2024, 3, 31)),
+          (date(2023, 5, 17), date(2023, 5, 19)), (date(2024, 3, 10), date(2024, 3, 11))]
+
+
+def label(day: date) -> str:
+    return f"{day:%d/%m/%Y}"
+
+
+def period_key(day: date, resolution: str):
+    return day.isocalendar()[:2] if resolution == "week" else (day.year, day.month)
+
+
+def expected(conn, code: str, start: date, end: date, resolution: str):
+    """Свечи (дата закрытия, open, high, low, close) по дневному ряду"""
+    rows = conn.execute("""
+        SELECT date, value / nominal FROM currency
+        WHERE currency_code = ? AND date BETWEEN ? AND ? ORDER BY date
+    """, (code, start.isoformat(), end.isoformat())).fetchall()
+    periods = {}
+    for iso_date, rate in rows:
+        periods.setdefault(period_key(date.fromisoformat(iso_date), resolution), []).append((iso_date, rate))
+    return [(label(date.fromisoformat(items[-1][0])), items[0][1], max(r for _, r in items),
+             min(r for _, r in items), items[-1][1]) for items in periods.values()]
+
+
+async def check(client, conn, code: str, start: date, end: date, resolution: str):
+    response = await client.get(f"/api/currencies/{code}/history_range",
+                                params={"start": label(start), "end": label(end), "resolution": resolution})
+    want = expected(conn, code, start, end, resolution)
+    if not want:
+        assert response.status_code == 404, response.text
+        return
+    body = response.json()
+    assert body["resolution"] == resolution
+    got = [(item["date"], item["open"], item["high"], item["low"], item["value"]) for item in body["history"]]
+    assert got == want, (code, start, end, resolution, got[:3], want[:3])
+
+
+async def run(main, conn, args):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for code in ("USD", "AMD", "CNY"):
+            for start, end in RANGES:
+                for resolution in ("week", "month"):
+                    await check(client, conn, code, start, end, resolution)
+
+        # Дневной ответ не изменился: без open/high/low
+        daily = (await client.get("/api/currencies/USD/history_range",
+                                  params={"start": "01/03/2024", "end": "31/03/2024"})).json()
+        assert daily["resolution"] == "day" and set(daily["history"][0]) == {"date", "value"}, daily
+        auto = (await client.get("/api/currencies/USD/history_range",
+                                 params={"start": label(START), "end": label(END), "resolution": "auto",
+                                         "points": 800})).json()
+        assert auto["resolution"] == "week" and len(auto["history"]) <= 800, auto["resolution"]
+        bad = await client.get("/api/currencies/USD/history_range",
+                               params={"start": "01/03/2024", "end": "31/03/2024", "resolution": "year"})
+        assert bad.status_code == 422, bad.text
+        print(f"свечи по {len(RANGES)} диапазонам совпадают с расчётом по дневному ряду")
+
+        sizes, times = {}, {}
+        params = {"start": label(START), "end": label(END)}
+        for resolution in ("day", "auto"):
+            query = dict(params, resolution=resolution)
+            sizes[resolution] = len((await client.get("/api/currencies/USD/history_range", params=query)).content)
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                await client.get("/api/currencies/USD/history_range", params=query)
+            times[resolution] = (time.perf_counter() - started) / args.repeat
+    print(f"история {START.year}-{END.year}: по дням {sizes['day'] / 1024:.0f} КБ, {times['day'] * 1000:.1f} мс; "
+          f"auto {sizes['auto'] / 1024:.1f} КБ, {times['auto'] * 1000:.2f} мс")
+
+
+def check_update(main, conn):
+    """Новые курсы пересчитывают свечи своей недели и месяца"""
+    last_date = conn.execute("SELECT MAX(date) FROM currency").fetchone()[0]
+    day = date.fromisoformat(last_date) + timedelta(days=1)
+    name, value, nominal = conn.execute(
+        "SELECT currency_name, value, nominal FROM currency WHERE currency_code = 'USD' AND date = ?",
+        (last_date,)).fetchone()
+    main.CurrencyService.upsert_rates([(day.isoformat(), "USD", name, value * 3, nominal)])
+    conn.commit()
+    for resolution in ("week", "month"):
+        stored = conn.execute("""
+            SELECT date, high, close FROM currency_ohlc
+            WHERE currency_code = 'USD' AND resolution = ? ORDER BY period_start DESC LIMIT 1
+        """, (resolution,)).fetchone()
+        assert stored == (day.isoformat(), value * 3 / nominal, value * 3 / nominal), (resolution, stored)
+    candles = main.CurrencyService.store.candles("USD", "week", last_date, day.isoformat())
+    assert candles[-1].date == day.isoformat(), candles
+    print("после загрузки курсов свечи последней недели и месяца обновлены")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    db_path = Path(tmp.name) / "currency.db"
+    create_database(db_path, "iso", START, END)
+    os.environ.update(CURRENCY_DB=str(db_path), RESPONSE_CACHE="0")
+
+    import logging  # noqa: E402
+    import main  # noqa: E402
+
+    logging.disable(logging.INFO)
+    main.DatabaseManager.init()
+    conn = sqlite3.connect(db_path)
+    for mode in ("SQLite", "RateStore"):
+        if mode == "RateStore":
+            main.CurrencyService.reload_store()
+        print(f"--- {mode}")
+        asyncio.run(run(main, conn, args))
+    check_update(main, conn)
+    conn.close()
+    tmp.cleanup()
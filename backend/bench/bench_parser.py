@@ -0,0 +1,143 @@
+"""Бенчмарк и проверка cbr_parser на тысячах ответов XML_daily и XML_dynamic.
+
+Ответы ЦБ строятся заглушкой из generate_rows за --years лет (по файлу на
+торговый день) и дополняются записанными фикстурами. Результат cbr_parser
+сверяется с прежним разбором ElementTree (fromstring + find) на каждом файле,
+затем сравнивается время. Отдельно проверяются особенности формата из
+разных лет: ответ без VunitRate, дата через "/", пустой ValCurs, кодировка
+utf-8, переносы строк и отступы, сущности в названиях, ответ без NumCode,
+неизвестные элементы и ответ, который не является XML.
+
+    python bench/bench_parser.py --years 10
+"""
+import argparse
+import sys
+import time
+import xml.etree.ElementTree as ET
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import cbr_parser  # noqa: E402
+from cbr_stub import CbrStub  # noqa: E402
+from generate_dataset import generate_rows  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+def reference_daily(content: bytes):
+    """Прежний разбор из main.fetch_rates / enject.parse_rates"""
+    root = ET.fromstring(content)
+    return [
+        (valute.get("ID"), valute.find("CharCode").text, valute.find("Name").text,
+         float(valute.find("Nominal").text.replace(",", ".")),
+         float(valute.find("Value").text.replace(",", ".")))
+        for valute in root.findall("Valute")
+    ]
+
+
+def reference_dynamic(content: bytes):
+    root = ET.fromstring(content)
+    rows = []
+    for record in root.findall("Record"):
+        day, month, year = record.get("Date").split(".")
+        rows.append((f"{year}-{month}-{day}", float(record.find("Nominal").text.replace(",", ".")),
+                     float(record.find("Value").text.replace(",", "."))))
+    return rows
+
+
+def timed(parse, payloads):
+    started = time.perf_counter()
+    for content in payloads:
+        parse(content)
+    return (time.perf_counter() - started) / len(payloads) * 1e6
+
+
+def xml(body: str, encoding: str = "windows-1251", date_attr: str = "13.01.2024") -> bytes:
+    codec = "cp1251" if encoding == "windows-1251" else encoding
+    return (f'<?xml version="1.0" encoding="{encoding}"?>'
+            f'<ValCurs Date="{date_attr}" name="Foreign Currency Market">{body}</ValCurs>').encode(codec)
+
+
+USD = ('<Valute ID="R01235"><NumCode>840</NumCode><CharCode>USD</CharCode><Nominal>1</Nominal>'
+       '<Name>Доллар США</Name><Value>88,6846</Value><VunitRate>88,6846</VunitRate></Valute>')
+# До 2022 года VunitRate в ответе не было
+AMD_OLD = ('<Valute ID="R01060"><NumCode>051</NumCode><CharCode>AMD</CharCode><Nominal>100</Nominal>'
+           '<Name>Армянских драмов</Name><Value>21,9224</Value></Valute>')
+
+QUIRKS = {
+    "без VunitRate": (xml(AMD_OLD), "2024-01-13", [("AMD", "Армянских драмов", 100.0, 21.9224, 0.219224)]),
+    "дата через /": (xml(USD, date_attr="13/01/2024"), "2024-01-13",
+                     [("USD", "Доллар США", 1.0, 88.6846, 88.6846)]),
+    "пустой ValCurs": (b'<?xml version="1.0" encoding="windows-1251"?><ValCurs Date="" name="Foreign Currency Market"/>',
+                       None, []),
+    "utf-8": (xml(USD, encoding="utf-8"), "2024-01-13", [("USD", "Доллар США", 1.0, 88.6846, 88.6846)]),
+    "отступы": (xml(USD.replace("><", ">\n    <")), "2024-01-13", [("USD", "Доллар США", 1.0, 88.6846, 88.6846)]),
+    "сущности": (xml(USD.replace("Доллар США", "СДР &quot;спец. права&quot; &amp; &#1044;")), "2024-01-13",
+                 [("USD", 'СДР "спец. права" & Д', 1.0, 88.6846, 88.6846)]),
+    "без NumCode": (xml(USD.replace("<NumCode>840</NumCode>", "")), "2024-01-13",
+                    [("USD", "Доллар США", 1.0, 88.6846, 88.6846)]),
+    "другой порядок": (xml(USD.replace("<Nominal>1</Nominal>", "") .replace("</Name>", "</Name><Nominal>1</Nominal>")),
+                       "2024-01-13", [("USD", "Доллар США", 1.0, 88.6846, 88.6846)]),
+    "пустой CharCode": (xml(USD + AMD_OLD.replace("AMD", "")), "2024-01-13",
+                        [("USD", "Доллар США", 1.0, 88.6846, 88.6846)]),
+}
+
+
+def check_quirks():
+    for title, (content, expected_date, expected) in QUIRKS.items():
+        iso_date, rates = cbr_parser.parse_daily(content)
+        got = [(rate.code, rate.name, rate.nominal, rate.value, round(rate.unit_rate, 8)) for rate in rates]
+        assert (iso_date, got) == (expected_date, expected), (title, iso_date, got)
+    for broken in (b"<html><body>Service Unavailable</body></html>", xml(USD)[:-20]):
+        try:
+            cbr_parser.parse_daily(broken)
+        except (ET.ParseError, ValueError):
+            pass
+        else:
+            raise AssertionError(f"{broken[:30]!r}... разобран как день без курсов")
+
+    old = (b'<?xml version="1.0" encoding="windows-1251"?><ValCurs ID="R01235" DateRange1="01.03.2002" '
+           b'DateRange2="02.03.2002" name="Foreign Currency Market Dynamic">'
+           b'<Record Date="01.03.2002" Id="R01235"><Nominal>1</Nominal><Value>30,5500</Value></Record>'
+           b'<Record Date="02/03/2002" Id="R01235">\n<Nominal>1</Nominal>\n<Value>30,5600</Value>\n</Record></ValCurs>')
+    assert list(cbr_parser.parse_dynamic(old)) == [("2002-03-01", 1.0, 30.55, 30.55), ("2002-03-02", 1.0, 30.56, 30.56)]
+    assert list(cbr_parser.parse_dynamic(old.replace(b"<Nominal>", b"<Extra/><Nominal>"))) == \
+        list(cbr_parser.parse_dynamic(old))
+    print(f"особенности формата: {len(QUIRKS) + 4} случаев разобраны верно")
+
+
+def main(args):
+    end = date(2024, 1, 12)
+    start = end - timedelta(days=365 * args.years)
+    stub = CbrStub(generate_rows(start, end), fixtures_dir=FIXTURES)
+    daily = [stub.render_daily(day) for day in stub.days]
+    daily.extend(path.read_bytes() for path in FIXTURES.glob("XML_daily_*.xml"))
+    dynamic = [stub.render_dynamic(start, end, valute_id) for valute_id in stub.ids.values()]
+    dynamic.extend(path.read_bytes() for path in FIXTURES.glob("XML_dynamic_*.xml"))
+
+    for content in daily:
+        rates = cbr_parser.parse_daily(content)[1]
+        assert [rate[:5] for rate in rates] == reference_daily(content)
+        for rate in rates:
+            assert abs(rate.unit_rate - rate.value / rate.nominal) < 1e-4 * max(1.0, rate.unit_rate), rate
+    for content in dynamic:
+        assert [row[:3] for row in cbr_parser.parse_dynamic(content)] == reference_dynamic(content)
+    check_quirks()
+
+    size = sum(map(len, daily)) / len(daily)
+    print(f"XML_daily: {len(daily)} файлов по {size / 1024:.1f} КБ, результаты совпадают с ElementTree")
+    print(f"  ElementTree fromstring+find {timed(reference_daily, daily):8.1f} мкс/файл")
+    print(f"  cbr_parser.parse_daily      {timed(cbr_parser.parse_daily, daily):8.1f} мкс/файл")
+    records = sum(content.count(b"<Record ") for content in dynamic)
+    print(f"XML_dynamic: {len(dynamic)} файлов, {records} записей")
+    print(f"  ElementTree fromstring+find {timed(reference_dynamic, dynamic) / records * len(dynamic):8.2f} мкс/запись")
+    print(f"  cbr_parser.parse_dynamic    "
+          f"{timed(lambda c: list(cbr_parser.parse_dynamic(c)), dynamic) / records * len(dynamic):8.2f} мкс/запись")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=int, default=10)
+    main(parser.parse_args())
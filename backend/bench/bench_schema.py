@@ -0,0 +1,157 @@
+"""Сравнение запросов эндпоинтов на старой (dd/mm/yyyy) и новой (YYYY-MM-DD + индексы) схеме.
+
+Генерирует 14-летний синтетический набор, прогоняет запросы каждого эндпоинта
+на старой базе, затем мигрирует её через migrate.py и повторяет замер.
+
+    python bench/bench_schema.py --repeat 50
+"""
+import argparse
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from generate_dataset import create_database  # noqa: E402
+from migrate import migrate  # noqa: E402
+
+ISO = "substr(date, 7, 4) || '-' || substr(date, 4, 2) || '-' || substr(date, 1, 2)"
+
+# Запросы в том виде, в котором их выполняли эндпоинты до миграции
+LEGACY = {
+    "latest_date": [
+        (f"SELECT date FROM currency ORDER BY strftime('%Y-%m-%d', {ISO}) DESC LIMIT 1", ()),
+    ],
+    "/api/currencies": [
+        (f"SELECT date FROM currency ORDER BY strftime('%Y-%m-%d', {ISO}) DESC LIMIT 1", ()),
+        ("SELECT DISTINCT currency_code, currency_name FROM currency WHERE date = ?", ("{last}",)),
+    ],
+    "/api/currencies/{code}": [
+        (f"SELECT date FROM currency ORDER BY strftime('%Y-%m-%d', {ISO}) DESC LIMIT 1", ()),
+        ("SELECT currency_code, currency_name, value, nominal FROM currency WHERE date = ? AND currency_code = ?",
+         ("{last}", "USD")),
+        ("SELECT value, nominal FROM currency WHERE date = ? AND currency_code = ?", ("{last}", "USD")),
+        (f"SELECT MAX(value/nominal), MIN(value/nominal) FROM currency "
+         f"WHERE currency_code = ? AND strftime('%Y-%m-%d', {ISO}) >= ?", ("USD", "{iso_7}")),
+        (f"SELECT value, nominal FROM currency WHERE currency_code = ? AND strftime('%Y-%m-%d', {ISO}) <= ? "
+         f"ORDER BY strftime('%Y-%m-%d', {ISO}) DESC LIMIT 1", ("USD", "{iso_14}")),
+        (f"SELECT value, nominal FROM currency WHERE currency_code = ? AND strftime('%Y-%m-%d', {ISO}) <= ? "
+         f"ORDER BY strftime('%Y-%m-%d', {ISO}) DESC LIMIT 1", ("USD", "{iso_30}")),
+    ],
+    "/history?days=365": [
+        (f"SELECT date FROM currency ORDER BY strftime('%Y-%m-%d', {ISO}) DESC LIMIT 1", ()),
+        (f"SELECT date, value/nominal FROM currency WHERE currency_code = ? AND strftime('%Y-%m-%d', {ISO}) >= ? "
+         f"ORDER BY strftime('%Y-%m-%d', {ISO}) ASC", ("USD", "{iso_365}")),
+    ],
+    "/history_range (1 год)": [
+        (f"SELECT date, value/nominal FROM currency WHERE currency_code = ? AND strftime('%Y-%m-%d', {ISO}) "
+         f"BETWEEN ? AND ? ORDER BY strftime('%Y-%m-%d', {ISO}) ASC", ("USD", "2020-01-01", "2020-12-31")),
+    ],
+    "/api/convert": [
+        (f"SELECT date FROM currency ORDER BY strftime('%Y-%m-%d', {ISO}) DESC LIMIT 1", ()),
+        ("SELECT value, nominal FROM currency WHERE date = ? AND currency_code = ?", ("{last}", "USD")),
+        ("SELECT value, nominal FROM currency WHERE date = ? AND currency_code = ?", ("{last}", "EUR")),
+    ],
+}
+
+# Те же запросы в текущей схеме (см. main.py)
+CURRENT = {
+    "latest_date": [
+        ("SELECT MAX(date) FROM currency", ()),
+    ],
+    "/api/currencies": [
+        ("SELECT MAX(date) FROM currency", ()),
+        ("SELECT DISTINCT currency_code, currency_name FROM currency WHERE date = ?", ("{last}",)),
+    ],
+    "/api/currencies/{code}": [
+        ("SELECT MAX(date) FROM currency", ()),
+        ("SELECT currency_code, currency_name, value, nominal FROM currency WHERE date = ? AND currency_code = ?",
+         ("{last}", "USD")),
+        ("SELECT value, nominal FROM currency WHERE date = ? AND currency_code = ?", ("{last}", "USD")),
+        ("SELECT MAX(value/nominal), MIN(value/nominal) FROM currency WHERE currency_code = ? AND date >= ?",
+         ("USD", "{iso_7}")),
+        ("SELECT value, nominal FROM currency WHERE currency_code = ? AND date <= ? ORDER BY date DESC LIMIT 1",
+         ("USD", "{iso_14}")),
+        ("SELECT value, nominal FROM currency WHERE currency_code = ? AND date <= ? ORDER BY date DESC LIMIT 1",
+         ("USD", "{iso_30}")),
+    ],
+    "/history?days=365": [
+        ("SELECT MAX(date) FROM currency", ()),
+        ("SELECT date, value/nominal FROM currency WHERE currency_code = ? AND date >= ? ORDER BY date ASC",
+         ("USD", "{iso_365}")),
+    ],
+    "/history_range (1 год)": [
+        ("SELECT date, value/nominal FROM currency WHERE currency_code = ? AND date BETWEEN ? AND ? "
+         "ORDER BY date ASC", ("USD", "2020-01-01", "2020-12-31")),
+    ],
+    "/api/convert": [
+        ("SELECT MAX(date) FROM currency", ()),
+        ("SELECT value, nominal FROM currency WHERE date = ? AND currency_code = ?", ("{last}", "USD")),
+        ("SELECT value, nominal FROM currency WHERE date = ? AND currency_code = ?", ("{last}", "EUR")),
+    ],
+}
+
+
+def run(conn: sqlite3.Connection, queries, params_map, repeat: int):
+    """Медиана и p95 времени выполнения набора запросов одного эндпоинта, мс"""
+    prepared = [(sql, tuple(params_map.get(p, p) for p in params)) for sql, params in queries]
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for sql, params in prepared:
+            conn.execute(sql, params).fetchall()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def params_for(last_date: str, legacy: bool):
+    last = date.fromisoformat(last_date if not legacy else "-".join(reversed(last_date.split("/"))))
+    iso = lambda days: date.fromordinal(last.toordinal() - days).isoformat()  # noqa: E731
+    return {
+        "{last}": last_date,
+        "{iso_7}": iso(7),
+        "{iso_14}": iso(14),
+        "{iso_30}": iso(30),
+        "{iso_365}": iso(365),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--start", type=int, default=2012)
+    parser.add_argument("--end", type=int, default=2025)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "currency.db"
+        count = create_database(db_path, "legacy", date(args.start, 1, 1), date(args.end, 12, 31))
+        print(f"Синтетическая база: {count} строк ({args.start}-{args.end})")
+
+        conn = sqlite3.connect(db_path)
+        last_legacy = conn.execute(LEGACY["latest_date"][0][0]).fetchone()[0]
+        before = {
+            name: run(conn, queries, params_for(last_legacy, True), args.repeat)
+            for name, queries in LEGACY.items()
+        }
+
+        started = time.perf_counter()
+        migrate(conn)
+        print(f"Миграция: {time.perf_counter() - started:.2f} с")
+
+        last_iso = conn.execute(CURRENT["latest_date"][0][0]).fetchone()[0]
+        after = {
+            name: run(conn, queries, params_for(last_iso, False), args.repeat)
+            for name, queries in CURRENT.items()
+        }
+        conn.close()
+
+    print(f"\n{'эндпоинт':<26}{'до, мс (p50/p95)':>22}{'после, мс (p50/p95)':>24}{'ускорение':>12}")
+    for name in LEGACY:
+        (b50, b95), (a50, a95) = before[name], after[name]
+        print(f"{name:<26}{b50:>12.3f} / {b95:<8.3f}{a50:>13.3f} / {a95:<9.3f}{b50 / a50:>10.1f}x")
@@ -0,0 +1,70 @@
+"""Латентность обработчиков при чтении из SQLite и из снимка RateStore в памяти.
+
+Обработчики вызываются напрямую, без HTTP-клиента, чтобы в замер попадала
+только работа эндпоинта.
+
+    python bench/bench_store.py --repeat 2000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from generate_dataset import create_database  # noqa: E402
+
+
+def measure(loop, call, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        loop.run_until_complete(call())
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    db_path = Path(tmp.name) / "currency.db"
+    create_database(db_path, "iso", date(2012, 1, 1), date(2025, 12, 31))
+    os.environ["CURRENCY_DB"] = str(db_path)
+
+    import main  # noqa: E402
+
+    main.DatabaseManager.init()
+    loop = asyncio.new_event_loop()
+    endpoints = {
+        "/api/currencies": lambda: main.get_currencies(),
+        "/api/currencies/{code}": lambda: main.get_currency("USD", as_of=None),
+        "/history?days=30": lambda: main.get_history("USD", days=30),
+        "/history?days=365": lambda: main.get_history("USD", days=365),
+        "/history_range (1 год)": lambda: main.get_history_range(
+            "USD", "01/01/2020", "31/12/2020", resolution="day", points=500),
+        "/api/convert": lambda: main.convert("USD", "EUR", 100, as_of=None),
+    }
+
+    main.CurrencyService.store = None
+    sqlite_results = {name: measure(loop, call, args.repeat) for name, call in endpoints.items()}
+
+    started = time.perf_counter()
+    main.CurrencyService.reload_store()
+    print(f"Загрузка снимка: {(time.perf_counter() - started) * 1000:.0f} мс")
+    store_results = {name: measure(loop, call, args.repeat) for name, call in endpoints.items()}
+
+    print(f"\n{'эндпоинт':<26}{'SQLite, мс (p50/p99)':>24}{'память, мс (p50/p99)':>24}")
+    for name in endpoints:
+        (s50, s99), (m50, m99) = sqlite_results[name], store_results[name]
+        print(f"{name:<26}{s50:>13.3f} / {s99:<8.3f}{m50:>13.3f} / {m99:<8.3f}")
+
+    tmp.cleanup()
@@ -0,0 +1,168 @@
+"""Локальная заглушка www.cbr.ru для бенчмарков: XML_daily.asp и XML_dynamic.asp.
+
+Ответы строятся из переданного набора строк в том же формате, что и у ЦБ
+(windows-1251, запятая в дробной части, даты dd.mm.yyyy), с настраиваемой
+задержкой и долей ответов 500. Считает запросы по эндпоинтам.
+
+validators="etag" или "last-modified" включает соответствующий заголовок и
+ответ 304 на условный запрос с тем же значением; без них тело отдаётся
+всегда, и повторный ответ совпадает с прошлым байт в байт.
+"""
+import hashlib
+import random
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+
+def _number(value: float) -> str:
+    return f"{value:.4f}".replace(".", ",")
+
+
+class CbrStub:
+    def __init__(self, rows=(), latency: float = 0.0, fail_rate: float = 0.0, seed: int = 1, fixtures_dir=None,
+                 validators: str = None):
+        """rows - (date, code, name, value, nominal), как у generate_dataset.generate_rows.
+
+        Файлы из fixtures_dir (XML_daily_dd.mm.yyyy.xml,
+        XML_dynamic_<ID>_dd.mm.yyyy-dd.mm.yyyy.xml) отдаются как есть на
+        совпадающий запрос, остальные ответы строятся из rows.
+        """
+        self.fixtures = {}
+        if fixtures_dir is not None:
+            for path in Path(fixtures_dir).glob("XML_*.xml"):
+                self.fixtures[path.stem] = path.read_bytes()
+        self.validators = validators
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self.requests = Counter()
+        self.not_modified = 0
+        self.load_rows(rows)
+        self.server = None
+
+    def load_rows(self, rows):
+        """Замена данных, например чтобы имитировать новую публикацию курсов"""
+        self.by_day = {}
+        self.ids = {}
+        for day, code, name, value, nominal in rows:
+            valute_id = self.ids.setdefault(code, f"R{1000 + len(self.ids):05d}")
+            self.by_day.setdefault(day, []).append((valute_id, code, name, value, nominal))
+        self.days = sorted(self.by_day)
+
+    @property
+    def daily_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}/scripts/XML_daily.asp"
+
+    @property
+    def dynamic_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}/scripts/XML_dynamic.asp"
+
+    def render_daily(self, requested: date) -> bytes:
+        # Как и ЦБ, на дату без курса отдаём последний установленный курс
+        i = bisect_right(self.days, requested) - 1
+        if i < 0:
+            return '<?xml version="1.0" encoding="windows-1251"?><ValCurs Date="" name="Foreign Currency Market"/>'.encode("cp1251")
+        day = self.days[i]
+        parts = [f'<?xml version="1.0" encoding="windows-1251"?><ValCurs Date="{day:%d.%m.%Y}" name="Foreign Currency Market">']
+        for valute_id, code, name, value, nominal in self.by_day[day]:
+            parts.append(
+                f'<Valute ID="{valute_id}"><NumCode>{valute_id[-3:]}</NumCode><CharCode>{code}</CharCode>'
+                f'<Nominal>{nominal}</Nominal><Name>{escape(name)}</Name><Value>{_number(value)}</Value>'
+                f'<VunitRate>{_number(value / nominal)}</VunitRate></Valute>'
+            )
+        parts.append("</ValCurs>")
+        return "".join(parts).encode("cp1251")
+
+    def render_dynamic(self, start: date, end: date, valute_id: str) -> bytes:
+        parts = [
+            f'<?xml version="1.0" encoding="windows-1251"?><ValCurs ID="{valute_id}" '
+            f'DateRange1="{start:%d.%m.%Y}" DateRange2="{end:%d.%m.%Y}" name="Foreign Currency Market Dynamic">'
+        ]
+        for day in self.days[bisect_left(self.days, start):bisect_right(self.days, end)]:
+            for item_id, _, _, value, nominal in self.by_day[day]:
+                if item_id == valute_id:
+                    parts.append(
+                        f'<Record Date="{day:%d.%m.%Y}" Id="{valute_id}"><Nominal>{nominal}</Nominal>'
+                        f'<Value>{_number(value)}</Value><VunitRate>{_number(value / nominal)}</VunitRate></Record>'
+                    )
+        parts.append("</ValCurs>")
+        return "".join(parts).encode("cp1251")
+
+    def handle(self, path: str, query: dict):
+        parse = lambda value: datetime.strptime(value, "%d/%m/%Y").date()  # noqa: E731
+        dotted = lambda key: query[key][0].replace("/", ".")  # noqa: E731
+        if path.endswith("XML_daily.asp") and "date_req" in query:
+            fixture = self.fixtures.get(f"XML_daily_{dotted('date_req')}")
+            if fixture is not None:
+                return fixture
+        if path.endswith("XML_dynamic.asp"):
+            fixture = self.fixtures.get(f"XML_dynamic_{query['VAL_NM_RQ'][0]}_{dotted('date_req1')}-{dotted('date_req2')}")
+            if fixture is not None:
+                return fixture
+        if not self.days:
+            return None
+        if path.endswith("XML_daily.asp"):
+            requested = parse(query["date_req"][0]) if "date_req" in query else self.days[-1]
+            return self.render_daily(requested)
+        if path.endswith("XML_dynamic.asp"):
+            return self.render_dynamic(parse(query["date_req1"][0]), parse(query["date_req2"][0]),
+                                       query["VAL_NM_RQ"][0])
+        return None
+
+    def __enter__(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                stub.requests[url.path.rsplit("/", 1)[-1]] += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if stub.fail_rate and stub.rng.random() < stub.fail_rate:
+                    self.send_error(500)
+                    return
+                body = stub.handle(url.path, parse_qs(url.query))
+                if body is None:
+                    self.send_error(404)
+                    return
+                digest = hashlib.sha256(body).hexdigest()
+                if stub.validators == "etag":
+                    validator = ("ETag", "If-None-Match", f'"{digest[:16]}"')
+                elif stub.validators == "last-modified":
+                    # Время публикации выводим из содержимого, как если бы файл менялся вместе с ним
+                    validator = ("Last-Modified", "If-Modified-Since",
+                                 time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(int(digest[:7], 16))))
+                else:
+                    validator = None
+                if validator and self.headers.get(validator[1]) == validator[2]:
+                    stub.not_modified += 1
+                    self.send_response(304)
+                    self.send_header(validator[0], validator[2])
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                if validator:
+                    self.send_header(validator[0], validator[2])
+                self.send_header("Content-Type", "application/xml; charset=windows-1251")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
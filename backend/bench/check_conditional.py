@@ -0,0 +1,78 @@
+"""Проверка условных запросов к ЦБ в CurrencyService.update_today.
+
+Заглушка отдаёт курсы с ETag, с Last-Modified или без валидаторов (тогда
+повторный ответ совпадает байт в байт). Повторные обновления не должны
+разбирать ответ, писать в БД и перезагружать снимок; новая публикация
+курсов должна попасть в БД.
+
+    python bench/check_conditional.py
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from cbr_stub import CbrStub  # noqa: E402
+from generate_dataset import create_database, generate_rows  # noqa: E402
+
+tmp = tempfile.TemporaryDirectory()
+DB = Path(tmp.name) / "currency.db"
+os.environ["CURRENCY_DB"] = str(DB)
+
+import main  # noqa: E402
+
+service = main.CurrencyService
+
+
+def usd_today(rows):
+    return next(value for day, code, _, value, _ in rows if code == "USD" and day == rows[-1][0])
+
+
+def check(mode):
+    end = date.today()
+    rows = list(generate_rows(end - timedelta(days=30), end, seed=7))
+    with CbrStub(rows, validators=mode) as stub:
+        main.CBR_URL = stub.daily_url
+        service.last_response = (None, None, None, None)
+        service.fetch_stats.clear()
+
+        assert service.update_today(force_sync=True)
+        store = service.store
+        for _ in range(3):
+            assert service.update_today(force_sync=True)
+            assert service.store is store, "снимок перезагружен без изменений"
+        repeated = "not_modified" if mode else "unchanged"
+        assert service.fetch_stats == {"changed": 1, repeated: 3}, service.fetch_stats
+        assert stub.not_modified == (3 if mode else 0)
+
+        # Новая публикация: курс USD за последний день меняется
+        last_day = rows[-1][0]
+        rows = [(day, code, name, value + 1 if day == last_day else value, nominal)
+                for day, code, name, value, nominal in rows]
+        stub.load_rows(rows)
+        assert service.update_today(force_sync=True)
+        assert service.store is not store
+        assert service.fetch_stats["changed"] == 2, service.fetch_stats
+
+    with sqlite3.connect(DB) as conn:
+        # Курс пишется под датой установки из ValCurs Date; в выходной копии под
+        # запрошенной датой быть не должно
+        stored = conn.execute("SELECT value FROM currency WHERE currency_code = 'USD' AND date = ?",
+                              (rows[-1][0].isoformat(),)).fetchone()[0]
+        copies = conn.execute("SELECT COUNT(*) FROM currency WHERE date > ?",
+                              (rows[-1][0].isoformat(),)).fetchone()[0]
+    assert abs(stored - usd_today(rows)) < 1e-4, (stored, usd_today(rows))
+    assert copies == 0, f"{copies} курсов под датами, за которые ЦБ их не устанавливал"
+    print(f"{mode or 'без валидаторов':<16} повторы: {dict(service.fetch_stats)}, 304 от заглушки: {stub.not_modified}")
+
+
+if __name__ == "__main__":
+    create_database(DB, "iso", date.today() - timedelta(days=60), date.today() - timedelta(days=31))
+    main.DatabaseManager.init()
+    for mode in ("etag", "last-modified", None):
+        check(mode)
+    print("Условные запросы и пропуск неизменённых ответов работают")
@@ -0,0 +1,144 @@
+"""Генератор синтетической базы currency.db для бенчмарков.
+
+Курсы строятся случайным блужданием с фиксированным seed, без курсов по
+воскресеньям, понедельникам и в новогодние праздники (как у ЦБ РФ), а у части
+валют в середине периода меняется номинал.
+
+Схема legacy - таблица в формате enject.py (даты dd/mm/yyyy), iso - текущая:
+та же таблица, проведённая через migrate(), поэтому новые миграции
+применяются к сгенерированной базе без изменений генератора.
+
+    python bench/generate_dataset.py out.db --schema legacy --start 2012 --end 2025
+"""
+import argparse
+import random
+import sqlite3
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from migrate import migrate  # noqa: E402
+
+# (код, название, курс за номинал, номинал, номинал после деноминации или None)
+CURRENCIES = [
+    ("AUD", "Австралийский доллар", 30.0, 1, None),
+    ("AZN", "Азербайджанский манат", 39.0, 1, None),
+    ("GBP", "Фунт стерлингов Соединенного королевства", 48.0, 1, None),
+    ("AMD", "Армянских драмов", 7.5, 100, 1000),
+    ("BYN", "Белорусский рубль", 29.0, 1, None),
+    ("BGN", "Болгарский лев", 20.0, 1, None),
+    ("BRL", "Бразильский реал", 16.0, 1, None),
+    ("HUF", "Венгерских форинтов", 13.5, 100, None),
+    ("VND", "Вьетнамских донгов", 15.0, 10000, None),
+    ("HKD", "Гонконгский доллар", 39.0, 10, 1),
+    ("GEL", "Грузинский лари", 18.0, 1, None),
+    ("DKK", "Датская крона", 52.0, 10, None),
+    ("AED", "Дирхам ОАЭ", 8.0, 1, None),
+    ("USD", "Доллар США", 30.0, 1, None),
+    ("EUR", "Евро", 40.0, 1, None),
+    ("EGP", "Египетских фунтов", 50.0, 10, None),
+    ("INR", "Индийских рупий", 55.0, 100, 10),
+    ("IDR", "Индонезийских рупий", 33.0, 10000, None),
+    ("KZT", "Казахстанских тенге", 20.0, 100, None),
+    ("CAD", "Канадский доллар", 30.0, 1, None),
+    ("QAR", "Катарский риал", 8.2, 1, None),
+    ("KGS", "Киргизских сомов", 64.0, 100, None),
+    ("CNY", "Китайский юань", 47.0, 10, 1),
+    ("MDL", "Молдавских леев", 25.0, 10, None),
+    ("NZD", "Новозеландский доллар", 24.0, 1, None),
+    ("NOK", "Норвежских крон", 52.0, 10, None),
+    ("PLN", "Польский злотый", 9.5, 1, None),
+    ("RON", "Румынский лей", 9.0, 1, None),
+    ("XDR", "СДР (специальные права заимствования)", 46.0, 1, None),
+    ("SGD", "Сингапурский доллар", 23.5, 1, None),
+    ("TJS", "Таджикских сомони", 63.0, 10, None),
+    ("THB", "Таиландских батов", 97.0, 100, 10),
+    ("TRY", "Турецких лир", 16.5, 1, 10),
+    ("TMT", "Новый туркменский манат", 10.5, 1, None),
+    ("UZS", "Узбекских сумов", 16.0, 1000, 10000),
+    ("UAH", "Украинских гривен", 37.0, 10, None),
+    ("CZK", "Чешских крон", 15.5, 10, None),
+    ("SEK", "Шведских крон", 45.0, 10, None),
+    ("CHF", "Швейцарский франк", 32.0, 1, None),
+    ("RSD", "Сербских динаров", 36.0, 100, None),
+    ("ZAR", "Южноафриканских рэндов", 37.0, 10, None),
+    ("KRW", "Вон Республики Корея", 26.0, 1000, None),
+    ("JPY", "Японских иен", 38.0, 100, None),
+]
+
+SCHEMAS = ("legacy", "iso")
+
+
+def trading_days(start: date, end: date):
+    """Даты, на которые ЦБ устанавливает курс (без вс, пн и 1-8 января)"""
+    day = start
+    while day <= end:
+        if day.weekday() not in (0, 6) and not (day.month == 1 and day.day <= 8):
+            yield day
+        day += timedelta(days=1)
+
+
+def generate_rows(start: date, end: date, seed: int = 42):
+    """Строки (date, code, name, value, nominal) в порядке дат"""
+    rng = random.Random(seed)
+    days = list(trading_days(start, end))
+    switch_day = days[len(days) // 2]
+    state = {code: base for code, _, base, _, _ in CURRENCIES}
+
+    for day in days:
+        for code, name, _, nominal, new_nominal in CURRENCIES:
+            state[code] *= 1 + rng.gauss(0.0002, 0.006)
+            unit_rate = state[code] / nominal
+            current_nominal = new_nominal if new_nominal and day >= switch_day else nominal
+            yield day, code, name, round(unit_rate * current_nominal, 4), current_nominal
+
+
+def create_database(path: Path, schema: str, start: date, end: date, seed: int = 42) -> int:
+    """Создание базы в формате enject.py (legacy) или текущей схемы (iso)"""
+    if schema not in SCHEMAS:
+        raise ValueError(f"Неизвестная схема: {schema}")
+    if path.exists():
+        path.unlink()
+
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("""
+            CREATE TABLE currency (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date TEXT,
+                currency_code TEXT,
+                currency_name TEXT,
+                value REAL,
+                nominal REAL
+            )
+        """)
+        date_format = "%d/%m/%Y" if schema == "legacy" else "%Y-%m-%d"
+        rows = (
+            (day.strftime(date_format), code, name, value, nominal)
+            for day, code, name, value, nominal in generate_rows(start, end, seed)
+        )
+        conn.executemany(
+            "INSERT INTO currency (date, currency_code, currency_name, value, nominal) VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+        conn.commit()
+        if schema == "iso":
+            migrate(conn)
+        return conn.execute("SELECT COUNT(*) FROM currency").fetchone()[0]
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Генерация синтетической currency.db")
+    parser.add_argument("output", type=Path)
+    parser.add_argument("--schema", choices=SCHEMAS, default="iso")
+    parser.add_argument("--start", type=int, default=2012, help="первый год")
+    parser.add_argument("--end", type=int, default=2025, help="последний год")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    count = create_database(args.output, args.schema, date(args.start, 1, 1), date(args.end, 12, 31), args.seed)
+    print(f"{args.output}: {count} строк, схема {args.schema}")
@@ -0,0 +1,150 @@
+"""Разбор ответов ЦБ РФ (XML_daily.asp и XML_dynamic.asp) из байтов.
+
+Общий модуль для бэкенда, enject и бота. Ответы ЦБ имеют фиксированную
+разметку, поэтому основной путь - один проход скомпилированным регулярным
+выражением по байтам, без построения дерева. Если число найденных записей не
+совпадает с числом элементов в ответе (другой порядок полей, неизвестные
+элементы, сущности в тексте), ответ разбирается ElementTree, который сам
+учитывает кодировку из XML-декларации.
+"""
+import io
+import re
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+_ENCODING = re.compile(rb'<\?xml[^>]*encoding=["\']([A-Za-z0-9._-]+)["\']')
+_DATE = re.compile(rb'<ValCurs\b[^>]*\bDate="(\d\d)[./](\d\d)[./](\d{4})"')
+_VALUTE = re.compile(
+    rb'<Valute ID="([^"]*)">\s*'
+    rb'(?:<NumCode>[^<]*</NumCode>\s*)?'
+    rb'<CharCode>([^<]*)</CharCode>\s*'
+    rb'<Nominal>([^<]*)</Nominal>\s*'
+    rb'<Name>([^<]*)</Name>\s*'
+    rb'<Value>([^<]*)</Value>\s*'
+    rb'(?:<VunitRate>([^<]*)</VunitRate>\s*)?'
+    rb'</Valute>'
+)
+_RECORD = re.compile(
+    rb'<Record Date="(\d\d)[./](\d\d)[./](\d{4})" Id="[^"]*">\s*'
+    rb'<Nominal>([^<]*)</Nominal>\s*'
+    rb'<Value>([^<]*)</Value>\s*'
+    rb'(?:<VunitRate>([^<]*)</VunitRate>\s*)?'
+    rb'</Record>'
+)
+
+
+class DailyRate(NamedTuple):
+    valute_id: str
+    code: str
+    name: str
+    nominal: float
+    value: float
+    # Курс за одну единицу валюты: VunitRate, если ЦБ его прислал, иначе value / nominal
+    unit_rate: float
+
+
+def _number(text) -> float:
+    """Число ЦБ с запятой ("88,6846") из bytes или str"""
+    if isinstance(text, bytes):
+        return float(text.replace(b",", b"."))
+    return float(text.replace(",", "."))
+
+
+def _unit_rate(value: float, nominal: float, vunit_rate) -> float:
+    return _number(vunit_rate) if vunit_rate else value / nominal
+
+
+def _iso(day: bytes, month: bytes, year: bytes) -> str:
+    return f"{year.decode()}-{month.decode()}-{day.decode()}"
+
+
+def _encoding(content: bytes) -> str:
+    match = _ENCODING.match(content)
+    return match.group(1).decode() if match else "utf-8"
+
+
+def _text(element, tag: str) -> Optional[str]:
+    child = element.find(tag)
+    return child.text.strip() if child is not None and child.text else None
+
+
+def _parse_daily_tree(content: bytes) -> Tuple[Optional[str], List[DailyRate]]:
+    root = ET.fromstring(content)
+    if root.tag != "ValCurs":
+        raise ValueError(f"Ответ не является курсами ЦБ: <{root.tag}>")
+    match = re.fullmatch(r"(\d\d)[./](\d\d)[./](\d{4})", root.get("Date") or "")
+    iso_date = f"{match[3]}-{match[2]}-{match[1]}" if match else None
+    rates = []
+    for valute in root.iter("Valute"):
+        code = _text(valute, "CharCode")
+        if not code:
+            continue
+        nominal = _number(_text(valute, "Nominal"))
+        value = _number(_text(valute, "Value"))
+        rates.append(DailyRate(valute.get("ID"), code, _text(valute, "Name"), nominal, value,
+                               _unit_rate(value, nominal, _text(valute, "VunitRate"))))
+    return iso_date, rates
+
+
+def parse_daily(content: bytes) -> Tuple[Optional[str], List[DailyRate]]:
+    """Дата курсов (ISO, из ValCurs Date) и курсы из ответа XML_daily.asp.
+
+    Для дня без курсов возвращает пустой список; на оборванный ответ или
+    ответ, который не является XML ЦБ, - ET.ParseError или ValueError.
+    """
+    if b"<ValCurs" not in content or b"&" in content:
+        return _parse_daily_tree(content)
+    matches = _VALUTE.findall(content)
+    if len(matches) != content.count(b"<Valute "):
+        return _parse_daily_tree(content)
+
+    date_match = _DATE.search(content)
+    iso_date = _iso(*date_match.groups()) if date_match else None
+    encoding = _encoding(content)
+    rates = []
+    append = rates.append
+    for valute_id, code, nominal, name, value, vunit_rate in matches:
+        code = code.strip()
+        if not code:
+            continue
+        nominal = float(nominal.replace(b",", b"."))
+        value = float(value.replace(b",", b"."))
+        unit_rate = float(vunit_rate.replace(b",", b".")) if vunit_rate else value / nominal
+        append(DailyRate(valute_id.decode(), code.decode(), name.strip().decode(encoding),
+                         nominal, value, unit_rate))
+    return iso_date, rates
+
+
+def unit_rates(content: bytes) -> Dict[str, float]:
+    """Курсы за единицу валюты по кодам: {"USD": 88.6846, "AMD": 0.219224, ...}"""
+    return {rate.code: rate.unit_rate for rate in parse_daily(content)[1]}
+
+
+def _parse_dynamic_stream(content: bytes) -> Iterator[Tuple[str, float, float, float]]:
+    record_date = None
+    fields = {}
+    for event, elem in ET.iterparse(io.BytesIO(content), events=("start", "end")):
+        if event == "start":
+            if elem.tag == "Record":
+                record_date, fields = elem.get("Date"), {}
+            continue
+        if elem.tag in ("Value", "Nominal", "VunitRate") and elem.text:
+            fields[elem.tag] = elem.text.strip()
+        elif elem.tag == "Record":
+            day, month, year = re.split(r"[./]", record_date)
+            nominal = _number(fields["Nominal"])
+            value = _number(fields["Value"])
+            yield f"{year}-{month}-{day}", nominal, value, _unit_rate(value, nominal, fields.get("VunitRate"))
+            elem.clear()
+
+
+def parse_dynamic(content: bytes) -> Iterator[Tuple[str, float, float, float]]:
+    """Записи XML_dynamic.asp: (ISO-дата, nominal, value, unit_rate)"""
+    matches = _RECORD.findall(content) if b"<ValCurs" in content else None
+    if matches is None or len(matches) != content.count(b"<Record "):
+        yield from _parse_dynamic_stream(content)
+        return
+    for day, month, year, nominal, value, vunit_rate in matches:
+        nominal = _number(nominal)
+        value = _number(value)
+        yield _iso(day, month, year), nominal, value, _unit_rate(value, nominal, vunit_rate)
@@ -0,0 +1,51 @@
+"""Кросс-курсы и пакетная конвертация по вектору курсов за одну дату.
+
+Все курсы ЦБ заданы в рублях за единицу валюты, поэтому курс пары
+from -> to равен rates[from] / rates[to], а рубль - это валюта с курсом 1.
+Вектор строится один раз на дату, дальше пары и суммы считаются numpy
+без обращения к источнику курсов.
+"""
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+# Базовая валюта курсов ЦБ; в таблице currency её нет
+BASE_CURRENCY = "RUB"
+
+
+class RateVector:
+    """Курсы всех валют за дату: codes[i] стоит rates[i] рублей"""
+
+    __slots__ = ("iso_date", "codes", "index", "rates")
+
+    def __init__(self, iso_date: str, rates: Iterable[Tuple[str, float]]):
+        self.iso_date = iso_date
+        self.codes = [BASE_CURRENCY]
+        values = [1.0]
+        for code, rate in rates:
+            self.codes.append(code)
+            values.append(rate)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.rates = np.array(values)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.index
+
+    def unknown(self, codes: Iterable[str]) -> List[str]:
+        """Коды, которых нет среди курсов за эту дату"""
+        return sorted({code for code in codes if code not in self.index})
+
+    def positions(self, codes: Sequence[str]) -> np.ndarray:
+        index = self.index
+        return np.fromiter((index[code] for code in codes), dtype=np.intp, count=len(codes))
+
+    def convert(self, from_codes: Sequence[str], to_codes: Sequence[str],
+                amounts: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+        """Суммы в целевой валюте и курсы пар: (amounts * rate, rate)"""
+        rate = self.rates[self.positions(from_codes)] / self.rates[self.positions(to_codes)]
+        return np.asarray(amounts, dtype=float) * rate, rate
+
+    def matrix(self, codes: Sequence[str]) -> np.ndarray:
+        """matrix[i, j] - сколько единиц codes[j] стоит одна единица codes[i]"""
+        rates = self.rates[self.positions(codes)]
+        return rates[:, None] / rates[None, :]
@@ -1,11 +1,30 @@
+import argparse
+import logging
 import requests
 import xml.etree.ElementTree as ET
 import sqlite3
-from datetime import datetime, timedelta
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Tuple
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+import cbr_parser
+import ohlc
+import rolling_stats
+from migrate import migrate
 
-def create_db():
-    conn = sqlite3.connect("currency.db")
+DB_PATH = "currency.db"
+CBR_DAILY_URL = "https://cbr.ru/scripts/XML_daily.asp"
+CBR_DYNAMIC_URL = "https://cbr.ru/scripts/XML_dynamic.asp"
+
+logger = logging.getLogger(__name__)
+
+
+def create_db(db_path: str = DB_PATH):
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS currency (
@@ -17,85 +36,309 @@ def create_db():
             nominal REAL
         )
     ''')
+    # Даты, за которые ЦБ не вернул курсов: при повторном запуске их не запрашиваем
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS backfill_empty (
+            date TEXT PRIMARY KEY
+        )
+    ''')
+    # Индексы и перевод старых дат dd/mm/yyyy в YYYY-MM-DD
+    migrate(conn)
+    rolling_stats.create_table(conn)
+    ohlc.create_table(conn)
     conn.commit()
     conn.close()
 
 
-def data_exists(date):
-    """Проверяет, есть ли данные за указанную дату в БД"""
-    conn = sqlite3.connect("currency.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM currency WHERE date = ?", (date,))
-    count = cursor.fetchone()[0]
-    conn.close()
-    return count > 0
+def missing_dates(conn, start: date, end: date):
+    """Даты периода, которых ещё нет в БД, - одним запросом"""
+    known = {
+        row[0] for row in conn.execute("""
+            SELECT DISTINCT date FROM currency WHERE date BETWEEN ? AND ?
+            UNION
+            SELECT date FROM backfill_empty WHERE date BETWEEN ? AND ?
+        """, (start.isoformat(), end.isoformat()) * 2)
+    }
+    # Перебираем только реальные календарные даты (31/02 и т.п. не запрашиваются)
+    days = (start + timedelta(days=i) for i in range((end - start).days + 1))
+    return [day for day in days if day.isoformat() not in known]
 
 
-def insert_data_bulk(date, rows):
-    """Вставляет список строк за указанную дату в БД за один запрос"""
-    conn = sqlite3.connect("currency.db")
-    cursor = conn.cursor()
-    # Оптимизация: выключаем синхронность и используем оперативный журнал
-    cursor.execute("PRAGMA synchronous = OFF")
-    cursor.execute("PRAGMA journal_mode = MEMORY")
-    cursor.executemany(
-        "INSERT INTO currency (date, currency_code, currency_name, value, nominal) VALUES (?, ?, ?, ?, ?)",
+class RateLimiter:
+    """Не более rate запросов в секунду на все потоки"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def create_session(pool_size: int) -> requests.Session:
+    """HTTP-сессия с пулом соединений и повтором при сетевых ошибках и 5xx"""
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def parse_rates(content: bytes, day: date):
+    """Строки (date, code, name, value, nominal) из XML_daily.asp с датой из ValCurs Date.
+
+    На выходной или праздник ЦБ отдаёт последние установленные курсы с их
+    собственной датой; такой день считается днём без курсов, как и в
+    XML_dynamic, иначе в таблице появились бы копии курсов под чужими датами.
+    """
+    iso_date, rates = cbr_parser.parse_daily(content)
+    if iso_date != day.isoformat():
+        return []
+    return [(iso_date, rate.code, rate.name, rate.value, rate.nominal) for rate in rates]
+
+
+def fetch_day(session: requests.Session, limiter: RateLimiter, day: date, url: str = CBR_DAILY_URL):
+    """Загрузка и разбор курсов за день (выполняется в рабочем потоке)"""
+    limiter.wait()
+    response = session.get(url, params={"date_req": day.strftime("%d/%m/%Y")}, timeout=15)
+    response.raise_for_status()
+    return parse_rates(response.content, day)
+
+
+def insert_data_bulk(conn, rows, empty_dates):
+    """Вставляет накопленные строки и пустые даты одной транзакцией"""
+    conn.executemany(
+        "INSERT OR REPLACE INTO currency (date, currency_code, currency_name, value, nominal) VALUES (?, ?, ?, ?, ?)",
         rows
     )
+    conn.executemany("INSERT OR IGNORE INTO backfill_empty (date) VALUES (?)", [(d,) for d in empty_dates])
     conn.commit()
+
+
+def fetch_days(conn, days, concurrency: int = 8, rate: float = 10.0, batch_days: int = 50,
+               url: str = CBR_DAILY_URL, session: requests.Session = None):
+    """Параллельная загрузка XML_daily за список дней, одна пишущая транзакция на пакет"""
+    session = session or create_session(concurrency)
+    limiter = RateLimiter(rate)
+    pending_rows, pending_empty = [], []
+    done = failed = 0
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(fetch_day, session, limiter, day, url): day for day in days}
+        for future in as_completed(futures):
+            day = futures[future]
+            try:
+                rows = future.result()
+            except (requests.RequestException, ET.ParseError, ValueError, AttributeError) as e:
+                logger.error(f"Ошибка получения данных за {day:%d/%m/%Y}: {e}")
+                failed += 1
+                continue
+
+            if rows:
+                pending_rows.extend(rows)
+            else:
+                pending_empty.append(day.isoformat())
+            done += 1
+
+            if done % batch_days == 0:
+                insert_data_bulk(conn, pending_rows, pending_empty)
+                pending_rows, pending_empty = [], []
+                elapsed = time.perf_counter() - started
+                logger.info(f"Загружено {done}/{len(days)} дней, {done / elapsed:.1f} дней/с")
+
+    insert_data_bulk(conn, pending_rows, pending_empty)
+    elapsed = time.perf_counter() - started
+    logger.info(f"Готово: {done} дней за {elapsed:.1f} с ({done / max(elapsed, 1e-9):.1f} дней/с), ошибок: {failed}")
+    return done
+
+
+def open_writer(db_path: str = DB_PATH) -> sqlite3.Connection:
+    """Единственное пишущее соединение загрузчика"""
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+
+def collect_data_for_period(start: date, end: date, concurrency: int = 8, rate: float = 10.0,
+                            batch_days: int = 50, db_path: str = DB_PATH, url: str = CBR_DAILY_URL):
+    """Догрузка недостающих дней по одному запросу XML_daily на день.
+
+    Каждый пакет фиксируется в БД сразу, поэтому после падения повторный запуск
+    продолжит с тех дат, которых ещё нет в таблице.
+    """
+    conn = open_writer(db_path)
+    days = missing_dates(conn, start, end)
+    logger.info(f"Период {start:%d/%m/%Y} - {end:%d/%m/%Y}: нужно загрузить {len(days)} дней")
+    done = 0
+    if days:
+        done = fetch_days(conn, days, concurrency, rate, batch_days, url)
+        # Статистика и свечи для новых дат пересчитываются один раз после загрузки
+        rolling_stats.backfill(conn)
+        ohlc.backfill(conn)
     conn.close()
+    return done
 
 
-def get_currency_rates(year: int, month: int):
-    print(f"Начинаем сбор данных за {month:02}/{year}")
-    for day in range(1, 32):
-        date_str = f"{day:02}/{month:02}/{year}"
+def catalog_dates(start: date, end: date) -> List[date]:
+    """Даты, по XML_daily за которые собирается справочник валют: границы периода и начало каждого года"""
+    days = {start, end}
+    days.update(date(year, 1, 10) for year in range(start.year, end.year + 1))
+    return sorted(day for day in days if start <= day <= end)
 
-        # Проверяем, есть ли уже данные за эту дату
-        if data_exists(date_str):
-            print(f"Данные за {date_str} уже существуют, пропускаем...")
-            continue
 
-        url = f"https://cbr.ru/scripts/XML_daily.asp?date_req={date_str}"
-        response = requests.get(url)
+def fetch_catalog(session: requests.Session, limiter: RateLimiter, days: List[date],
+                  url: str = CBR_DAILY_URL) -> Dict[str, Tuple[str, str]]:
+    """Справочник ID валюты ЦБ -> (код, название) по XML_daily за указанные даты"""
+    catalog = {}
+    for day in days:
+        limiter.wait()
+        response = session.get(url, params={"date_req": day.strftime("%d/%m/%Y")}, timeout=15)
+        response.raise_for_status()
+        for rate in cbr_parser.parse_daily(response.content)[1]:
+            catalog[rate.valute_id] = (rate.code, rate.name)
+    return catalog
 
-        if response.status_code != 200:
-            print(f"Ошибка получения данных за {date_str}")
-            continue
 
-        try:
-            root = ET.fromstring(response.content)
-        except Exception as e:
-            print(f"Ошибка парсинга XML за {date_str}: {e}")
-            continue
+def parse_dynamic(content: bytes, code: str, name: str):
+    """Разбор XML_dynamic.asp: строки (date, code, name, value, nominal)"""
+    for iso_date, nominal, value, _ in cbr_parser.parse_dynamic(content):
+        yield iso_date, code, name, value, nominal
+
+
+def fetch_dynamic(session: requests.Session, limiter: RateLimiter, valute_id: str, code: str, name: str,
+                  start: date, end: date, url: str = CBR_DYNAMIC_URL):
+    """Курсы одной валюты за весь период одним запросом (выполняется в рабочем потоке)"""
+    limiter.wait()
+    response = session.get(url, params={
+        "date_req1": start.strftime("%d/%m/%Y"),
+        "date_req2": end.strftime("%d/%m/%Y"),
+        "VAL_NM_RQ": valute_id,
+    }, timeout=60)
+    response.raise_for_status()
+    return list(parse_dynamic(response.content, code, name))
+
 
-        if not root.findall("Valute"):
-            print(f"Нет данных за {date_str}, пропускаем")
+def iter_dynamic(start: date, end: date, concurrency: int = 8, rate: float = 10.0,
+                 daily_url: str = CBR_DAILY_URL, dynamic_url: str = CBR_DYNAMIC_URL,
+                 session: requests.Session = None):
+    """Загрузка периода через XML_dynamic: по запросу на валюту.
+
+    Отдаёт (code, rows) по мере готовности; для валют, которые не удалось
+    загрузить, rows равен None - их нужно догрузить через XML_daily.
+    """
+    session = session or create_session(concurrency)
+    limiter = RateLimiter(rate)
+    catalog = fetch_catalog(session, limiter, catalog_dates(start, end), daily_url)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(fetch_dynamic, session, limiter, valute_id, code, name, start, end, dynamic_url): code
+            for valute_id, (code, name) in catalog.items()
+        }
+        for future in as_completed(futures):
+            code = futures[future]
+            try:
+                yield code, future.result()
+            except (requests.RequestException, ET.ParseError, ValueError, KeyError, AttributeError) as e:
+                logger.error(f"Ошибка XML_dynamic для {code}: {e}")
+                yield code, None
+
+
+def gap_dates(conn, code: str, start: date, end: date) -> List[date]:
+    """Дни периода, за которые есть курсы других валют, но нет курса code"""
+    rows = conn.execute("""
+        SELECT DISTINCT date FROM currency WHERE date BETWEEN ? AND ?
+        EXCEPT
+        SELECT date FROM currency WHERE currency_code = ? AND date BETWEEN ? AND ?
+    """, (start.isoformat(), end.isoformat(), code, start.isoformat(), end.isoformat())).fetchall()
+    return sorted(date.fromisoformat(row[0]) for row in rows)
+
+
+def collect_dynamic_for_period(start: date, end: date, concurrency: int = 8, rate: float = 10.0,
+                               db_path: str = DB_PATH, daily_url: str = CBR_DAILY_URL,
+                               dynamic_url: str = CBR_DYNAMIC_URL):
+    """Загрузка периода через XML_dynamic с откатом на XML_daily для сбойных валют.
+
+    Строки каждой валюты записываются и фиксируются сразу по получении, так что
+    в памяти одновременно держится не больше одного ответа на поток.
+    """
+    conn = open_writer(db_path)
+    session = create_session(concurrency)
+    started = time.perf_counter()
+    loaded, failed = 0, []
+
+    for code, rows in iter_dynamic(start, end, concurrency, rate, daily_url, dynamic_url, session):
+        if rows is None:
+            failed.append(code)
             continue
+        insert_data_bulk(conn, rows, [])
+        loaded += len(rows)
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"XML_dynamic: {loaded} курсов за {elapsed:.1f} с, сбойных валют: {len(failed)}")
+
+    gaps = sorted({day for code in failed for day in gap_dates(conn, code, start, end)})
+    if gaps:
+        logger.warning(f"Догрузка {len(gaps)} дней через XML_daily для {', '.join(failed)}")
+        fetch_days(conn, gaps, concurrency, rate, url=daily_url, session=session)
+
+    rolling_stats.backfill(conn)
+    ohlc.backfill(conn)
+    conn.close()
+    session.close()
+    return loaded
 
-        rows = []
-        for valute in root.findall("Valute"):
-            currency_code = valute.find("CharCode").text
-            currency_name = valute.find("Name").text
-            # Преобразуем значение курса, заменяя запятую на точку
-            value = float(valute.find("Value").text.replace(",", "."))
-            # Преобразуем номинал
-            nominal = float(valute.find("Nominal").text.replace(",", "."))
-            rows.append((date_str, currency_code, currency_name, value, nominal))
 
-        # Вставляем данные за один день за один запрос
-        insert_data_bulk(date_str, rows)
-        print(f"Успешно добавлены данные за {date_str}")
+def fetch_range(start: date, end: date, concurrency: int = 4, rate: float = 10.0,
+                daily_url: str = CBR_DAILY_URL, dynamic_url: str = CBR_DYNAMIC_URL):
+    """Все курсы за период без записи в БД (для CurrencyService.catch_up)"""
+    session = create_session(concurrency)
+    limiter = RateLimiter(rate)
+    rows, failed = [], False
+    try:
+        for code, currency_rows in iter_dynamic(start, end, concurrency, rate, daily_url, dynamic_url, session):
+            if currency_rows is None:
+                failed = True
+            else:
+                rows.extend(currency_rows)
+        if failed:
+            # Короткий период проще целиком перезапросить по дням
+            days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+            rows.extend(row for day in days for row in fetch_day(session, limiter, day, daily_url))
+    finally:
+        session.close()
+    return rows
 
 
-def collect_data_for_period(start_year: int, end_year: int):
-    for year in range(start_year, end_year + 1):
-        for month in range(1, 13):
-            get_currency_rates(year, month)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Загрузка истории курсов ЦБ РФ в currency.db")
+    parser.add_argument("--start", default="01/01/2012", help="dd/mm/yyyy")
+    parser.add_argument("--end", default=None, help="dd/mm/yyyy, по умолчанию сегодня")
+    parser.add_argument("--concurrency", type=int, default=8, help="число параллельных запросов")
+    parser.add_argument("--rate", type=float, default=10.0, help="не более запросов в секунду")
+    parser.add_argument("--batch", type=int, default=50, help="дней в одной транзакции")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--mode", choices=("daily", "dynamic"), default="dynamic",
+                        help="dynamic - один запрос XML_dynamic на валюту, daily - запрос на каждый день")
+    args = parser.parse_args()
 
+    start_date = datetime.strptime(args.start, "%d/%m/%Y").date()
+    end_date = datetime.strptime(args.end, "%d/%m/%Y").date() if args.end else date.today()
 
-# Создание базы данных (если ещё не создана)
-create_db()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
 
-# Запрос данных за период с 2012 по 2025 год
-collect_data_for_period(2012, 2025)
+    # Создание базы данных (если ещё не создана)
+    create_db(args.db)
+    if args.mode == "dynamic":
+        collect_dynamic_for_period(start_date, end_date, args.concurrency, args.rate, args.db)
+    else:
+        collect_data_for_period(start_date, end_date, args.concurrency, args.rate, args.batch, args.db)
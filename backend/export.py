@@ -0,0 +1,161 @@
+"""Потоковая выгрузка таблицы currency в CSV, NDJSON и Parquet.
+
+Строки читаются из курсора SQLite пачками по fetchmany и сразу превращаются
+в куски ответа, поэтому память не зависит от размера выгрузки. Parquet
+пишется по группе строк на пачку; для него нужен необязательный пакет
+pyarrow (pip install pyarrow).
+"""
+import csv
+import io
+import json
+import sqlite3
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+COLUMNS = ("date", "code", "name", "nominal", "value", "rate")
+# Строк в одной пачке CSV/NDJSON и в одной группе строк Parquet
+BATCH_ROWS = 10000
+PARQUET_BATCH_ROWS = 100000
+
+# Формат -> (тип содержимого, расширение файла)
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+Row = Tuple[str, str, str, float, float, float]
+
+
+def parquet_available() -> bool:
+    return pa is not None
+
+
+def batches(conn: sqlite3.Connection, codes: Optional[Sequence[str]], start: Optional[str],
+            end: Optional[str], size: int = BATCH_ROWS) -> Iterator[List[Row]]:
+    """Пачки строк (date, code, name, nominal, value, rate) в порядке валюты и даты.
+
+    Порядок совпадает с индексом (currency_code, date), поэтому SQLite отдаёт
+    строки по индексу без сортировки всей таблицы.
+    """
+    conditions, params = [], []
+    if codes:
+        conditions.append(f"currency_code IN ({', '.join('?' * len(codes))})")
+        params.extend(codes)
+    if start:
+        conditions.append("date >= ?")
+        params.append(start)
+    if end:
+        conditions.append("date <= ?")
+        params.append(end)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    cursor = conn.execute(f"""
+        SELECT date, currency_code, currency_name, nominal, value, value / nominal
+        FROM currency
+        {where}
+        ORDER BY currency_code, date
+    """, params)
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+
+def csv_chunks(row_batches: Iterator[List[Row]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(COLUMNS)
+    for rows in row_batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Заголовок пустой выгрузки
+        yield buffer.getvalue().encode()
+
+
+def ndjson_chunks(row_batches: Iterator[List[Row]]) -> Iterator[bytes]:
+    # Название валюты повторяется в каждой строке, JSON-строка для него строится один раз
+    names = {}
+    for rows in row_batches:
+        lines = []
+        for iso_date, code, name, nominal, value, rate in rows:
+            quoted = names.get(name)
+            if quoted is None:
+                quoted = names[name] = json.dumps(name, ensure_ascii=False)
+            lines.append(f'{{"date":"{iso_date}","code":"{code}","name":{quoted},'
+                         f'"nominal":{nominal!r},"value":{value!r},"rate":{rate!r}}}\n')
+        yield "".join(lines).encode()
+
+
+class _StreamSink(io.RawIOBase):
+    """Файл для ParquetWriter, записанное из которого забирается кусками.
+
+    tell() считает все записанные байты: по нему pyarrow вычисляет смещения
+    групп строк в метаданных файла.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def parquet_chunks(row_batches: Iterator[List[Row]]) -> Iterator[bytes]:
+    schema = pa.schema([
+        ("date", pa.string()),
+        ("code", pa.string()),
+        ("name", pa.string()),
+        ("nominal", pa.float64()),
+        ("value", pa.float64()),
+        ("rate", pa.float64()),
+    ])
+    sink = _StreamSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="zstd")
+    try:
+        for rows in row_batches:
+            columns = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+            ), row_group_size=len(rows))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def stream(conn: sqlite3.Connection, fmt: str, codes: Optional[Sequence[str]],
+           start: Optional[str], end: Optional[str]) -> Iterator[bytes]:
+    """Куски выгрузки в формате fmt; соединение закрывается по окончании или обрыве"""
+    try:
+        if fmt == "parquet":
+            yield from parquet_chunks(batches(conn, codes, start, end, PARQUET_BATCH_ROWS))
+        elif fmt == "ndjson":
+            yield from ndjson_chunks(batches(conn, codes, start, end))
+        else:
+            yield from csv_chunks(batches(conn, codes, start, end))
+    finally:
+        conn.close()
@@ -1,22 +1,62 @@
+import asyncio
+import hashlib
 import sqlite3
 import requests
 import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import Body, FastAPI, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+import numpy as np
 import pytz
 import logging
-from typing import List, Optional, Tuple
+import os
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
 from contextlib import contextmanager
 from pathlib import Path
 
+import cbr_parser
+import enject
+import export
+import ohlc
+import rolling_stats
+from cross_rates import BASE_CURRENCY, RateVector
+from migrate import migrate
+from rate_store import RateStore
+from response_cache import ResponseCache, ResponseCacheMiddleware
+from rolling_stats import RollingStats
+
 # Конфигурация
-DB_PATH = Path("currency.db")
+DB_PATH = Path(os.getenv("CURRENCY_DB", "currency.db"))
+# RATE_STORE=0 отключает снимок курсов в памяти, чтение идёт из SQLite
+RATE_STORE_ENABLED = os.getenv("RATE_STORE", "1") != "0"
+# RESPONSE_CACHE=0 отключает кэш готовых ответов API
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE", "1") != "0"
+# Наибольшая сумма размеров тел в кэше ответов
+RESPONSE_CACHE_BYTES = int(os.getenv("RESPONSE_CACHE_BYTES", 64 * 1024 * 1024))
+# Размер отображения файла БД в память для соединений чтения
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+# Наибольшее число пар в одном запросе /api/convert/batch
+MAX_BATCH_SIZE = 10000
+# Запросы к снимку в памяти больше стольких выборок уходят в пул потоков
+STORE_INLINE_LOOKUPS = 200
+# Разрешения истории; auto выбирает самое подробное, укладывающееся в points точек
+HISTORY_RESOLUTIONS = ("day",) + ohlc.RESOLUTIONS
+# Средняя длина периода в днях для оценки числа точек при resolution=auto
+PERIOD_DAYS = {"day": 1, "week": 7, "month": 30.4}
+# Дата позже любой в БД: "последние курсы" для выборок "не позже даты"
+MAX_ISO_DATE = "9999-12-31"
 CBR_URL = "https://www.cbr.ru/scripts/XML_daily.asp"
+CBR_DYNAMIC_URL = "https://www.cbr.ru/scripts/XML_dynamic.asp"
 MOSCOW_TZ = pytz.timezone("Europe/Moscow")
+# Обновление курсов по расписанию; по нему же считается срок хранения ответов
+UPDATE_TRIGGER = CronTrigger(hour="0,12", minute="5", timezone=MOSCOW_TZ)
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -26,8 +66,11 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="Currency Rates API",
     description="API для получения курсов валют ЦБ РФ",
-    version="1.0.0"
+    version="1.1.0"
 )
+response_cache = ResponseCache(UPDATE_TRIGGER, max_bytes=RESPONSE_CACHE_BYTES, enabled=RESPONSE_CACHE_ENABLED)
+# Кэш добавляется первым, чтобы CORS-заголовки ставились и на ответы из кэша
+app.add_middleware(ResponseCacheMiddleware, cache=response_cache, prefixes=("/api/currencies", "/api/crossrates"))
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -62,16 +105,63 @@ class CurrencyInfo(BaseModel):
 class HistoryEntry(BaseModel):
     date: str
     value: float
+    # Только для недель и месяцев: value - курс закрытия периода,
+    # date - последний день периода с курсом
+    open: Optional[float] = None
+    high: Optional[float] = None
+    low: Optional[float] = None
 
 
 class HistoryResponse(BaseModel):
     code: str
+    resolution: str
     history: List[HistoryEntry]
 
 
 class ConvertResponse(BaseModel):
+    result: float = Field(..., description="amount * rate, сумма в to_currency")
+    rate: float = Field(..., description="Сколько единиц to_currency стоит одна единица from_currency")
+
+
+class ConvertRequestItem(BaseModel):
+    from_currency: str
+    to_currency: str
+    amount: float = Field(..., gt=0, description="Сумма для конвертации")
+    date: Optional[str] = Field(None, pattern=r"^\d{2}/\d{2}/\d{4}$",
+                                description="dd/mm/yyyy, по умолчанию последняя дата с курсами")
+
+
+class ConvertBatchResult(BaseModel):
     result: float
     rate: float
+    # Дата курсов, по которым выполнена конвертация (dd/mm/yyyy)
+    date: str
+
+
+class AsOfRequest(BaseModel):
+    codes: List[str] = Field(..., min_length=1, max_length=100)
+    # Даты dd/mm/yyyy
+    dates: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+
+class AsOfSeries(BaseModel):
+    code: str
+    # Выровнены с AsOfResponse.dates: дата действовавшего курса и курс;
+    # None - на эту дату курса валюты ещё не было
+    rate_dates: List[Optional[str]]
+    rates: List[Optional[float]]
+
+
+class AsOfResponse(BaseModel):
+    dates: List[str]
+    currencies: List[AsOfSeries]
+
+
+class CrossRatesResponse(BaseModel):
+    date: str
+    codes: List[str]
+    # rates[i][j] - сколько единиц codes[j] стоит одна единица codes[i]
+    rates: List[List[float]]
 
 
 # Утилиты
@@ -80,22 +170,84 @@ def to_iso_date(date_str: str) -> str:
     return datetime.strptime(date_str, "%d/%m/%Y").strftime("%Y-%m-%d")
 
 
+def from_iso_date(iso_str: str) -> str:
+    """Конвертация даты из YYYY-MM-DD в dd/mm/yyyy (формат ответов API)"""
+    return f"{iso_str[8:10]}/{iso_str[5:7]}/{iso_str[0:4]}"
+
+
 class DatabaseManager:
-    """Управление базой данных SQLite"""
+    """Управление базой данных SQLite.
+
+    Запись идёт через одно соединение под блокировкой (writer), чтение - через
+    соединения только для чтения, по одному на поток пула обработчиков
+    (read_connection). Соединения живут между запросами, вместе с ними
+    переиспользуется кэш подготовленных выражений sqlite3.
+    """
+
+    _local = threading.local()
+    _readers: List[sqlite3.Connection] = []
+    _writer: Optional[sqlite3.Connection] = None
+    _write_lock = threading.Lock()
 
     @staticmethod
     @contextmanager
     def connection():
+        """Отдельное соединение для разовых операций"""
         conn = sqlite3.connect(DB_PATH)
         try:
             yield conn
         finally:
             conn.close()
 
+    @classmethod
+    @contextmanager
+    def writer(cls):
+        """Единственное соединение для записи; транзакция откатывается при ошибке"""
+        with cls._write_lock:
+            if cls._writer is None:
+                conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode = WAL")
+                conn.execute("PRAGMA synchronous = NORMAL")
+                cls._writer = conn
+            try:
+                yield cls._writer
+            except BaseException:
+                cls._writer.rollback()
+                raise
+
+    @staticmethod
+    def connect_read_only(mmap_size: int = SQLITE_MMAP_SIZE) -> sqlite3.Connection:
+        """Новое соединение только для чтения; может использоваться из разных потоков"""
+        conn = sqlite3.connect(f"{DB_PATH.resolve().as_uri()}?mode=ro", uri=True,
+                               check_same_thread=False, cached_statements=256)
+        conn.execute(f"PRAGMA mmap_size = {mmap_size}")
+        return conn
+
+    @classmethod
+    def read_connection(cls) -> sqlite3.Connection:
+        """Соединение только для чтения текущего потока"""
+        conn = getattr(cls._local, "conn", None)
+        if conn is None:
+            conn = cls.connect_read_only()
+            cls._local.conn = conn
+            cls._readers.append(conn)
+        return conn
+
+    @classmethod
+    def close(cls):
+        with cls._write_lock:
+            for conn in cls._readers:
+                conn.close()
+            cls._readers.clear()
+            cls._local = threading.local()
+            if cls._writer is not None:
+                cls._writer.close()
+                cls._writer = None
+
     @classmethod
     def init(cls):
-        """Инициализация базы данных"""
-        with cls.connection() as conn:
+        """Инициализация базы данных (даты хранятся в формате YYYY-MM-DD)"""
+        with cls.writer() as conn:
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS currency (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -103,54 +255,217 @@ class DatabaseManager:
                     currency_code TEXT,
                     currency_name TEXT,
                     value REAL,
-                    nominal REAL,
-                    UNIQUE(date, currency_code)
+                    nominal REAL
                 )
             """)
+            # Существующая база с датами dd/mm/yyyy переводится на новую схему
+            migrate(conn)
+            rolling_stats.create_table(conn)
+            ohlc.create_table(conn)
             conn.commit()
+            if rolling_stats.is_empty(conn):
+                rolling_stats.backfill(conn)
+            if ohlc.is_empty(conn):
+                ohlc.backfill(conn)
         logger.info("База данных инициализирована")
 
 
+class SqliteRates:
+    """Чтение курсов напрямую из SQLite (интерфейс совпадает с RateStore)"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def latest_date(self) -> Optional[str]:
+        """Последняя дата в БД (YYYY-MM-DD)"""
+        result = self.conn.execute("SELECT MAX(date) FROM currency").fetchone()
+        return result[0] if result else None
+
+    def currencies(self, iso_date: str) -> List[Tuple[str, str]]:
+        return self.conn.execute("""
+            SELECT DISTINCT currency_code, currency_name
+            FROM currency
+            WHERE date = ?
+            ORDER BY currency_code
+        """, (iso_date,)).fetchall()
+
+    def rate(self, code: str, iso_date: str) -> Optional[Tuple[str, float]]:
+        """Название и курс за единицу валюты ровно на дату"""
+        row = self.conn.execute("""
+            SELECT currency_name, value / nominal
+            FROM currency
+            WHERE date = ? AND currency_code = ?
+        """, (iso_date, code)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def rate_at_or_before(self, code: str, iso_date: str) -> Optional[Tuple[str, str, float]]:
+        """Дата, название и курс за последний день с курсом валюты не позже iso_date"""
+        row = self.conn.execute("""
+            SELECT date, currency_name, value / nominal
+            FROM currency
+            WHERE currency_code = ? AND date <= ?
+            ORDER BY date DESC
+            LIMIT 1
+        """, (code, iso_date)).fetchone()
+        return (row[0], row[1], row[2]) if row else None
+
+    def rates_at_or_before(self, iso_date: str) -> Tuple[Optional[str], List[Tuple[str, float]]]:
+        """Дата и курсы всех валют за последний день с курсами не позже iso_date"""
+        day = self.conn.execute("SELECT MAX(date) FROM currency WHERE date <= ?", (iso_date,)).fetchone()[0]
+        if day is None:
+            return None, []
+        return day, self.conn.execute("""
+            SELECT currency_code, value / nominal
+            FROM currency
+            WHERE date = ?
+            ORDER BY currency_code
+        """, (day,)).fetchall()
+
+    def statistics(self, code: str, iso_date: str) -> Optional[RollingStats]:
+        return rolling_stats.get(self.conn, code, iso_date)
+
+    def history(self, code: str, start: str, end: str) -> List[Tuple[str, float]]:
+        return self.conn.execute("""
+            SELECT date, value/nominal
+            FROM currency
+            WHERE currency_code = ? AND date BETWEEN ? AND ?
+            ORDER BY date ASC
+        """, (code, start, end)).fetchall()
+
+    def candles(self, code: str, resolution: str, start: str, end: str) -> List[ohlc.Candle]:
+        return ohlc.get(self.conn, code, resolution, start, end)
+
+
 class CurrencyService:
     """Логика работы с валютами"""
 
-    @staticmethod
-    def fetch_rates(date_str: str) -> List[Tuple[str, str, str, float, float]]:
-        """Получение данных с ЦБ РФ"""
+    # Снимок таблицы в памяти; None - чтение идёт из SQLite
+    store: Optional[RateStore] = None
+    # Последний ответ ЦБ для условных запросов: (URL, ETag, Last-Modified, хеш тела)
+    last_response: Tuple[Optional[str], ...] = (None, None, None, None)
+    # changed / not_modified (304) / unchanged (то же тело, разбор пропущен)
+    fetch_stats = Counter()
+
+    @classmethod
+    def fetch_rates(cls, date_str: str) -> Optional[List[Tuple[str, str, str, float, float]]]:
+        """Получение данных с ЦБ РФ; None, если ответ не изменился с прошлого запроса"""
+        url = f"{CBR_URL}?date_req={date_str}"
+        last_url, etag, last_modified, digest = cls.last_response
+        headers = {}
+        if last_url == url:
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
         try:
-            response = requests.get(f"{CBR_URL}?date_req={date_str}", timeout=10)
+            response = requests.get(url, headers=headers, timeout=10)
+            if response.status_code == 304:
+                cls.fetch_stats["not_modified"] += 1
+                return None
             response.raise_for_status()
-            root = ET.fromstring(response.content)
-            if not root.findall("Valute"):
+            new_digest = hashlib.sha256(response.content).hexdigest()
+            if last_url == url and new_digest == digest:
+                cls.fetch_stats["unchanged"] += 1
+                return None
+            iso_date, rates = cbr_parser.parse_daily(response.content)
+            if not rates or not iso_date:
                 raise ValueError(f"Нет данных за {date_str}")
 
-            return [
-                (
-                    date_str,
-                    valute.find("CharCode").text,
-                    valute.find("Name").text,
-                    float(valute.find("Value").text.replace(",", ".")),
-                    float(valute.find("Nominal").text.replace(",", "."))
-                )
-                for valute in root.findall("Valute")
-            ]
+            # Курсы хранятся под датой установки из ValCurs Date: на выходной или
+            # праздник ЦБ отдаёт прошлую публикацию, и под запрошенной датой она
+            # стала бы курсом, которого ЦБ не устанавливал
+            if iso_date != to_iso_date(date_str):
+                logger.info(f"ЦБ вернул курсы за {from_iso_date(iso_date)} на запрос за {date_str}")
+            rows = [(iso_date, rate.code, rate.name, rate.value, rate.nominal) for rate in rates]
+            # Запоминаем ответ только после успешного разбора
+            cls.last_response = (url, response.headers.get("ETag"), response.headers.get("Last-Modified"), new_digest)
+            cls.fetch_stats["changed"] += 1
+            return rows
         except (requests.RequestException, ET.ParseError, ValueError) as e:
             logger.error(f"Ошибка получения данных за {date_str}: {e}")
             raise
 
-    @staticmethod
-    def upsert_rates(rows: List[Tuple[str, str, str, float, float]]):
+    @classmethod
+    def upsert_rates(cls, rows: List[Tuple[str, str, str, float, float]]):
         """Обновление или вставка данных в БД"""
-        with DatabaseManager.connection() as conn:
+        with DatabaseManager.writer() as conn:
             conn.executemany("""
-                INSERT OR REPLACE INTO currency (id, date, currency_code, currency_name, value, nominal)
-                VALUES (
-                    (SELECT id FROM currency WHERE date = ? AND currency_code = ?),
-                    ?, ?, ?, ?, ?
-                )
-            """, [(r[0], r[1], *r) for r in rows])
+                INSERT INTO currency (date, currency_code, currency_name, value, nominal)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (currency_code, date) DO UPDATE SET
+                    currency_name = excluded.currency_name,
+                    value = excluded.value,
+                    nominal = excluded.nominal
+            """, rows)
+            rolling_stats.update_for_rows(conn, rows)
+            ohlc.update_for_rows(conn, rows)
             conn.commit()
-        logger.info(f"Обновлены данные за {rows[0][0]} ({len(rows)} валют)")
+        dates = sorted({row[0] for row in rows})
+        period = dates[0] if len(dates) == 1 else f"{dates[0]} - {dates[-1]}"
+        logger.info(f"Обновлены данные за {period} ({len(rows)} курсов)")
+        if RATE_STORE_ENABLED:
+            cls.reload_store()
+        response_cache.invalidate()
+
+    @classmethod
+    def reload_store(cls):
+        """Загрузка нового снимка в память и атомарная замена текущего"""
+        cls.store = RateStore.load(DatabaseManager.read_connection())
+
+    @classmethod
+    @contextmanager
+    def reader(cls):
+        """Источник данных для одного запроса: снимок в памяти или соединение с БД"""
+        store = cls.store
+        if store is not None:
+            yield store
+        else:
+            yield SqliteRates(DatabaseManager.read_connection())
+
+    @classmethod
+    async def read(cls, query, *args, lookups: int = 1):
+        """query(reader, *args) для обработчика запроса.
+
+        По снимку в памяти запрос выполняется сразу в цикле событий, если в нём
+        не больше STORE_INLINE_LOOKUPS выборок (lookups); пакетные запросы и
+        чтение из SQLite уходят в пул потоков, чтобы не задерживать остальные.
+        """
+        store = cls.store
+        if store is not None:
+            if lookups <= STORE_INLINE_LOOKUPS:
+                return query(store, *args)
+            return await run_in_threadpool(query, store, *args)
+        return await run_in_threadpool(lambda: query(SqliteRates(DatabaseManager.read_connection()), *args))
+
+    @classmethod
+    def catch_up(cls) -> int:
+        """Догрузка дней, пропущенных за время простоя, через XML_dynamic (запрос на валюту)"""
+        with cls.reader() as reader:
+            last_date = reader.latest_date()
+        if not last_date:
+            return 0
+
+        start = datetime.strptime(last_date, "%Y-%m-%d").date() + timedelta(days=1)
+        end = datetime.now().date() - timedelta(days=1)
+        if start > end:
+            return 0
+
+        rows = enject.fetch_range(start, end, daily_url=CBR_URL, dynamic_url=CBR_DYNAMIC_URL)
+        if rows:
+            cls.upsert_rates(rows)
+        return len(rows)
+
+    @classmethod
+    def initial_update(cls, force_sync: bool = False) -> bool:
+        """Снимок в память, догрузка пропущенных дней и курсы за сегодня при запуске"""
+        if RATE_STORE_ENABLED:
+            cls.reload_store()
+        # Догрузка пропущенных дней, если сервис был остановлен
+        try:
+            cls.catch_up()
+        except Exception as e:
+            logger.error(f"Ошибка догрузки пропущенных дней: {e}")
+        return cls.update_today(force_sync=force_sync)
 
     @classmethod
     def update_today(cls, force_sync: bool = False):
@@ -158,6 +473,10 @@ class CurrencyService:
         today = datetime.now().strftime("%d/%m/%Y")
         try:
             rows = cls.fetch_rates(today)
+            if rows is None:
+                logger.info(f"Данные за {today} не изменились, обновление пропущено "
+                            f"(не изменились: {cls.fetch_stats['not_modified'] + cls.fetch_stats['unchanged']})")
+                return True
             cls.upsert_rates(rows)
         except Exception as e:
             logger.error(f"Ошибка обновления данных за {today}: {e}")
@@ -166,157 +485,264 @@ class CurrencyService:
             return False
         return True
 
-    @staticmethod
-    def latest_date() -> Optional[str]:
-        """Получение последней даты из БД"""
-        with DatabaseManager.connection() as conn:
-            result = conn.execute("""
-                SELECT date 
-                FROM currency 
-                ORDER BY strftime('%Y-%m-%d', 
-                        substr(date, 7, 4) || '-' || 
-                        substr(date, 4, 2) || '-' || 
-                        substr(date, 1, 2)) DESC 
-                LIMIT 1
-            """).fetchone()
-            return result[0] if result else None
 
-    @staticmethod
-    def get_rate_at_or_before(cursor, code: str, target_date: str) -> Optional[float]:
-        """Получение курса на дату или ближайшую предыдущую дату"""
-        iso_target = to_iso_date(target_date)
-        row = cursor.execute("""
-            SELECT value, nominal
-            FROM currency
-            WHERE currency_code = ? AND 
-                  strftime('%Y-%m-%d', substr(date, 7, 4) || '-' || 
-                  substr(date, 4, 2) || '-' || substr(date, 1, 2)) <= ?
-            ORDER BY strftime('%Y-%m-%d', substr(date, 7, 4) || '-' || 
-                    substr(date, 4, 2) || '-' || substr(date, 1, 2)) DESC
-            LIMIT 1
-        """, (code, iso_target)).fetchone()
-        if row:
-            logger.debug(f"Найден курс для {code} на {target_date}: {row[0] / row[1]}")
-            return row[0] / row[1]
-        logger.warning(f"Нет данных для {code} на или до {target_date}")
-        return None
-
-
-# API эндпоинты
-@app.get("/api/currencies/{code}", response_model=CurrencyRateResponse)
-async def get_currency(code: str):
-    code = code.upper()
-    last_date = CurrencyService.latest_date()
-    if not last_date:
-        raise HTTPException(status_code=404, detail="Нет данных в базе")
+def shift_date(iso_date: str, days: int) -> str:
+    """Сдвиг даты YYYY-MM-DD на указанное число дней назад"""
+    return (datetime.strptime(iso_date, "%Y-%m-%d") - timedelta(days=days)).strftime("%Y-%m-%d")
 
-    last_date_obj = datetime.strptime(last_date, "%d/%m/%Y")
 
-    with DatabaseManager.connection() as conn:
-        cursor = conn.cursor()
+# Запросы к источнику курсов (RateStore или SqliteRates) для эндпоинтов
+def currency_rate(reader, code: str, as_of: Optional[str] = None) -> CurrencyRateResponse:
+    if as_of is None:
+        last_date = reader.latest_date()
+        if not last_date:
+            raise HTTPException(status_code=404, detail="Нет данных в базе")
 
         # Текущий курс
-        row = cursor.execute("""
-            SELECT currency_code, currency_name, value, nominal
-            FROM currency
-            WHERE date = ? AND currency_code = ?
-        """, (last_date, code)).fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail=f"Нет данных для {code} за {last_date}")
-
-        curr_code, curr_name, value, nominal = row
-        rate = value / nominal
-
-        # Дневное изменение
-        yesterday = (last_date_obj - timedelta(days=1)).strftime("%d/%m/%Y")
-        row_y = cursor.execute("""
-            SELECT value, nominal
-            FROM currency
-            WHERE date = ? AND currency_code = ?
-        """, (yesterday, code)).fetchone()
-        daily_change = (rate - (row_y[0] / row_y[1])) if row_y else 0.0
-
-        # Статистика за 7 дней
-        seven_days_ago = (last_date_obj - timedelta(days=7)).strftime("%Y-%m-%d")
-        high7d, low7d = cursor.execute("""
-            SELECT MAX(value/nominal), MIN(value/nominal)
-            FROM currency
-            WHERE currency_code = ? AND 
-                  strftime('%Y-%m-%d', substr(date, 7, 4) || '-' || 
-                  substr(date, 4, 2) || '-' || substr(date, 1, 2)) >= ?
-        """, (code, seven_days_ago)).fetchone() or (rate, rate)
-        high7d = high7d or rate
-        low7d = low7d or rate
-
-        # Изменение за 14 дней
-        date_14 = (last_date_obj - timedelta(days=14)).strftime("%d/%m/%Y")
-        rate_14 = CurrencyService.get_rate_at_or_before(cursor, code, date_14)
-        change14d = (rate - rate_14) if rate_14 is not None else 0.0
-
-        # Изменение за 30 дней
-        date_30 = (last_date_obj - timedelta(days=30)).strftime("%d/%m/%Y")
-        rate_30 = CurrencyService.get_rate_at_or_before(cursor, code, date_30)
-        change30d = (rate - rate_30) if rate_30 is not None else 0.0
+        current = reader.rate(code, last_date)
+        if not current:
+            raise HTTPException(status_code=404, detail=f"Нет данных для {code} за {from_iso_date(last_date)}")
+        curr_name, rate = current
+    else:
+        # Курс, действовавший на as_of: в выходные и праздники - установленный в последний рабочий день
+        quote = reader.rate_at_or_before(code, as_of)
+        if not quote:
+            raise HTTPException(status_code=404, detail=f"Нет данных для {code} на {from_iso_date(as_of)}")
+        last_date, curr_name, rate = quote
+
+    # Изменение за день, максимум/минимум за 7 дней и изменения за 14/30 дней
+    stats = reader.statistics(code, last_date)
 
     return CurrencyRateResponse(
-        code=curr_code,
+        code=code,
         name=curr_name,
         rate=rate,
-        change=daily_change,
-        last_updated=last_date_obj.isoformat(),
+        change=stats.change1d,
+        last_updated=datetime.strptime(last_date, "%Y-%m-%d").isoformat(),
         statistics=Statistics(
-            high7d=high7d,
-            low7d=low7d,
-            change14d=change14d,
-            change30d=change30d
+            high7d=stats.high7d,
+            low7d=stats.low7d,
+            change14d=stats.change14d,
+            change30d=stats.change30d
         )
     )
 
 
-@app.get("/api/currencies", response_model=List[CurrencyInfo])
-async def get_currencies():
-    last_date = CurrencyService.latest_date()
+def currency_list(reader) -> List[CurrencyInfo]:
+    last_date = reader.latest_date()
     if not last_date:
         raise HTTPException(status_code=404, detail="Нет данных в базе")
 
-    with DatabaseManager.connection() as conn:
-        rows = conn.execute("""
-            SELECT DISTINCT currency_code, currency_name
-            FROM currency
-            WHERE date = ?
-        """, (last_date,)).fetchall()
-        return [CurrencyInfo(code=row[0], name=row[1]) for row in rows]
+    rows = reader.currencies(last_date)
+    return [CurrencyInfo(code=row[0], name=row[1]) for row in rows]
 
 
-@app.get("/api/currencies/{code}/history", response_model=List[HistoryEntry])
-async def get_history(code: str, days: int = Query(30, ge=1, le=365)):
-    code = code.upper()
-    last_date = CurrencyService.latest_date()
+def recent_history(reader, code: str, days: int) -> List[HistoryEntry]:
+    last_date = reader.latest_date()
     if not last_date:
         raise HTTPException(status_code=404, detail="Нет данных в базе")
 
-    start_date = (datetime.strptime(last_date, "%d/%m/%Y") - timedelta(days=days)).strftime("%Y-%m-%d")
-
-    with DatabaseManager.connection() as conn:
-        rows = conn.execute("""
-            SELECT date, value/nominal
-            FROM currency
-            WHERE currency_code = ? AND 
-                  strftime('%Y-%m-%d', substr(date, 7, 4) || '-' || 
-                  substr(date, 4, 2) || '-' || substr(date, 1, 2)) >= ?
-            ORDER BY strftime('%Y-%m-%d', substr(date, 7, 4) || '-' || 
-                    substr(date, 4, 2) || '-' || substr(date, 1, 2)) ASC
-        """, (code, start_date)).fetchall()
+    rows = reader.history(code, shift_date(last_date, days), last_date)
+    if not rows:
+        raise HTTPException(status_code=404, detail=f"Нет истории для {code}")
+    return [HistoryEntry(date=from_iso_date(row[0]), value=row[1]) for row in rows]
+
+
+def choose_resolution(start: str, end: str, points: int) -> str:
+    """Самое подробное разрешение, при котором в [start, end] не больше points точек"""
+    days = (datetime.strptime(end, "%Y-%m-%d") - datetime.strptime(start, "%Y-%m-%d")).days + 1
+    for resolution in HISTORY_RESOLUTIONS:
+        if days / PERIOD_DAYS[resolution] <= points:
+            return resolution
+    return HISTORY_RESOLUTIONS[-1]
+
+
+def history_between(reader, code: str, start: str, end: str, resolution: str = "day") -> HistoryResponse:
+    if resolution == "day":
+        rows = reader.history(code, start, end)
+        history = [HistoryEntry(date=from_iso_date(row[0]), value=row[1]) for row in rows]
+    else:
+        history = [
+            HistoryEntry(date=from_iso_date(candle.date), value=candle.close,
+                         open=candle.open, high=candle.high, low=candle.low)
+            for candle in reader.candles(code, resolution, start, end)
+        ]
+    if not history:
+        raise HTTPException(status_code=404, detail=f"Нет данных для {code} в диапазоне")
+    return HistoryResponse(code=code, resolution=resolution, history=history)
+
+
+def unit_rate(reader, code: str, iso_date: str, at_or_before: bool = False) -> Optional[float]:
+    """Рублей за единицу валюты ровно на дату или на последний день с курсом не позже неё"""
+    if code == BASE_CURRENCY:
+        # Рубль - база курсов ЦБ
+        return 1.0
+    if at_or_before:
+        quote = reader.rate_at_or_before(code, iso_date)
+        return quote[2] if quote else None
+    row = reader.rate(code, iso_date)
+    return row[1] if row else None
+
+
+def conversion(reader, from_currency: str, to_currency: str, amount: float,
+               as_of: Optional[str] = None) -> ConvertResponse:
+    if as_of is None:
+        iso_date = reader.latest_date()
+        if not iso_date:
+            raise HTTPException(status_code=404, detail="Нет данных в базе")
+    else:
+        iso_date = as_of
+
+    from_rate = unit_rate(reader, from_currency, iso_date, at_or_before=as_of is not None)
+    to_rate = unit_rate(reader, to_currency, iso_date, at_or_before=as_of is not None)
+
+    if from_rate is None or to_rate is None:
+        raise HTTPException(status_code=404, detail="Валюта не найдена")
+
+    # Единица from_currency стоит from_rate рублей, то есть from_rate / to_rate единиц to_currency
+    rate = from_rate / to_rate
+    return ConvertResponse(result=amount * rate, rate=rate)
+
+
+def rate_vector(reader, iso_date: Optional[str]) -> RateVector:
+    """Курсы всех валют за последний день с курсами не позже iso_date (None - последний в БД)"""
+    day, rates = reader.rates_at_or_before(iso_date or MAX_ISO_DATE)
+    if day is None:
+        detail = f"Нет курсов на {from_iso_date(iso_date)}" if iso_date else "Нет данных в базе"
+        raise HTTPException(status_code=404, detail=detail)
+    return RateVector(day, rates)
+
+
+def check_codes(vector: RateVector, codes: Iterable[str]):
+    unknown = vector.unknown(codes)
+    if unknown:
+        raise HTTPException(status_code=404,
+                            detail=f"Валюта не найдена за {from_iso_date(vector.iso_date)}: {', '.join(unknown)}")
+
+
+def batch_conversion(reader, items: List[Tuple[Optional[str], str, str, float]]) -> List[ConvertBatchResult]:
+    """Конвертация (iso_date, from, to, amount): один вектор курсов на каждую дату"""
+    by_date: Dict[Optional[str], List[int]] = {}
+    for i, item in enumerate(items):
+        by_date.setdefault(item[0], []).append(i)
+
+    results: List[Optional[ConvertBatchResult]] = [None] * len(items)
+    for iso_date, positions in by_date.items():
+        vector = rate_vector(reader, iso_date)
+        from_codes = [items[i][1] for i in positions]
+        to_codes = [items[i][2] for i in positions]
+        check_codes(vector, from_codes + to_codes)
+        amounts, rates = vector.convert(from_codes, to_codes, [items[i][3] for i in positions])
+        label = from_iso_date(vector.iso_date)
+        for i, result, rate in zip(positions, amounts.tolist(), rates.tolist()):
+            results[i] = ConvertBatchResult(result=result, rate=rate, date=label)
+    return results
+
+
+def rates_as_of(reader, codes: List[str], iso_dates: List[str]) -> AsOfResponse:
+    """Курсы валют на каждую из дат: последний день с курсом не позже даты.
+
+    По каждой валюте читается один отрезок истории от курса на самую раннюю
+    дату до самой поздней, даты ищутся в нём бинарным поиском numpy.
+    """
+    labels = [from_iso_date(iso_date) for iso_date in iso_dates]
+    queries = np.array(iso_dates)
+    start, end = min(iso_dates), max(iso_dates)
+    currencies = []
+    for code in codes:
+        if code == BASE_CURRENCY:
+            currencies.append(AsOfSeries(code=code, rate_dates=labels, rates=[1.0] * len(labels)))
+            continue
+        if reader.rate_at_or_before(code, MAX_ISO_DATE) is None:
+            raise HTTPException(status_code=404, detail=f"Валюта не найдена: {code}")
+        first = reader.rate_at_or_before(code, start)
+        rows = reader.history(code, first[0] if first else start, end)
         if not rows:
-            raise HTTPException(status_code=404, detail=f"Нет истории для {code}")
-        return [HistoryEntry(date=row[0], value=row[1]) for row in rows]
+            currencies.append(AsOfSeries(code=code, rate_dates=[None] * len(labels), rates=[None] * len(labels)))
+            continue
+        days = np.array([row[0] for row in rows])
+        positions = np.searchsorted(days, queries, side="right") - 1
+        row_labels = [from_iso_date(row[0]) for row in rows]
+        rate_dates = [row_labels[i] for i in positions.tolist()]
+        rates = np.array([row[1] for row in rows])[positions].tolist()
+        # Даты раньше первого курса валюты
+        for i in np.flatnonzero(positions < 0).tolist():
+            rate_dates[i] = rates[i] = None
+        currencies.append(AsOfSeries(code=code, rate_dates=rate_dates, rates=rates))
+    return AsOfResponse(dates=labels, currencies=currencies)
+
+
+def cross_rate_matrix(reader, codes: Optional[List[str]], iso_date: Optional[str]) -> CrossRatesResponse:
+    vector = rate_vector(reader, iso_date)
+    if codes:
+        check_codes(vector, codes)
+    else:
+        codes = vector.codes
+    return CrossRatesResponse(date=from_iso_date(vector.iso_date), codes=codes, rates=vector.matrix(codes).tolist())
+
+
+def unknown_codes(reader, codes: List[str]) -> List[str]:
+    return [code for code in codes if reader.rate_at_or_before(code, MAX_ISO_DATE) is None]
+
+
+def parse_api_date(date_str: Optional[str]) -> Optional[str]:
+    """dd/mm/yyyy из запроса -> YYYY-MM-DD; несуществующая дата - ошибка 400"""
+    if date_str is None:
+        return None
+    try:
+        return to_iso_date(date_str)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Ошибка даты: {str(e)}")
+
+
+def parse_as_of(date_str: Optional[str]) -> Optional[str]:
+    """Дата as_of; курсов на будущие даты нет, поэтому они - ошибка 400"""
+    iso_date = parse_api_date(date_str)
+    if iso_date is not None and iso_date > datetime.now(MOSCOW_TZ).strftime("%Y-%m-%d"):
+        raise HTTPException(status_code=400, detail=f"Дата {date_str} ещё не наступила")
+    return iso_date
 
 
-@app.get("/api/currencies/{code}/history_range", response_model=HistoryResponse)
+# API эндпоинты
+@app.get("/api/currencies/{code}", response_model=CurrencyRateResponse)
+async def get_currency(
+        code: str,
+        as_of: Optional[str] = Query(None, pattern=r"^\d{2}/\d{2}/\d{4}$",
+                                     description="dd/mm/yyyy, курс, действовавший на дату")
+):
+    return await CurrencyService.read(currency_rate, code.upper(), parse_as_of(as_of))
+
+
+@app.post("/api/currencies/as_of", response_model=AsOfResponse)
+async def get_rates_as_of(request: AsOfRequest):
+    """Курсы валют на список дат (например, для бухгалтерской выгрузки)"""
+    parsed = {}
+    for date_str in request.dates:
+        if date_str not in parsed:
+            parsed[date_str] = parse_as_of(date_str)
+    iso_dates = [parsed[date_str] for date_str in request.dates]
+    codes = list(dict.fromkeys(code.upper() for code in request.codes))
+    return await CurrencyService.read(rates_as_of, codes, iso_dates, lookups=len(codes) * len(iso_dates))
+
+
+@app.get("/api/currencies", response_model=List[CurrencyInfo])
+async def get_currencies():
+    return await CurrencyService.read(currency_list)
+
+
+@app.get("/api/currencies/{code}/history", response_model=List[HistoryEntry])
+async def get_history(code: str, days: int = Query(30, ge=1, le=365)):
+    return await CurrencyService.read(recent_history, code.upper(), days)
+
+
+@app.get("/api/currencies/{code}/history_range", response_model=HistoryResponse, response_model_exclude_none=True)
 async def get_history_range(
         code: str,
         start: str = Query(..., regex=r"^\d{2}/\d{2}/\d{4}$", description="dd/mm/yyyy"),
-        end: str = Query(..., regex=r"^\d{2}/\d{2}/\d{4}$", description="dd/mm/yyyy")
+        end: str = Query(..., regex=r"^\d{2}/\d{2}/\d{4}$", description="dd/mm/yyyy"),
+        resolution: str = Query("day", pattern=r"^(day|week|month|auto)$",
+                                description="day, week, month (OHLC) или auto"),
+        points: int = Query(500, ge=10, le=10000, description="Наибольшее число точек для resolution=auto")
 ):
     code = code.upper()
     try:
@@ -327,77 +753,113 @@ async def get_history_range(
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"Ошибка даты: {str(e)}")
 
-    with DatabaseManager.connection() as conn:
-        rows = conn.execute("""
-            SELECT date, value/nominal
-            FROM currency
-            WHERE currency_code = ? AND 
-                  strftime('%Y-%m-%d', substr(date, 7, 4) || '-' || 
-                  substr(date, 4, 2) || '-' || substr(date, 1, 2)) 
-                  BETWEEN ? AND ?
-            ORDER BY strftime('%Y-%m-%d', substr(date, 7, 4) || '-' || 
-                    substr(date, 4, 2) || '-' || substr(date, 1, 2)) ASC
-        """, (code, to_iso_date(start), to_iso_date(end))).fetchall()
-        if not rows:
-            raise HTTPException(status_code=404, detail=f"Нет данных для {code} в диапазоне")
-        return HistoryResponse(
-            code=code,
-            history=[HistoryEntry(date=row[0], value=row[1]) for row in rows]
-        )
+    start, end = to_iso_date(start), to_iso_date(end)
+    if resolution == "auto":
+        resolution = choose_resolution(start, end, points)
+    return await CurrencyService.read(history_between, code, start, end, resolution)
 
 
 @app.get("/api/convert", response_model=ConvertResponse)
 async def convert(
         from_currency: str,
         to_currency: str,
-        amount: float = Query(..., gt=0, description="Сумма для конвертации")
+        amount: float = Query(..., gt=0, description="Сумма для конвертации"),
+        as_of: Optional[str] = Query(None, pattern=r"^\d{2}/\d{2}/\d{4}$",
+                                     description="dd/mm/yyyy, по курсам, действовавшим на дату")
 ):
-    from_currency, to_currency = from_currency.upper(), to_currency.upper()
-    last_date = CurrencyService.latest_date()
-    if not last_date:
-        raise HTTPException(status_code=404, detail="Нет данных в базе")
-
-    with DatabaseManager.connection() as conn:
-        row_from = conn.execute("""
-            SELECT value, nominal
-            FROM currency
-            WHERE date = ? AND currency_code = ?
-        """, (last_date, from_currency)).fetchone()
-        row_to = conn.execute("""
-            SELECT value, nominal
-            FROM currency
-            WHERE date = ? AND currency_code = ?
-        """, (last_date, to_currency)).fetchone()
-
-        if not row_from or not row_to:
-            raise HTTPException(status_code=404, detail="Валюта не найдена")
-
-        from_rate = row_from[0] / row_from[1]
-        to_rate = row_to[0] / row_to[1]
-        rate = to_rate / from_rate
-        return ConvertResponse(result=amount * rate, rate=rate)
+    """Перевод amount единиц from_currency в to_currency.
+
+    С версии API 1.1.0 rate - цена единицы from_currency в to_currency
+    (USD -> RUB даёт курс доллара). До 1.1.0 возвращалось обратное значение,
+    цена единицы to_currency в from_currency; клиентам, которые его
+    пересчитывали, нужно убрать обращение 1 / rate.
+    """
+    return await CurrencyService.read(conversion, from_currency.upper(), to_currency.upper(), amount,
+                                      parse_as_of(as_of))
+
+
+@app.post("/api/convert/batch", response_model=List[ConvertBatchResult])
+async def convert_batch(items: List[ConvertRequestItem] = Body(..., max_length=MAX_BATCH_SIZE)):
+    """Пакетная конвертация; результаты идут в порядке запроса"""
+    dates = {item.date: parse_api_date(item.date) for item in items}
+    batch = [(dates[item.date], item.from_currency.upper(), item.to_currency.upper(), item.amount)
+             for item in items]
+    return await CurrencyService.read(batch_conversion, batch, lookups=len(batch))
+
+
+@app.get("/api/crossrates", response_model=CrossRatesResponse)
+async def get_crossrates(
+        codes: Optional[str] = Query(None, description="Коды через запятую, по умолчанию все валюты и RUB"),
+        date: Optional[str] = Query(None, pattern=r"^\d{2}/\d{2}/\d{4}$", description="dd/mm/yyyy")
+):
+    code_list = None
+    if codes:
+        code_list = list(dict.fromkeys(code.strip().upper() for code in codes.split(",") if code.strip()))
+    return await CurrencyService.read(cross_rate_matrix, code_list, parse_api_date(date))
+
+
+@app.get("/api/export")
+async def export_rates(
+        format: str = Query("csv", pattern=r"^(csv|ndjson|parquet)$", description="csv, ndjson или parquet"),
+        codes: Optional[str] = Query(None, description="Коды через запятую, по умолчанию все валюты"),
+        start: Optional[str] = Query(None, pattern=r"^\d{2}/\d{2}/\d{4}$", description="dd/mm/yyyy"),
+        end: Optional[str] = Query(None, pattern=r"^\d{2}/\d{2}/\d{4}$", description="dd/mm/yyyy")
+):
+    """Выгрузка истории курсов (даты YYYY-MM-DD), строки идут в порядке валюты и даты.
+
+    Ответ отдаётся потоком прямо из курсора SQLite на отдельном соединении,
+    поэтому память сервиса не растёт с размером выгрузки.
+    """
+    if format == "parquet" and not export.parquet_available():
+        raise HTTPException(status_code=501, detail="Выгрузка в Parquet недоступна: не установлен pyarrow")
+    start, end = parse_api_date(start), parse_api_date(end)
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="Ошибка даты: Начальная дата позже конечной")
+    code_list = None
+    if codes:
+        code_list = list(dict.fromkeys(code.strip().upper() for code in codes.split(",") if code.strip()))
+        unknown = await CurrencyService.read(unknown_codes, code_list)
+        if unknown:
+            raise HTTPException(status_code=404, detail=f"Валюта не найдена: {', '.join(unknown)}")
+
+    media_type, extension = export.FORMATS[format]
+    # Синхронный генератор Starlette читает в пуле потоков, по куску за шаг.
+    # Без mmap: проход по всей таблице отобразил бы в память процесса весь файл БД
+    chunks = export.stream(DatabaseManager.connect_read_only(mmap_size=0), format, code_list, start, end)
+    return StreamingResponse(chunks, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="rates.{extension}"'})
 
 
 @app.on_event("startup")
 async def startup():
-    # Инициализация базы данных
-    DatabaseManager.init()
-
-    # Синхронное обновление данных при запуске
-    if not CurrencyService.update_today(force_sync=True):
+    # Инициализация базы данных; работа с SQLite и ЦБ идёт вне цикла событий
+    await run_in_threadpool(DatabaseManager.init)
+    has_data = await run_in_threadpool(lambda: SqliteRates(DatabaseManager.read_connection()).latest_date())
+
+    if has_data:
+        # Сервис сразу отвечает по имеющимся данным, обновление идёт в фоне
+        app.state.initial_update = asyncio.create_task(run_in_threadpool(CurrencyService.initial_update))
+    elif not await run_in_threadpool(CurrencyService.initial_update, True):
+        # В пустой базе отвечать нечем, поэтому без начальных данных не стартуем
         logger.error("Не удалось обновить данные при запуске")
         raise RuntimeError("Не удалось выполнить начальное обновление данных")
 
-    # Настройка планировщика для асинхронных обновлений
+    # Задачи с обычной функцией AsyncIOScheduler выполняет в пуле потоков цикла
     scheduler = AsyncIOScheduler(timezone=MOSCOW_TZ)
-    scheduler.add_job(
-        CurrencyService.update_today,
-        CronTrigger(hour="0,12", minute="5", timezone=MOSCOW_TZ)
-    )
+    scheduler.add_job(CurrencyService.update_today, UPDATE_TRIGGER, coalesce=True, max_instances=1)
     scheduler.start()
+    app.state.scheduler = scheduler
     logger.info("Планировщик запущен: обновление в 00:05 и 12:05 MSK")
 
 
+@app.on_event("shutdown")
+async def shutdown():
+    scheduler = getattr(app.state, "scheduler", None)
+    if scheduler is not None:
+        scheduler.shutdown(wait=False)
+    DatabaseManager.close()
+
+
 if __name__ == "__main__":
     import uvicorn
 
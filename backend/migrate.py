@@ -0,0 +1,88 @@
+import sqlite3
+import sys
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Версия схемы хранится в PRAGMA user_version
+SCHEMA_VERSION = 1
+BATCH_SIZE = 20000
+
+# Даты в старом формате dd/mm/yyyy
+LEGACY_DATE_PATTERN = "__/__/____"
+LEGACY_TO_ISO = "substr(date, 7, 4) || '-' || substr(date, 4, 2) || '-' || substr(date, 1, 2)"
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def create_indexes(conn: sqlite3.Connection):
+    """Индексы для выборок по валюте и дате"""
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_currency_code_date ON currency (currency_code, date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_currency_date ON currency (date)")
+
+
+def convert_dates(conn: sqlite3.Connection, batch_size: int = BATCH_SIZE) -> int:
+    """Перевод дат dd/mm/yyyy в YYYY-MM-DD пакетами по rowid.
+
+    Каждый пакет фиксируется отдельной транзакцией, а уже переведённые строки
+    не попадают под условие LIKE, поэтому прерванную миграцию можно просто
+    запустить повторно.
+    """
+    max_id = conn.execute("SELECT MAX(rowid) FROM currency").fetchone()[0] or 0
+    converted = 0
+    for start in range(0, max_id + 1, batch_size):
+        cursor = conn.execute(f"""
+            UPDATE OR REPLACE currency
+            SET date = {LEGACY_TO_ISO}
+            WHERE rowid >= ? AND rowid < ? AND date LIKE ?
+        """, (start, start + batch_size, LEGACY_DATE_PATTERN))
+        conn.commit()
+        converted += cursor.rowcount
+        if cursor.rowcount:
+            logger.info(f"Переведено {converted} строк (rowid < {start + batch_size})")
+    return converted
+
+
+def remove_duplicates(conn: sqlite3.Connection) -> int:
+    """Удаление дублей (enject.py не создавал UNIQUE), остаётся последняя запись"""
+    cursor = conn.execute("""
+        DELETE FROM currency
+        WHERE rowid NOT IN (
+            SELECT MAX(rowid) FROM currency GROUP BY currency_code, date
+        )
+    """)
+    conn.commit()
+    return cursor.rowcount
+
+
+def migrate(conn: sqlite3.Connection) -> bool:
+    """Миграция существующей базы до текущей версии схемы"""
+    if schema_version(conn) >= SCHEMA_VERSION:
+        return False
+
+    logger.info(f"Миграция базы данных до версии {SCHEMA_VERSION}")
+    converted = convert_dates(conn)
+    removed = remove_duplicates(conn)
+    create_indexes(conn)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.commit()
+    conn.execute("ANALYZE")
+    logger.info(f"Миграция завершена: переведено {converted} строк, удалено дублей {removed}")
+    return True
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    db_path = Path(sys.argv[1] if len(sys.argv) > 1 else "currency.db")
+    if not db_path.exists():
+        sys.exit(f"Файл {db_path} не найден")
+
+    connection = sqlite3.connect(db_path)
+    try:
+        if not migrate(connection):
+            print(f"База {db_path} уже в актуальной версии схемы ({SCHEMA_VERSION})")
+    finally:
+        connection.close()
@@ -0,0 +1,207 @@
+import sqlite3
+import sys
+import logging
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Периоды свечей: неделя с понедельника и календарный месяц
+RESOLUTIONS = ("week", "month")
+
+
+class Candle(NamedTuple):
+    # Первый день периода и последний день периода с курсом (YYYY-MM-DD)
+    period_start: str
+    date: str
+    open: float
+    high: float
+    low: float
+    close: float
+    count: int
+
+
+CANDLE_COLUMNS = Candle._fields
+
+
+def period_start(day: date, resolution: str) -> date:
+    if resolution == "week":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def next_period(start: date, resolution: str) -> date:
+    """Первый день следующего периода после периода, начинающегося в start"""
+    if resolution == "week":
+        return start + timedelta(days=7)
+    return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+
+def aggregate(rows: Iterable[Tuple[str, float]], resolution: str) -> Iterator[Candle]:
+    """Свечи по отсортированному ряду (YYYY-MM-DD, курс) за один проход"""
+    current = None
+    for iso_date, rate in rows:
+        start = period_start(date.fromisoformat(iso_date), resolution).isoformat()
+        if current is None or start != current[0]:
+            if current is not None:
+                yield Candle(*current)
+            current = [start, iso_date, rate, rate, rate, rate, 1]
+        else:
+            current[1] = iso_date
+            if rate > current[3]:
+                current[3] = rate
+            if rate < current[4]:
+                current[4] = rate
+            current[5] = rate
+            current[6] += 1
+    if current is not None:
+        yield Candle(*current)
+
+
+def full_periods(start: str, end: str, resolution: str) -> Tuple[str, str]:
+    """Первый и последний день целых периодов внутри [start, end]; first > last - таких нет"""
+    first_day, last_day = date.fromisoformat(start), date.fromisoformat(end)
+    first = period_start(first_day, resolution)
+    if first != first_day:
+        first = next_period(first, resolution)
+    last = period_start(last_day + timedelta(days=1), resolution) - timedelta(days=1)
+    return first.isoformat(), last.isoformat()
+
+
+def select(start: str, end: str, resolution: str,
+           stored: Callable[[str, str], List[Candle]],
+           history: Callable[[str, str], Sequence[Tuple[str, float]]]) -> List[Candle]:
+    """Свечи за [start, end]: целые периоды из stored, неполные крайние - по дневному ряду.
+
+    stored(first, last) отдаёт заранее посчитанные свечи периодов, начинающихся
+    в [first, last], history(start, end) - дневной ряд (YYYY-MM-DD, курс). По
+    дневному ряду считаются только обрезанные границами запроса периоды, то есть
+    не больше двух недель или двух месяцев.
+    """
+    first, last = full_periods(start, end, resolution)
+    if first > last:
+        return list(aggregate(history(start, end), resolution))
+    head_end = (date.fromisoformat(first) - timedelta(days=1)).isoformat()
+    tail_start = (date.fromisoformat(last) + timedelta(days=1)).isoformat()
+    candles = list(aggregate(history(start, head_end), resolution)) if start <= head_end else []
+    candles.extend(stored(first, last))
+    if tail_start <= end:
+        candles.extend(aggregate(history(tail_start, end), resolution))
+    return candles
+
+
+def create_table(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS currency_ohlc (
+            currency_code TEXT,
+            resolution TEXT,
+            period_start TEXT,
+            date TEXT,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            count INTEGER,
+            PRIMARY KEY (currency_code, resolution, period_start)
+        ) WITHOUT ROWID
+    """)
+
+
+def _write(conn: sqlite3.Connection, code: str, resolution: str, candles: List[Candle]):
+    conn.executemany(
+        f"INSERT OR REPLACE INTO currency_ohlc (currency_code, resolution, {', '.join(CANDLE_COLUMNS)}) "
+        f"VALUES (?, ?, {', '.join('?' * len(CANDLE_COLUMNS))})",
+        [(code, resolution, *candle) for candle in candles]
+    )
+
+
+def update_currency(conn: sqlite3.Connection, code: str, from_date: str) -> int:
+    """Пересчёт свечей валюты за периоды, начиная с содержащих from_date (YYYY-MM-DD).
+
+    Новый день меняет только свечи своей недели и своего месяца, поэтому
+    читается хвост ряда от начала самого раннего из затронутых периодов.
+    """
+    day = date.fromisoformat(from_date)
+    starts = {resolution: period_start(day, resolution).isoformat() for resolution in RESOLUTIONS}
+    rows = conn.execute("""
+        SELECT date, value / nominal
+        FROM currency
+        WHERE currency_code = ? AND date >= ?
+        ORDER BY date
+    """, (code, min(starts.values()))).fetchall()
+    total = 0
+    for resolution, start in starts.items():
+        candles = list(aggregate((row for row in rows if row[0] >= start), resolution))
+        _write(conn, code, resolution, candles)
+        total += len(candles)
+    return total
+
+
+def update_for_rows(conn: sqlite3.Connection, rows):
+    """Инкрементальное обновление после upsert строк (date, code, name, value, nominal)"""
+    first_dates = {}
+    for row in rows:
+        iso_date, code = row[0], row[1]
+        if code not in first_dates or iso_date < first_dates[code]:
+            first_dates[code] = iso_date
+    for code, from_date in first_dates.items():
+        update_currency(conn, code, from_date)
+
+
+def get(conn: sqlite3.Connection, code: str, resolution: str, start: str, end: str) -> List[Candle]:
+    """Свечи валюты за [start, end]; крайние периоды обрезаются границами запроса"""
+    def stored(first: str, last: str) -> List[Candle]:
+        rows = conn.execute(f"""
+            SELECT {', '.join(CANDLE_COLUMNS)}
+            FROM currency_ohlc
+            WHERE currency_code = ? AND resolution = ? AND period_start BETWEEN ? AND ?
+            ORDER BY period_start
+        """, (code, resolution, first, last))
+        return [Candle(*row) for row in rows]
+
+    def history(first: str, last: str):
+        return conn.execute("""
+            SELECT date, value / nominal
+            FROM currency
+            WHERE currency_code = ? AND date BETWEEN ? AND ?
+            ORDER BY date
+        """, (code, first, last)).fetchall()
+
+    return select(start, end, resolution, stored, history)
+
+
+def backfill(conn: sqlite3.Connection) -> int:
+    """Полный пересчёт свечей по всей истории"""
+    create_table(conn)
+    conn.execute("DELETE FROM currency_ohlc")
+    total = 0
+    codes = [row[0] for row in conn.execute("SELECT DISTINCT currency_code FROM currency")]
+    for code in codes:
+        rows = conn.execute(
+            "SELECT date, value / nominal FROM currency WHERE currency_code = ? ORDER BY date", (code,)
+        ).fetchall()
+        for resolution in RESOLUTIONS:
+            candles = list(aggregate(rows, resolution))
+            _write(conn, code, resolution, candles)
+            total += len(candles)
+    conn.commit()
+    logger.info(f"Свечи пересчитаны: {len(codes)} валют, {total} записей")
+    return total
+
+
+def is_empty(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT 1 FROM currency_ohlc LIMIT 1").fetchone() is None
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    db_path = Path(sys.argv[1] if len(sys.argv) > 1 else "currency.db")
+    if not db_path.exists():
+        sys.exit(f"Файл {db_path} не найден")
+
+    connection = sqlite3.connect(db_path)
+    try:
+        backfill(connection)
+    finally:
+        connection.close()
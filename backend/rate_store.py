@@ -0,0 +1,190 @@
+import sqlite3
+import logging
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import ohlc
+from ohlc import Candle
+from rolling_stats import STATS_COLUMNS, RollingStats, compute_rolling
+
+logger = logging.getLogger(__name__)
+
+
+def to_day(iso_date: str) -> int:
+    """YYYY-MM-DD -> порядковый номер дня"""
+    return date.fromisoformat(iso_date).toordinal()
+
+
+def from_day(day: int) -> str:
+    """Порядковый номер дня -> YYYY-MM-DD"""
+    return date.fromordinal(day).isoformat()
+
+
+class CurrencySeries:
+    """Отсортированный по дате ряд курсов одной валюты (курс за единицу)"""
+
+    __slots__ = ("code", "name", "days", "rates", "stats", "candles")
+
+    def __init__(self, code: str, name: str):
+        self.code = code
+        self.name = name
+        self.days = array("l")
+        self.rates = array("d")
+        # Скользящая статистика по столбцам, выровнена с days
+        self.stats = [array("d") for _ in STATS_COLUMNS]
+        # Свечи по периодам: resolution -> (начала периодов, свечи)
+        self.candles: Dict[str, Tuple[List[str], List[Candle]]] = {}
+
+    def compute_statistics(self):
+        self.stats = [array("d") for _ in STATS_COLUMNS]
+        for item in compute_rolling(self.days, self.rates):
+            for column, value in zip(self.stats, item):
+                column.append(value)
+
+    def statistics(self, i: int) -> RollingStats:
+        return RollingStats(*(column[i] for column in self.stats))
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def compute_candles(self, resolution: str):
+        candles = list(ohlc.aggregate(zip(map(from_day, self.days), self.rates), resolution))
+        self.candles[resolution] = ([candle.period_start for candle in candles], candles)
+
+    def index_at_or_before(self, day: int) -> int:
+        """Индекс последней записи не позже day или -1"""
+        return bisect_right(self.days, day) - 1
+
+    def index_of(self, day: int) -> int:
+        """Индекс записи ровно за day или -1"""
+        i = bisect_left(self.days, day)
+        return i if i < len(self.days) and self.days[i] == day else -1
+
+    def bounds(self, start: int, end: int) -> Tuple[int, int]:
+        """Полуинтервал индексов [lo, hi) для дат от start до end включительно"""
+        return bisect_left(self.days, start), bisect_right(self.days, end)
+
+
+class RateStore:
+    """Неизменяемый снимок таблицы currency в памяти.
+
+    Реализует тот же интерфейс чтения, что и SqliteRates в main.py, но отвечает
+    бинарным поиском по массивам без обращения к SQLite. После каждой загрузки
+    данных собирается новый снимок, который заменяет старый одним присваиванием.
+    """
+
+    def __init__(self, series: Dict[str, CurrencySeries], names_by_day: Dict[int, List[Tuple[str, str]]]):
+        self.series = series
+        self.names_by_day = names_by_day
+        self.days = array("l", sorted(names_by_day))
+        self.latest_day = self.days[-1] if self.days else None
+
+    @classmethod
+    def load(cls, conn: sqlite3.Connection) -> "RateStore":
+        series: Dict[str, CurrencySeries] = {}
+        names_by_day: Dict[int, List[Tuple[str, str]]] = {}
+        incomplete = set()
+        stats_columns = ", ".join(f"s.{name}" for name in STATS_COLUMNS)
+        rows = conn.execute(f"""
+            SELECT c.currency_code, c.date, c.currency_name, c.value / c.nominal, {stats_columns}
+            FROM currency c
+            LEFT JOIN currency_stats s ON s.currency_code = c.currency_code AND s.date = c.date
+            ORDER BY c.currency_code, c.date
+        """)
+        for code, iso_date, name, rate, *stats in rows:
+            item = series.get(code)
+            if item is None:
+                item = series[code] = CurrencySeries(code, name)
+            day = to_day(iso_date)
+            item.days.append(day)
+            item.rates.append(rate)
+            item.name = name
+            names_by_day.setdefault(day, []).append((code, name))
+            if stats[0] is None:
+                incomplete.add(code)
+            else:
+                for column, value in zip(item.stats, stats):
+                    column.append(value)
+
+        # Ряды, для которых в currency_stats нет части дат, пересчитываются целиком
+        for code in incomplete:
+            series[code].compute_statistics()
+
+        rows = conn.execute(f"""
+            SELECT currency_code, resolution, {', '.join(ohlc.CANDLE_COLUMNS)}
+            FROM currency_ohlc
+            ORDER BY currency_code, resolution, period_start
+        """)
+        for code, resolution, *candle in rows:
+            item = series.get(code)
+            if item is not None:
+                starts, candles = item.candles.setdefault(resolution, ([], []))
+                starts.append(candle[0])
+                candles.append(Candle(*candle))
+        for item in series.values():
+            for resolution in ohlc.RESOLUTIONS:
+                if resolution not in item.candles:
+                    item.compute_candles(resolution)
+
+        store = cls(series, names_by_day)
+        logger.info(f"Курсы загружены в память: {len(series)} валют, {len(names_by_day)} дат")
+        return store
+
+    def latest_date(self) -> Optional[str]:
+        return from_day(self.latest_day) if self.latest_day is not None else None
+
+    def currencies(self, iso_date: str) -> List[Tuple[str, str]]:
+        return self.names_by_day.get(to_day(iso_date), [])
+
+    def rate(self, code: str, iso_date: str) -> Optional[Tuple[str, float]]:
+        item = self.series.get(code)
+        if item is None:
+            return None
+        i = item.index_of(to_day(iso_date))
+        return (item.name, item.rates[i]) if i >= 0 else None
+
+    def rate_at_or_before(self, code: str, iso_date: str) -> Optional[Tuple[str, str, float]]:
+        item = self.series.get(code)
+        if item is None:
+            return None
+        i = item.index_at_or_before(to_day(iso_date))
+        return (from_day(item.days[i]), item.name, item.rates[i]) if i >= 0 else None
+
+    def statistics(self, code: str, iso_date: str) -> Optional[RollingStats]:
+        item = self.series.get(code)
+        if item is None:
+            return None
+        i = item.index_of(to_day(iso_date))
+        return item.statistics(i) if i >= 0 else None
+
+    def history(self, code: str, start: str, end: str) -> List[Tuple[str, float]]:
+        item = self.series.get(code)
+        if item is None:
+            return []
+        lo, hi = item.bounds(to_day(start), to_day(end))
+        return [(from_day(item.days[i]), item.rates[i]) for i in range(lo, hi)]
+
+    def candles(self, code: str, resolution: str, start: str, end: str) -> List[Candle]:
+        item = self.series.get(code)
+        if item is None:
+            return []
+
+        def stored(first: str, last: str) -> List[Candle]:
+            starts, candles = item.candles[resolution]
+            return candles[bisect_left(starts, first):bisect_right(starts, last)]
+
+        return ohlc.select(start, end, resolution, stored, lambda first, last: self.history(code, first, last))
+
+    def rates_at_or_before(self, iso_date: str) -> Tuple[Optional[str], List[Tuple[str, float]]]:
+        """Дата и курсы всех валют за последний день с курсами не позже iso_date"""
+        i = bisect_right(self.days, to_day(iso_date)) - 1
+        if i < 0:
+            return None, []
+        day = self.days[i]
+        rates = []
+        for code, _ in self.names_by_day[day]:
+            item = self.series[code]
+            rates.append((code, item.rates[item.index_of(day)]))
+        return from_day(day), rates
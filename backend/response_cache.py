@@ -0,0 +1,163 @@
+"""Кэш готовых JSON-ответов API между загрузками курсов.
+
+Данные меняются только при загрузке курсов (update_today, catch_up), поэтому
+ответ на один и тот же GET-запрос до следующей загрузки одинаков. Middleware
+сохраняет тело ответа в байтах по ключу (версия данных, путь, запрос) и
+отдаёт его, не вызывая обработчик: без построения моделей Pydantic и
+повторной сериализации. ETag строится по содержимому, поэтому он переживает
+загрузку, которая не изменила конкретный ответ, и клиент получает 304.
+Cache-Control разрешает клиентам и прокси хранить ответ до ближайшего
+запуска обновления по расписанию.
+
+Ключи выбирает клиент, поэтому кэш ограничен и по числу записей, и по сумме
+размеров тел; вытесняется давно не запрошенный ответ (LRU), а ответы больше
+max_entry_bytes не сохраняются вовсе.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from apscheduler.triggers.base import BaseTrigger
+
+# (тело, ETag)
+Entry = Tuple[bytes, bytes]
+
+
+class ResponseCache:
+    def __init__(self, trigger: BaseTrigger, max_entries: int = 4096, max_bytes: int = 64 * 1024 * 1024,
+                 max_entry_bytes: int = 256 * 1024, enabled: bool = True):
+        self.trigger = trigger
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.enabled = enabled
+        self.version = 0
+        # Порядок - от давно не запрошенных к недавним
+        self.entries: "OrderedDict[Tuple[int, str, str], Entry]" = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._next_update: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Вызывается после каждой загрузки курсов в БД"""
+        with self._lock:
+            self.version += 1
+            self.entries = OrderedDict()
+            self.size = 0
+
+    def get(self, key: Tuple[int, str, str]) -> Optional[Entry]:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Tuple[int, str, str], body: bytes) -> Entry:
+        entry = (body, make_etag(body))
+        with self._lock:
+            # Ответ, собранный до загрузки новых курсов, и слишком большой ответ не сохраняем
+            if key[0] == self.version and len(body) <= self.max_entry_bytes:
+                old = self.entries.pop(key, None)
+                if old is not None:
+                    self.size -= len(old[0])
+                while self.entries and (len(self.entries) >= self.max_entries
+                                        or self.size + len(body) > self.max_bytes):
+                    _, (evicted, _) = self.entries.popitem(last=False)
+                    self.size -= len(evicted)
+                self.entries[key] = entry
+                self.size += len(body)
+        return entry
+
+    def max_age(self, now: Optional[datetime] = None) -> int:
+        """Секунды до ближайшего запуска обновления по расписанию"""
+        now = now or datetime.now(self.trigger.timezone)
+        if self._next_update is None or self._next_update <= now:
+            self._next_update = self.trigger.get_next_fire_time(None, now)
+        return max(0, int((self._next_update - now).total_seconds()))
+
+
+def make_etag(body: bytes) -> bytes:
+    return b'"' + hashlib.blake2b(body, digest_size=12).hexdigest().encode() + b'"'
+
+
+def etag_matches(if_none_match: bytes, etag: bytes) -> bool:
+    if if_none_match.strip() == b"*":
+        return True
+    # Для If-None-Match сравнение слабое: W/"x" совпадает с "x"
+    return any(tag.strip().removeprefix(b"W/") == etag for tag in if_none_match.split(b","))
+
+
+def normalize_query(query_string: bytes) -> str:
+    """Одинаковые параметры в разном порядке дают один ключ"""
+    return urlencode(sorted(parse_qsl(query_string.decode("latin-1"), keep_blank_values=True)))
+
+
+class ResponseCacheMiddleware:
+    """ASGI middleware: кэширует успешные JSON-ответы GET для путей из prefixes"""
+
+    def __init__(self, app, cache: ResponseCache, prefixes: Tuple[str, ...] = ("/api/",)):
+        self.app = app
+        self.cache = cache
+        self.prefixes = prefixes
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] != "GET" or not self.cache.enabled
+                or not scope["path"].startswith(self.prefixes)):
+            await self.app(scope, receive, send)
+            return
+
+        key = (self.cache.version, scope["path"], normalize_query(scope["query_string"]))
+        entry = self.cache.get(key)
+        if entry is None:
+            response = await self._call_app(scope, receive)
+            if response is None:
+                return
+            status, headers, body = response
+            if status != 200:
+                await self._send(send, status, headers, body)
+                return
+            entry = self.cache.put(key, body)
+
+        body, etag = entry
+        headers = [
+            (b"content-type", b"application/json"),
+            (b"etag", etag),
+            (b"cache-control", f"public, max-age={self.cache.max_age()}".encode()),
+        ]
+        if_none_match = dict(scope["headers"]).get(b"if-none-match")
+        if if_none_match is not None and etag_matches(if_none_match, etag):
+            await self._send(send, 304, headers, b"")
+        else:
+            headers.append((b"content-length", str(len(body)).encode()))
+            await self._send(send, 200, headers, body)
+
+    async def _call_app(self, scope, receive):
+        """Вызов приложения с буферизацией ответа: (статус, заголовки, тело)"""
+        start = {}
+        chunks = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+        if not start:
+            return None
+        headers = [(name, value) for name, value in start.get("headers", []) if name.lower() != b"content-length"]
+        body = b"".join(chunks)
+        return start["status"], headers + [(b"content-length", str(len(body)).encode())], body
+
+    @staticmethod
+    async def _send(send, status: int, headers, body: bytes):
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,199 @@
+import sqlite3
+import sys
+import logging
+from collections import deque
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Окна (в календарных днях) для максимума/минимума и для изменения курса
+HIGH_LOW_WINDOWS = (7, 14, 30)
+CHANGE_WINDOWS = (14, 30)
+
+
+class RollingStats(NamedTuple):
+    change1d: float
+    high7d: float
+    low7d: float
+    high14d: float
+    low14d: float
+    high30d: float
+    low30d: float
+    change14d: float
+    change30d: float
+
+
+STATS_COLUMNS = RollingStats._fields
+
+
+class _SlidingWindow:
+    """Максимум и минимум за окно [day - span, day] на монотонных очередях"""
+
+    __slots__ = ("span", "max_queue", "min_queue")
+
+    def __init__(self, span: int):
+        self.span = span
+        self.max_queue = deque()
+        self.min_queue = deque()
+
+    def push(self, i: int, days: Sequence[int], rates: Sequence[float]):
+        rate = rates[i]
+        while self.max_queue and rates[self.max_queue[-1]] <= rate:
+            self.max_queue.pop()
+        self.max_queue.append(i)
+        while self.min_queue and rates[self.min_queue[-1]] >= rate:
+            self.min_queue.pop()
+        self.min_queue.append(i)
+
+        oldest = days[i] - self.span
+        while days[self.max_queue[0]] < oldest:
+            self.max_queue.popleft()
+        while days[self.min_queue[0]] < oldest:
+            self.min_queue.popleft()
+        return rates[self.max_queue[0]], rates[self.min_queue[0]]
+
+
+def compute_rolling(days: Sequence[int], rates: Sequence[float]) -> Iterator[RollingStats]:
+    """Статистика для каждой записи отсортированного ряда за один проход.
+
+    days - порядковые номера дней, rates - курс за единицу валюты. Семантика
+    совпадает с прежними SQL-запросами get_currency: изменение за день - к
+    курсу ровно на вчера, изменение за N дней - к курсу на дату не позже day - N
+    (0.0, если такого курса нет).
+    """
+    windows = [_SlidingWindow(span) for span in HIGH_LOW_WINDOWS]
+    pointers = [-1] * len(CHANGE_WINDOWS)
+
+    for i in range(len(days)):
+        day, rate = days[i], rates[i]
+        change1d = rate - rates[i - 1] if i and days[i - 1] == day - 1 else 0.0
+
+        high_low = []
+        for window in windows:
+            high_low.extend(window.push(i, days, rates))
+
+        changes = []
+        for k, span in enumerate(CHANGE_WINDOWS):
+            p = pointers[k]
+            while p + 1 < i and days[p + 1] <= day - span:
+                p += 1
+            pointers[k] = p
+            changes.append(rate - rates[p] if p >= 0 else 0.0)
+
+        yield RollingStats(change1d, *high_low, *changes)
+
+
+def create_table(conn: sqlite3.Connection):
+    columns = ",\n".join(f"            {name} REAL" for name in STATS_COLUMNS)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS currency_stats (
+            currency_code TEXT,
+            date TEXT,
+{columns},
+            PRIMARY KEY (currency_code, date)
+        ) WITHOUT ROWID
+    """)
+
+
+def _write(conn: sqlite3.Connection, code: str, iso_dates: List[str], stats: List[RollingStats]):
+    placeholders = ", ".join("?" * (len(STATS_COLUMNS) + 2))
+    conn.executemany(
+        f"INSERT OR REPLACE INTO currency_stats (currency_code, date, {', '.join(STATS_COLUMNS)}) "
+        f"VALUES ({placeholders})",
+        [(code, iso_date, *item) for iso_date, item in zip(iso_dates, stats)]
+    )
+
+
+def _load_tail(conn: sqlite3.Connection, code: str, from_date: str, to_date: str = "9999-12-31"):
+    """Ряд валюты от from_date с запасом на самое длинное окно назад"""
+    lookback = (date.fromisoformat(from_date) - timedelta(days=max(HIGH_LOW_WINDOWS + CHANGE_WINDOWS))).isoformat()
+    anchor = conn.execute(
+        "SELECT MAX(date) FROM currency WHERE currency_code = ? AND date <= ?", (code, lookback)
+    ).fetchone()[0] or lookback
+    rows = conn.execute("""
+        SELECT date, value / nominal
+        FROM currency
+        WHERE currency_code = ? AND date BETWEEN ? AND ?
+        ORDER BY date
+    """, (code, anchor, to_date)).fetchall()
+    days = [date.fromisoformat(row[0]).toordinal() for row in rows]
+    return rows, days, [row[1] for row in rows]
+
+
+def update_currency(conn: sqlite3.Connection, code: str, from_date: str) -> int:
+    """Пересчёт статистики валюты начиная с from_date (YYYY-MM-DD).
+
+    Читается только хвост ряда, достаточный для самого длинного окна, поэтому
+    добавление нового дня обходится в O(окно), а не в пересчёт всей истории.
+    """
+    rows, days, rates = _load_tail(conn, code, from_date)
+    start = next((i for i, row in enumerate(rows) if row[0] >= from_date), len(rows))
+    stats = list(compute_rolling(days, rates))[start:]
+    _write(conn, code, [row[0] for row in rows[start:]], stats)
+    return len(stats)
+
+
+def compute_on(conn: sqlite3.Connection, code: str, iso_date: str) -> Optional[RollingStats]:
+    """Статистика на дату без записи в таблицу (для дат, которых ещё нет в currency_stats)"""
+    rows, days, rates = _load_tail(conn, code, iso_date, iso_date)
+    if not rows or rows[-1][0] != iso_date:
+        return None
+    return deque(compute_rolling(days, rates), maxlen=1)[0]
+
+
+def get(conn: sqlite3.Connection, code: str, iso_date: str) -> Optional[RollingStats]:
+    """Статистика валюты на дату одним запросом по первичному ключу"""
+    row = conn.execute(
+        f"SELECT {', '.join(STATS_COLUMNS)} FROM currency_stats WHERE currency_code = ? AND date = ?",
+        (code, iso_date)
+    ).fetchone()
+    return RollingStats(*row) if row else compute_on(conn, code, iso_date)
+
+
+def update_for_rows(conn: sqlite3.Connection, rows):
+    """Инкрементальное обновление после upsert строк (date, code, name, value, nominal)"""
+    first_dates = {}
+    for row in rows:
+        iso_date, code = row[0], row[1]
+        if code not in first_dates or iso_date < first_dates[code]:
+            first_dates[code] = iso_date
+    for code, from_date in first_dates.items():
+        update_currency(conn, code, from_date)
+
+
+def backfill(conn: sqlite3.Connection) -> int:
+    """Полный пересчёт статистики по всей истории"""
+    create_table(conn)
+    conn.execute("DELETE FROM currency_stats")
+    total = 0
+    codes = [row[0] for row in conn.execute("SELECT DISTINCT currency_code FROM currency")]
+    for code in codes:
+        rows = conn.execute(
+            "SELECT date, value / nominal FROM currency WHERE currency_code = ? ORDER BY date", (code,)
+        ).fetchall()
+        days = [date.fromisoformat(row[0]).toordinal() for row in rows]
+        stats = list(compute_rolling(days, [row[1] for row in rows]))
+        _write(conn, code, [row[0] for row in rows], stats)
+        total += len(stats)
+    conn.commit()
+    logger.info(f"Статистика пересчитана: {len(codes)} валют, {total} записей")
+    return total
+
+
+def is_empty(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT 1 FROM currency_stats LIMIT 1").fetchone() is None
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    db_path = Path(sys.argv[1] if len(sys.argv) > 1 else "currency.db")
+    if not db_path.exists():
+        sys.exit(f"Файл {db_path} не найден")
+
+    connection = sqlite3.connect(db_path)
+    try:
+        backfill(connection)
+    finally:
+        connection.close()
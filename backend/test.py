@@ -1,7 +1,9 @@
 import sqlite3
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Optional, Dict, Any, Tuple
 
+import rolling_stats
+
 
 class CurrencyDataFetcher:
     def __init__(self, db_path: str = "currency.db"):
@@ -47,12 +49,16 @@ class CurrencyDataFetcher:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
 
+            # Даты в БД хранятся в формате YYYY-MM-DD
+            date_obj = datetime.strptime(date_str, "%d/%m/%Y")
+            date_iso = date_obj.strftime("%Y-%m-%d")
+
             # Получаем текущий курс с учетом поля nominal
             cursor.execute("""
                 SELECT currency_code, currency_name, value, nominal
                 FROM currency 
                 WHERE date = ? AND currency_code = ?
-            """, (date_str, currency_code))
+            """, (date_iso, currency_code))
             rows = cursor.fetchall()
 
             if rows:
@@ -65,48 +71,11 @@ class CurrencyDataFetcher:
                     print(f"Название: {currency_name}")
                     print(f"Курс: {actual_rate:.4f}")
 
-                    # Преобразуем выбранную дату в объект datetime и ISO-формат
-                    date_obj = datetime.strptime(date_str, "%d/%m/%Y")
-                    date_iso = date_obj.strftime("%Y-%m-%d")
-
-                    # Функция для преобразования даты из БД (dd/mm/yyyy) в ISO формат внутри запроса:
-                    date_conversion = "substr(date, 7, 4) || '-' || substr(date, 4, 2) || '-' || substr(date, 1, 2)"
-
-                    # Статистика за 7 дней (учитываем деление на номинал)
-                    seven_days_ago = date_obj - timedelta(days=7)
-                    seven_days_ago_iso = seven_days_ago.strftime("%Y-%m-%d")
-                    cursor.execute(f"""
-                        SELECT MAX(value/nominal), MIN(value/nominal)
-                        FROM currency 
-                        WHERE currency_code = ? 
-                          AND date({date_conversion}) <= date(?)
-                          AND date({date_conversion}) >= date(?)
-                    """, (currency_code, date_iso, seven_days_ago_iso))
-                    high7d, low7d = cursor.fetchone()
-
-                    # Статистика за 14 дней
-                    fourteen_days_ago = date_obj - timedelta(days=14)
-                    fourteen_days_ago_iso = fourteen_days_ago.strftime("%Y-%m-%d")
-                    cursor.execute(f"""
-                        SELECT MAX(value/nominal), MIN(value/nominal)
-                        FROM currency 
-                        WHERE currency_code = ? 
-                          AND date({date_conversion}) <= date(?)
-                          AND date({date_conversion}) >= date(?)
-                    """, (currency_code, date_iso, fourteen_days_ago_iso))
-                    high14d, low14d = cursor.fetchone()
-
-                    # Статистика за 30 дней (только максимум)
-                    thirty_days_ago = date_obj - timedelta(days=30)
-                    thirty_days_ago_iso = thirty_days_ago.strftime("%Y-%m-%d")
-                    cursor.execute(f"""
-                        SELECT MAX(value/nominal)
-                        FROM currency 
-                        WHERE currency_code = ? 
-                          AND date({date_conversion}) <= date(?)
-                          AND date({date_conversion}) >= date(?)
-                    """, (currency_code, date_iso, thirty_days_ago_iso))
-                    high30d = cursor.fetchone()[0]
+                    # Статистика за 7/14/30 дней - одна выборка из currency_stats
+                    stats = rolling_stats.get(conn, currency_code, date_iso)
+                    high7d, low7d = stats.high7d, stats.low7d
+                    high14d, low14d = stats.high14d, stats.low14d
+                    high30d = stats.high30d
 
                     print("\nСтатистика за последние периоды:")
                     print(f"7 дней - Макс: {high7d if high7d is not None else actual_rate:.4f}, Мин: {low7d if low7d is not None else actual_rate:.4f}")
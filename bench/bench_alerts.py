@@ -0,0 +1,84 @@
+"""Проверка ценовых оповещений: AlertEngine против полного перебора.
+
+--alerts оповещений с порогами вокруг текущих цен распределяются по
+--symbols символам; цены меняются случайным блужданием. На каждом тике
+сработавшие оповещения движка сверяются с прямым перебором всех условий.
+Отдельно замеряется загрузка оповещений из BotStorage и построение индекса.
+
+    python bench/bench_alerts.py --alerts 1000000 --ticks 200
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import bot_env  # noqa: F401  (путь к модулям бота)
+from alerts import Alert, AlertEngine
+from storage import BotStorage
+
+
+def make_alerts(count, prices, rng):
+    symbols = list(prices)
+    for alert_id in range(1, count + 1):
+        symbol = rng.choice(symbols)
+        direction = rng.choice("<>")
+        spread = rng.uniform(0.001, 0.2)
+        threshold = prices[symbol] * (1 + spread if direction == ">" else 1 - spread)
+        yield Alert(alert_id, rng.randrange(10 ** 6), symbol, direction, round(threshold, 4))
+
+
+def main(args):
+    rng = random.Random(1)
+    prices = {f"S{i:03d}": rng.uniform(1, 100_000) for i in range(args.symbols)}
+    alerts = list(make_alerts(args.alerts, prices, rng))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = BotStorage(os.path.join(tmp, "bot.db"))
+        started = time.perf_counter()
+        with storage.conn:
+            storage.conn.executemany("INSERT INTO alerts VALUES (?, ?, ?, ?, ?)", alerts)
+        insert = time.perf_counter() - started
+
+        started = time.perf_counter()
+        engine = AlertEngine()
+        engine.load(Alert(*row) for row in storage.load_alerts())
+        load = time.perf_counter() - started
+        storage.close()
+
+    pending = {alert.alert_id: alert for alert in alerts}
+    engine_time = scan_time = 0.0
+    fired_total = 0
+    for _ in range(args.ticks):
+        for symbol in prices:
+            prices[symbol] *= 1 + rng.gauss(0, 0.005)
+
+        started = time.perf_counter()
+        fired = []
+        for symbol, price in prices.items():
+            fired.extend(engine.check(symbol, price))
+        engine_time += time.perf_counter() - started
+
+        started = time.perf_counter()
+        expected = [alert for alert in pending.values() if alert.triggered_by(prices[alert.symbol])]
+        scan_time += time.perf_counter() - started
+
+        assert sorted(fired) == sorted(expected), "движок и перебор разошлись"
+        for alert in expected:
+            del pending[alert.alert_id]
+        fired_total += len(fired)
+
+    assert len(engine) == len(pending)
+    print(f"{args.alerts} оповещений, {args.symbols} символов, {args.ticks} тиков, "
+          f"сработало {fired_total}, результаты совпадают с перебором")
+    print(f"запись в SQLite {insert:.1f} с, загрузка и индексация при старте {load:.1f} с")
+    print(f"перебор всех условий  {scan_time / args.ticks * 1000:10.2f} мс/тик")
+    print(f"AlertEngine           {engine_time / args.ticks * 1000:10.3f} мс/тик")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--alerts", type=int, default=1_000_000)
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--ticks", type=int, default=200)
+    main(parser.parse_args())
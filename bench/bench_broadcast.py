@@ -0,0 +1,99 @@
+"""Утренняя рассылка через заглушку Bot API: прежний цикл против Broadcaster.
+
+Заглушка ограничивает скорость как Telegram (--limit сообщений в секунду,
+дальше 429 с retry_after) и отвечает 403 для части пользователей. Затем
+проверяется продолжение рассылки: она прерывается на середине и
+возобновляется новым Broadcaster с того же файла прогресса.
+
+    python bench/bench_broadcast.py --users 600 --latency 0.05
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from bot_env import TEST_TOKEN, import_bot
+from telegram_stub import TelegramStub
+
+from broadcast import Broadcaster
+
+
+async def legacy(bot_module, users):
+    """Прежний scheduled_jobs: по одному сообщению, текст собирается для каждого"""
+    for user_id in users:
+        try:
+            await bot_module.send_all_rates(user_id)
+        except Exception:
+            pass
+
+
+async def measure(name, stub, coroutine, users):
+    stub.delivered.clear()
+    stub.flood_errors = 0
+    started = time.perf_counter()
+    result = await coroutine
+    elapsed = time.perf_counter() - started
+    print(f"{name:<24}{elapsed:>10.1f}{len(users) / elapsed:>10.1f}"
+          f"{sum(stub.delivered.values()):>12}{stub.flood_errors:>8}")
+    return result
+
+
+async def check_resume(stub, bot, users, blocked, workdir):
+    stub.delivered.clear()
+    path = os.path.join(workdir, "resume.json")
+    first = Broadcaster(bot, path)
+    task = asyncio.create_task(first.run("text", users))
+    while sum(stub.delivered.values()) < len(users) // 2:
+        await asyncio.sleep(0.01)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    interrupted = sum(stub.delivered.values())
+
+    result = await Broadcaster(bot, path).resume(users)
+    expected = set(users) - blocked
+    missing = expected - set(stub.delivered)
+    duplicates = sum(count - 1 for count in stub.delivered.values())
+    assert not missing, f"не доставлено {len(missing)}"
+    assert duplicates <= first.concurrency, duplicates
+    assert not os.path.exists(path)
+    print(f"\nПрервано после {interrupted} сообщений, продолжение отправило {result.sent}, "
+          f"недоставленных 0, повторов {duplicates}")
+
+
+async def main(args):
+    bot_module = import_bot()
+    stub = await TelegramStub(latency=args.latency, limit=args.limit).start()
+    bot = stub.bot(TEST_TOKEN)
+    bot_module.bot = bot
+
+    rng = random.Random(1)
+    users = list(range(1000, 1000 + args.users))
+    stub.blocked = set(rng.sample(users, len(users) // 20))
+
+    print(f"{args.users} пользователей, задержка API {args.latency * 1000:.0f} мс, лимит {args.limit}/с")
+    print(f"{'вариант':<24}{'время, с':>10}{'сообщ/с':>10}{'доставлено':>12}{'429':>8}")
+    with tempfile.TemporaryDirectory() as workdir:
+        await measure("прежний цикл", stub, legacy(bot_module, users), users)
+        broadcaster = Broadcaster(bot, os.path.join(workdir, "broadcast.json"), rate=args.rate)
+        result = await measure("Broadcaster", stub, broadcaster.run(bot_module.get_all_rates(), users), users)
+        assert result.sent == len(users) - len(stub.blocked) and set(result.blocked) == stub.blocked
+
+        await check_resume(stub, bot, users, stub.blocked, workdir)
+
+    await bot.session.close()
+    await bot_module.http_client.close()
+    await stub.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=600)
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка ответа Bot API, с")
+    parser.add_argument("--limit", type=int, default=30, help="лимит заглушки, сообщений в секунду")
+    parser.add_argument("--rate", type=float, default=25, help="скорость Broadcaster, сообщений в секунду")
+    asyncio.run(main(parser.parse_args()))
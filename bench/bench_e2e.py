@@ -0,0 +1,288 @@
+"""Сквозная нагрузка на бота с локальными заглушками Telegram, ЦБ и CoinGecko.
+
+Бот запускается как в бою (polling, фоновое обновление курсов и кэша топа
+криптовалют), но все внешние адреса указывают на заглушки, поэтому сеть не
+нужна:
+
+    Bot API    bench/telegram_stub.py: задержка, лимит сообщений в секунду,
+               доля ответов 502, заблокировавшие бота подписчики
+    ЦБ         backend/bench/cbr_stub.py: XML_daily из generate_dataset,
+               задержка и доля ответов 500, ETag
+    CoinGecko  bench/coingecko_stub.py: simple/price и coins/markets,
+               задержка и доля ответов 429/500
+
+--users синтетических пользователей приходят в течение --ramp секунд,
+нажимают /start, затем --actions раз кнопки меню, /topcrypto N и справку с
+паузами около --think секунд, часть в конце нажимает /stop. Каждое действие
+ждёт все ответы бота (на /start их два), время ответа - от появления
+обновления в getUpdates до последнего ответа в заглушке. Через
+--broadcast-at секунд запускается утренняя рассылка scheduled_jobs на всех
+подписчиков (--subscribers заранее подписанных плюс нажавшие /start); её
+сообщения идут через отдельный токен и не путаются с ответами.
+
+Печатаются действия в секунду, p50/p95/p99 по видам действий (отдельно -
+во время рассылки), ход рассылки, рост RSS процесса и число запросов к
+каждой заглушке. Заглушки и бот делят один процесс и процессор.
+
+    python bench/bench_e2e.py --users 2000 --actions 3 --think 20 --subscribers 5000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from bot_env import ROOT, TEST_TOKEN, import_bot
+from coingecko_stub import CoinGeckoStub
+from telegram_stub import TelegramStub
+
+sys.path.append(str(ROOT / "backend" / "bench"))
+
+from cbr_stub import CbrStub  # noqa: E402
+from generate_dataset import generate_rows  # noqa: E402
+
+BROADCAST_TOKEN = "987654321:BBBBBBBBBBBBBBBBBBBBBBBBBBBBBBBBBBB"
+USER_BASE = 10 ** 7
+SUBSCRIBER_BASE = 2 * 10 ** 7
+
+# (вид действия, текст или функция от rng, число ответов бота, вес)
+ACTIONS = [
+    ("💰 Курсы валют", "💰 Курсы валют", 1, 30),
+    ("🪙 Криптовалюты", "🪙 Криптовалюты", 1, 20),
+    ("📊 Все курсы", "📊 Все курсы", 1, 20),
+    ("🏆 Топ криптовалют", "🏆 Топ криптовалют", 1, 10),
+    ("/topcrypto N", lambda rng: f"/topcrypto {rng.choice((5, 10, 20, 50, 100))}", 1, 10),
+    ("ℹ️ Помощь", "ℹ️ Помощь", 1, 10),
+]
+
+
+def rss_mb() -> float:
+    """Текущий RSS процесса (Linux), иначе пиковый"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(samples, share: float) -> float:
+    return samples[max(0, int(len(samples) * share) - 1)]
+
+
+class Driver:
+    """Синтетические пользователи: обновления в getUpdates заглушки и ожидание ответов"""
+
+    def __init__(self, stub: TelegramStub, args):
+        self.stub = stub
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.update_id = 0
+        # chat_id -> (сколько ответов ждём, future)
+        self.waiting = {}
+        self.received = defaultdict(int)
+        # (вид действия, время ответа в мс, начато ли во время рассылки)
+        self.samples = []
+        self.timeouts = defaultdict(int)
+        self.broadcast_messages = 0
+        self.broadcast_window = None
+        stub.on_message = self.on_message
+
+    def on_message(self, token: str, chat_id: int):
+        if token == BROADCAST_TOKEN:
+            self.broadcast_messages += 1
+            return
+        self.received[chat_id] += 1
+        waiting = self.waiting.get(chat_id)
+        if waiting is not None and self.received[chat_id] >= waiting[0] and not waiting[1].done():
+            waiting[1].set_result(None)
+
+    def in_broadcast(self, moment: float) -> bool:
+        window = self.broadcast_window
+        return window is not None and window[0] <= moment and (window[1] is None or moment <= window[1])
+
+    async def act(self, chat_id: int, kind: str, text: str, replies: int):
+        self.update_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[chat_id] = (self.received[chat_id] + replies, future)
+        started = time.monotonic()
+        self.stub.push_update({"update_id": self.update_id, "message": {
+            "message_id": self.update_id, "date": int(time.time()), "text": text,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Load", "username": f"load{chat_id}"},
+        }})
+        try:
+            await asyncio.wait_for(future, self.args.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts[kind] += 1
+            return
+        finally:
+            self.waiting.pop(chat_id, None)
+        self.samples.append((kind, (time.monotonic() - started) * 1000, self.in_broadcast(started)))
+
+    async def user(self, chat_id: int):
+        rng = random.Random(chat_id)
+        await asyncio.sleep(rng.uniform(0, self.args.ramp))
+        await self.act(chat_id, "/start", "/start", 2)
+        weights = [weight for *_, weight in ACTIONS]
+        for _ in range(self.args.actions):
+            await asyncio.sleep(rng.expovariate(1 / self.args.think))
+            kind, text, replies, _ = rng.choices(ACTIONS, weights)[0]
+            await self.act(chat_id, kind, text(rng) if callable(text) else text, replies)
+        if rng.random() < self.args.stop_share:
+            await asyncio.sleep(rng.expovariate(1 / self.args.think))
+            await self.act(chat_id, "/stop", "/stop", 1)
+
+    async def run(self):
+        await asyncio.gather(*(self.user(USER_BASE + i) for i in range(self.args.users)))
+
+
+async def broadcast(bot_module, driver: Driver, delay: float) -> dict:
+    """Утренняя рассылка через delay секунд после начала нагрузки"""
+    await asyncio.sleep(delay)
+    blocked = driver.stub.blocked & bot_module.active_users
+    started = time.monotonic()
+    driver.broadcast_window = (started, None)
+    await bot_module.scheduled_jobs()
+    elapsed = time.monotonic() - started
+    driver.broadcast_window = (started, time.monotonic())
+    broadcaster = bot_module.broadcaster
+    return {"sent": broadcaster.sent, "total": broadcaster.total,
+            "removed": len(blocked - bot_module.active_users), "elapsed": elapsed}
+
+
+def report_latency(driver: Driver, elapsed: float):
+    print(f"\n{len(driver.samples)} действий за {elapsed:.1f} с: {len(driver.samples) / elapsed:.0f} действий/с, "
+          f"без ответа за {driver.args.timeout:.0f} с: {sum(driver.timeouts.values())}")
+    print(f"{'действие':<22}{'число':>8}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'max, мс':>10}")
+    groups = {kind: [] for kind in ["/start", *(kind for kind, *_ in ACTIONS), "/stop", "все", "все, во время рассылки"]}
+    for kind, latency, during_broadcast in driver.samples:
+        groups[kind].append(latency)
+        groups["все"].append(latency)
+        if during_broadcast:
+            groups["все, во время рассылки"].append(latency)
+    for kind, samples in groups.items():
+        if not samples:
+            continue
+        samples.sort()
+        print(f"{kind:<22}{len(samples):>8}{statistics.median(samples):>10.1f}{percentile(samples, 0.95):>10.1f}"
+              f"{percentile(samples, 0.99):>10.1f}{samples[-1]:>10.1f}"
+              + (f"  (без ответа {driver.timeouts[kind]})" if driver.timeouts.get(kind) else ""))
+
+
+def report_upstreams(tg: TelegramStub, cbr: CbrStub, coingecko: CoinGeckoStub, bot_module):
+    from metrics import upstream_errors, upstream_retries
+
+    print("\nзапросы к заглушкам")
+    print(f"  Bot API:   {sum(tg.delivered.values())} сообщений доставлено, {tg.flood_errors} ответов 429, "
+          f"{tg.server_errors} ответов 502, {len(tg.blocked)} заблокировавших")
+    print(f"  ЦБ:        {dict(cbr.requests)}, 304: {cbr.not_modified}; "
+          f"разобрано {bot_module.http_client.stats['changed']}, "
+          f"без изменений {bot_module.http_client.stats['unchanged'] + bot_module.http_client.stats['not_modified']}")
+    print(f"  CoinGecko: {dict(coingecko.requests)}, отказов {dict(coingecko.failures)}")
+    retries = sum(upstream_retries.values.values())
+    errors = {f"{host} {error}": count for (host, error), count in upstream_errors.values.items()}
+    print(f"  бот: {retries} повторов, ошибок после повторов {errors or 0}")
+
+
+async def main(args):
+    tg = await TelegramStub(latency=args.tg_latency, limit=args.tg_limit, fail_rate=args.tg_fail_rate,
+                            seed=args.seed).start()
+    coingecko = await CoinGeckoStub(latency=args.coingecko_latency, fail_rate=args.coingecko_fail_rate,
+                                    seed=args.seed).start()
+    today = date.today()
+    cbr = CbrStub(generate_rows(today - timedelta(days=10), today), latency=args.cbr_latency,
+                  fail_rate=args.cbr_fail_rate, seed=args.seed, validators="etag").__enter__()
+
+    os.environ.update(RATES_UPDATE_INTERVAL=str(args.refresh), METRICS_PORT="0",
+                      BROADCAST_RATE=str(args.broadcast_rate))
+    bot_module = import_bot()
+    logging.disable(logging.WARNING if args.verbose else logging.CRITICAL)
+    import crypto_rankings
+
+    bot_module.CURRENCY_URL = cbr.daily_url
+    bot_module.CRYPTO_URL = f"{coingecko.base}/simple/price"
+    crypto_rankings.COINGECKO_API_URL = coingecko.base
+    crypto_rankings.CACHE_TTL = args.refresh
+    bot = tg.bot(TEST_TOKEN)
+    await bot_module.bot.session.close()
+    bot_module.bot = bot
+    bot_module.broadcaster.bot = tg.bot(BROADCAST_TOKEN)
+
+    subscribers = [SUBSCRIBER_BASE + i for i in range(args.subscribers)]
+    bot_module.storage.add_users(subscribers)
+    tg.blocked.update(random.Random(args.seed).sample(subscribers, int(len(subscribers) * args.blocked_share)))
+
+    rss_start = rss_mb()
+    started = time.monotonic()
+    bot_module.setup_handler_metrics()
+    bot_module.dp.include_router(bot_module.router)
+    bot_module.load_users()
+    await bot_module.initialize_rates()
+    tasks = [asyncio.create_task(bot_module.update_rates_periodically()),
+             asyncio.create_task(crypto_rankings.update_crypto_cache())]
+    polling = asyncio.create_task(bot_module.dp.start_polling(bot, handle_signals=False, polling_timeout=10))
+    print(f"бот запущен за {time.monotonic() - started:.2f} с: {len(bot_module.global_rates.rates)} курсов, "
+          f"{len(bot_module.active_users)} подписчиков, RSS {rss_mb():.0f} МБ")
+
+    driver = Driver(tg, args)
+    rss_loaded = rss_mb()
+    started = time.monotonic()
+    broadcast_task = asyncio.create_task(broadcast(bot_module, driver, args.broadcast_at))
+    await driver.run()
+    elapsed = time.monotonic() - started
+    result = await broadcast_task
+    rss_end = rss_mb()
+
+    report_latency(driver, elapsed)
+    print(f"\nрассылка: {result['sent']} из {result['total']} за {result['elapsed']:.1f} с "
+          f"({result['sent'] / result['elapsed']:.0f} сообщ./с), удалено заблокировавших {result['removed']}, "
+          f"сообщений в заглушке {driver.broadcast_messages}")
+    print(f"RSS: {rss_start:.0f} МБ после импорта бота, {rss_loaded:.0f} после запуска, {rss_end:.0f} в конце "
+          f"(+{rss_end - rss_loaded:.0f}), пиковый {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f}")
+    report_upstreams(tg, cbr, coingecko, bot_module)
+
+    await bot_module.dp.stop_polling()
+    await polling
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await bot_module.broadcaster.bot.session.close()
+    await bot_module.http_client.close()
+    bot_module.storage.close()
+    await coingecko.stop()
+    await tg.stop()
+    cbr.__exit__(None, None, None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--actions", type=int, default=3, help="действий на пользователя после /start")
+    parser.add_argument("--think", type=float, default=20.0, help="средняя пауза между действиями, с")
+    parser.add_argument("--ramp", type=float, default=10.0, help="пользователи приходят в течение стольких секунд")
+    parser.add_argument("--stop-share", type=float, default=0.1, help="доля пользователей, нажимающих /stop")
+    parser.add_argument("--timeout", type=float, default=30.0, help="сколько ждать ответа на действие, с")
+    parser.add_argument("--subscribers", type=int, default=5000, help="подписчиков до начала нагрузки")
+    parser.add_argument("--blocked-share", type=float, default=0.02, help="доля подписчиков, заблокировавших бота")
+    parser.add_argument("--broadcast-at", type=float, default=5.0, help="запуск рассылки через столько секунд")
+    parser.add_argument("--broadcast-rate", type=float, default=500, help="BROADCAST_RATE бота, сообщ./с")
+    parser.add_argument("--refresh", type=float, default=5.0, help="период обновления курсов и кэша топа, с")
+    parser.add_argument("--tg-latency", type=float, default=0.03)
+    parser.add_argument("--tg-limit", type=int, default=10 ** 9, help="лимит сообщений в секунду у заглушки Bot API")
+    parser.add_argument("--tg-fail-rate", type=float, default=0.0)
+    parser.add_argument("--cbr-latency", type=float, default=0.2)
+    parser.add_argument("--cbr-fail-rate", type=float, default=0.1)
+    parser.add_argument("--coingecko-latency", type=float, default=0.15)
+    parser.add_argument("--coingecko-fail-rate", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="предупреждения и ошибки бота в stderr")
+    asyncio.run(main(parser.parse_args()))
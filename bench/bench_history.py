@@ -0,0 +1,90 @@
+"""Память и скорость RateHistory на глубине суток (288 замеров) и недели (2016).
+
+Для сравнения - deque(maxlen=N) из кортежей (время, курс). Статистика окна
+сверяется с прямым подсчётом по тем же данным, в том числе после
+многократного оборота буфера.
+
+    python bench/bench_history.py
+"""
+import random
+import sys
+import time
+import tracemalloc
+from collections import deque
+
+import bot_env  # noqa: F401  (путь к модулям бота)
+from rate_history import RateHistory
+
+STEP = 300
+
+
+def measure_memory(factory, depth, symbols=100):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    histories = [factory(depth) for _ in range(symbols)]
+    for history in histories:
+        for i in range(depth * 2):
+            history.append((1_700_000_000.0 + i * STEP, 88.0 + i % 97 / 10))
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / symbols
+
+
+class TupleDeque:
+    def __init__(self, depth):
+        self.items = deque(maxlen=depth)
+
+    def append(self, item):
+        self.items.append(item)
+
+
+class ArrayRing:
+    def __init__(self, depth):
+        self.history = RateHistory(depth)
+
+    def append(self, item):
+        self.history.append(item[1], item[0])
+
+
+def check_window(depth):
+    rng = random.Random(depth)
+    history = RateHistory(depth)
+    samples = []
+    now = 1_700_000_000.0
+    for i in range(depth * 3 + 17):
+        now += STEP
+        value = rng.uniform(80, 100)
+        history.append(value, now)
+        samples.append((now, value))
+    for seconds in (STEP * 3, 3600, 24 * 3600, 7 * 24 * 3600):
+        expected = [value for ts, value in samples[-depth:] if ts >= now - seconds]
+        stats = history.window(seconds, now)
+        assert stats.count == len(expected), (seconds, stats.count, len(expected))
+        assert (stats.first, stats.last, stats.low, stats.high) == (expected[0], expected[-1], min(expected), max(expected))
+        assert abs(stats.mean - sum(expected) / len(expected)) < 1e-9
+
+
+def timing(depth):
+    history = RateHistory(depth)
+    now = 1_700_000_000.0
+    started = time.perf_counter()
+    for i in range(100_000):
+        history.append(88.0, now + i * STEP)
+    append_ns = (time.perf_counter() - started) / 100_000 * 1e9
+    now += 100_000 * STEP
+    started = time.perf_counter()
+    for _ in range(10_000):
+        history.window(24 * 3600, now)
+    window_us = (time.perf_counter() - started) / 10_000 * 1e6
+    return append_ns, window_us
+
+
+if __name__ == "__main__":
+    print(f"{'глубина':<14}{'RateHistory, КБ':>17}{'deque кортежей, КБ':>20}{'append, нс':>12}{'окно 24 ч, мкс':>16}")
+    for depth, label in [(288, "24 ч (288)"), (2016, "7 дн (2016)")]:
+        check_window(depth)
+        ring = measure_memory(ArrayRing, depth)
+        tuples = measure_memory(TupleDeque, depth)
+        append_ns, window_us = timing(depth)
+        print(f"{label:<14}{ring / 1024:>17.1f}{tuples / 1024:>20.1f}{append_ns:>12.0f}{window_us:>16.1f}")
+    print(f"Статистика окон совпадает с прямым подсчётом (Python {sys.version.split()[0]})")
@@ -0,0 +1,150 @@
+"""Inline-режим "@bot 100 usd eur": проверка ответов и пропускная способность.
+
+Курсы ЦБ - ответ XML_daily со всеми валютами генератора базы бэкенда
+(backend/bench/generate_dataset.py); он проходит тот же путь, что при
+обновлении: parse_cbr_xml и apply_rates.
+Запросы - последовательности нажатий клавиш ("1", "10", "100", "100 u",
+"100 us", ...), как их присылает Telegram, пока пользователь печатает.
+
+Перед замером сверяется арифметика, поиск по русским и английским названиям,
+по префиксу и синонимам, а также сброс кэша при смене версии курсов.
+Замеряется обработчик целиком (с разбором InlineQuery и вызовом answer без
+сети): без кэша (каждый запрос собирается заново) и с кэшем.
+
+    python bench/bench_inline.py --queries 200000
+"""
+import argparse
+import asyncio
+import logging
+import random
+import sys
+import time
+
+from bot_env import ROOT, import_bot
+
+from aiogram.types import InlineQuery
+from inline_converter import normalize
+
+sys.path.append(str(ROOT / "backend" / "bench"))
+
+from generate_dataset import CURRENCIES  # noqa: E402
+
+CBR_XML = ('<?xml version="1.0" encoding="windows-1251"?><ValCurs Date="13.01.2024" name="Foreign Currency Market">'
+           + "".join(f'<Valute ID="R{i}"><NumCode>{i}</NumCode><CharCode>{code}</CharCode><Nominal>{nominal}</Nominal>'
+                     f'<Name>{name}</Name><Value>{str(value).replace(".", ",")}</Value></Valute>'
+                     for i, (code, name, value, nominal, _) in enumerate(CURRENCIES))
+           + "</ValCurs>").encode("cp1251")
+CRYPTO_JSON = {"bitcoin": {"usd": 46000}, "ethereum": {"usd": 2500}}
+
+# То, что печатают пользователи, целиком; запросы - все префиксы этих строк
+PHRASES = [
+    "100 usd eur", "100 usd rub", "250 eur usd", "1000 rub usd", "50 cny rub", "1 btc usd", "0,5 eth rub",
+    "100 доллар евро", "5000 рублей в юань", "100 dollar yuan", "20 фунт евро", "1 биткоин рубль",
+    "300 тенге", "1000 kzt rub", "10000 amd", "15 gbp", "70 try eur", "100 бакс", "usd", "евро",
+]
+
+
+def make_query(text: str, i: int) -> InlineQuery:
+    return InlineQuery.model_validate({
+        "id": str(i), "query": text, "offset": "",
+        "from": {"id": 1000 + i % 500, "is_bot": False, "first_name": "Test"},
+    })
+
+
+def keystrokes(phrases, count: int, seed: int = 1):
+    """count запросов: префиксы фраз в порядке набора, фразы в случайном порядке"""
+    rng = random.Random(seed)
+    queries = []
+    while len(queries) < count:
+        phrase = rng.choice(phrases)
+        queries.extend(phrase[:end] for end in range(1, len(phrase) + 1))
+    return queries[:count]
+
+
+def titles(bot_module, text: str):
+    return [result.title for result in bot_module.inline_converter.answer(text, bot_module.global_rates.version)]
+
+
+def check(bot_module):
+    rates = bot_module.global_rates.rates
+    bot_module.refresh_inline_index()
+
+    first = titles(bot_module, "100 usd eur")[0]
+    expected = 100 * rates["USD"].current / rates["EUR"].current
+    assert first == f"100.00 USD = {expected:,.2f} EUR", first
+    assert titles(bot_module, "100 USD в EUR")[0] == first
+    assert titles(bot_module, "100 доллар евро")[0] == first
+    assert titles(bot_module, "100 dollar euro")[0] == first
+    assert titles(bot_module, "100 usd")[0] == f"100.00 USD = {100 * rates['USD'].current:,.2f} RUB"
+
+    # Префиксы: "us" и "дол" - сначала доллар США, "юан"/"yua" - юань
+    assert titles(bot_module, "us")[0].startswith("1.00 USD = "), titles(bot_module, "us")
+    assert titles(bot_module, "дол")[0].startswith("1.00 USD = ")
+    assert titles(bot_module, "100 rub yua")[0].startswith("100.00 RUB = ")
+    assert titles(bot_module, "100 rub yua")[0].endswith(" CNY")
+    # Названия ЦБ ("Казахстанских тенге") и английские из таблицы
+    assert titles(bot_module, "1000 тенге")[0].startswith("1,000.00 KZT = ")
+    assert titles(bot_module, "1000 tenge")[0].startswith("1,000.00 KZT = ")
+    assert titles(bot_module, "1 btc")[0] == f"1.00 BTC = {rates['BTC'].current:,.2f} RUB"
+    assert titles(bot_module, "1 rub btc")[0].startswith("1.00 RUB = 0.0000")
+    assert titles(bot_module, "100 xyzzy") == []
+    assert len(titles(bot_module, "")) > 0
+
+    # Новая версия курсов - новый ответ, прежний из кэша не отдаётся
+    bot_module.global_rates.update("USD", rates["USD"].current * 2)
+    assert titles(bot_module, "100 usd eur")[0] != first
+    bot_module.global_rates.update("USD", rates["USD"].current / 2)
+    print(f"ответы совпадают с курсами в памяти: {first}")
+
+
+async def run(bot_module, queries, update_every: int) -> float:
+    answered = 0
+
+    async def answer(self, results, **kwargs):
+        nonlocal answered
+        answered += len(results)
+
+    InlineQuery.answer = answer
+    inline_queries = [make_query(text, i) for i, text in enumerate(queries)]
+    started = time.perf_counter()
+    for i, inline_query in enumerate(inline_queries):
+        if update_every and i and i % update_every == 0:
+            bot_module.global_rates.update("USD", bot_module.global_rates.rates["USD"].current)
+        await bot_module.inline_query_handler(inline_query)
+    elapsed = time.perf_counter() - started
+    assert answered, "обработчик не вернул ни одного результата"
+    return len(queries) / elapsed
+
+
+async def main(args):
+    bot_module = import_bot()
+    logging.disable(logging.INFO)
+    bot_module.apply_rates(bot_module.parse_cbr_xml(CBR_XML), None, bot_module.global_rates.initialize)
+    bot_module.apply_rates(None, CRYPTO_JSON, bot_module.global_rates.initialize)
+    check(bot_module)
+
+    converter = bot_module.inline_converter
+    queries = keystrokes(PHRASES, args.queries)
+    print(f"\n{args.queries} запросов, {len(set(queries))} разных, "
+          f"{len(bot_module.global_rates.rates) + 1} валют и монет в индексе")
+
+    cached_answer = converter.answer
+    converter.answer = lambda query, version: converter.render(normalize(query))
+    uncached = await run(bot_module, queries, 0)
+    converter.answer = cached_answer
+    cached = await run(bot_module, queries, 0)
+    updated = await run(bot_module, queries, args.update_every)
+    stats = converter.stats()
+    print(f"без кэша                       {uncached:>10.0f} запросов/с")
+    print(f"с кэшем                        {cached:>10.0f} запросов/с")
+    print(f"с кэшем, курсы раз в {args.update_every:<8}  {updated:>10.0f} запросов/с")
+    print(f"попаданий в кэш {stats['hit_rate']:.1%}, записей {len(converter.cache)}")
+    bot_module.storage.close()
+    await bot_module.bot.session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=200000)
+    parser.add_argument("--update-every", type=int, default=20000, help="запросов между обновлениями курсов")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,177 @@
+"""Метрики бота: проверка /metrics и стоимость замеров.
+
+Обновления проходят через Dispatcher с middleware HandlerMetrics, ответы
+уходят в заглушку Bot API. Запросы http_client идут в локальный сервер,
+отвечающий 200 или всегда 503 (ошибка после всех повторов). Затем цикл
+событий блокируется time.sleep, как его блокировал бы requests.get внутри
+корутины, и /metrics читается по HTTP: в нём должны быть гистограммы
+обработчиков, время и ошибки запросов по хосту, возраст курсов и опоздание
+цикла событий, равное блокировке с точностью до интервала монитора.
+
+Стоимость замеров - разница времени вызова пустого обработчика через
+HandlerMetrics и напрямую, и время построения ответа /metrics.
+
+    python bench/bench_metrics.py --updates 2000 --block 0.3
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+import aiohttp
+from aiogram.types import Update
+from aiohttp import web
+
+from bot_env import TEST_TOKEN, import_bot
+from telegram_stub import TelegramStub
+
+from http_client import http_client
+from metrics import HandlerMetrics, MetricsServer, registry
+
+TEXTS = ["💰 Курсы валют", "🪙 Криптовалюты", "/trend USD", "/alerts", "/help", "/watchlist"]
+
+
+def make_update(update_id: int, text: str) -> dict:
+    chat_id = 10 ** 7 + update_id % 1000
+    return {"update_id": update_id, "message": {
+        "message_id": update_id, "date": int(time.time()), "text": text,
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": chat_id, "is_bot": False, "first_name": "Test"},
+    }}
+
+
+async def start_upstream():
+    """Сервер вместо внешнего API: /ok - 200, /fail - всегда 503"""
+    async def ok(request):
+        return web.Response(body=b"<ValCurs/>")
+
+    async def fail(request):
+        return web.Response(status=503)
+
+    app = web.Application()
+    app.router.add_get("/ok", ok)
+    app.router.add_get("/fail", fail)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+
+def parse(text: str) -> dict:
+    """Строки с примерами метрик: {'имя{метки}': значение}"""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+async def middleware_overhead(calls: int) -> float:
+    """Добавка HandlerMetrics к вызову пустого обработчика, мкс"""
+    async def handler(event, data):
+        return None
+
+    handler.callback = handler
+    data = {"handler": handler}
+    middleware = HandlerMetrics()
+
+    started = time.perf_counter()
+    for _ in range(calls):
+        await handler(None, data)
+    direct = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(calls):
+        await middleware(handler, None, data)
+    wrapped = time.perf_counter() - started
+    return (wrapped - direct) / calls * 1e6
+
+
+async def main(args):
+    stub = await TelegramStub(limit=10 ** 9).start()
+    bot_module = import_bot()
+    logging.disable(logging.WARNING)
+    for code, value in [("USD", 88.68), ("EUR", 97.24), ("CNY", 12.33), ("BTC", 5_800_000.0), ("ETH", 285_000.0)]:
+        bot_module.global_rates.initialize(code, value)
+    bot_module.setup_handler_metrics()
+    dp = bot_module.dp
+    dp.include_router(bot_module.router)
+    bot = stub.bot(TEST_TOKEN)
+
+    lag_interval = 0.05
+    server = MetricsServer(lag_interval=lag_interval)
+    await server.start("127.0.0.1", 0)
+    upstream, base = await start_upstream()
+    http_client.backoff = 0.001
+
+    started = time.perf_counter()
+    for i in range(args.updates):
+        update = Update.model_validate(make_update(i + 1, TEXTS[i % len(TEXTS)]), context={"bot": bot})
+        await dp.feed_update(bot, update)
+    elapsed = time.perf_counter() - started
+
+    for _ in range(5):
+        await http_client.get_bytes(f"{base}/ok")
+    try:
+        await http_client.get_bytes(f"{base}/fail")
+    except aiohttp.ClientResponseError:
+        pass
+
+    await asyncio.sleep(0.2)
+    time.sleep(args.block)
+    await asyncio.sleep(0.2)
+
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"http://127.0.0.1:{server.port}/metrics") as response:
+            assert response.status == 200, response.status
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            samples = parse(await response.text())
+
+    per_handler = args.updates // len(TEXTS)
+    for name in ("currency_rates_command", "crypto_rates_command", "trend_command",
+                 "alerts_command", "help_command", "watchlist_command"):
+        count = samples[f'bot_handler_duration_seconds_count{{handler="{name}"}}']
+        assert count >= per_handler, (name, count)
+        assert samples[f'bot_handler_duration_seconds_bucket{{handler="{name}",le="+Inf"}}'] == count
+    assert samples['bot_upstream_request_duration_seconds_count{host="127.0.0.1"}'] == 6
+    assert samples['bot_upstream_errors_total{host="127.0.0.1",error="503"}'] == 1
+    assert samples['bot_upstream_retries_total{host="127.0.0.1"}'] == http_client.retries
+    assert 0 <= samples["bot_rates_age_seconds"] < 60
+    lag = samples["bot_event_loop_lag_max_seconds"]
+    # Блокировка могла начаться посреди сна монитора, тогда опоздание меньше на его часть
+    assert lag >= args.block - lag_interval, lag
+    # Блокировка попала в гистограмму опозданий выше корзины 0.1 с
+    assert samples['bot_event_loop_lag_seconds_bucket{le="0.1"}'] < samples["bot_event_loop_lag_seconds_count"]
+    mean = {name: samples[f'bot_handler_duration_seconds_sum{{handler="{name}"}}']
+            / samples[f'bot_handler_duration_seconds_count{{handler="{name}"}}']
+            for name in ("currency_rates_command", "trend_command")}
+    print(f"/metrics: {len(samples)} значений; блокировка {args.block * 1000:.0f} мс видна как "
+          f"опоздание цикла {lag * 1000:.0f} мс; ошибка 503 и {http_client.retries} повтора учтены")
+
+    overhead = await middleware_overhead(args.calls)
+    render_started = time.perf_counter()
+    for _ in range(100):
+        registry.render()
+    render = (time.perf_counter() - render_started) / 100 * 1000
+    print(f"\n{args.updates} обновлений за {elapsed:.2f} с ({args.updates / elapsed:.0f} обн./с) через заглушку Bot API")
+    print(f"среднее время обработчика: currency_rates_command {mean['currency_rates_command'] * 1000:.2f} мс, "
+          f"trend_command {mean['trend_command'] * 1000:.2f} мс")
+    print(f"HandlerMetrics добавляет {overhead:.2f} мкс на обновление")
+    print(f"построение ответа /metrics: {render:.2f} мс")
+
+    await server.stop()
+    await upstream.cleanup()
+    await http_client.close()
+    bot_module.storage.close()
+    await bot.session.close()
+    await bot_module.bot.session.close()
+    await stub.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--block", type=float, default=0.3, help="сколько секунд блокировать цикл событий (больше 0.1)")
+    parser.add_argument("--calls", type=int, default=200000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,54 @@
+"""Стоимость обработчиков кнопок курсов с кэшем текстов и без него.
+
+Без кэша текст собирается заново на каждое нажатие (как раньше), с кэшем -
+один раз на версию курсов и минуту. Курсы меняются каждые --update-every
+вызовов, имитируя обновление раз в 300 с при высокой нагрузке.
+
+    python bench/bench_render.py --calls 200000
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from bot_env import FakeMessage, import_bot
+
+
+async def run(bot_module, calls, update_every):
+    handlers = [bot_module.currency_rates_command, bot_module.crypto_rates_command]
+    message = FakeMessage(1)
+    started = time.perf_counter()
+    for i in range(calls):
+        if i % update_every == 0:
+            bot_module.global_rates.update("USD", 88 + i % 7)
+        await handlers[i % 2](message)
+        message.answers.clear()
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+async def main(args):
+    bot_module = import_bot()
+    logging.disable(logging.INFO)
+    for code, value in [("USD", 88.68), ("EUR", 97.24), ("CNY", 12.33), ("JPY", 0.61),
+                        ("BTC", 5_800_000.0), ("ETH", 285_000.0)]:
+        bot_module.global_rates.initialize(code, value)
+
+    cache_get = bot_module.render_cache.get
+    bot_module.render_cache.get = lambda name, version, key, render: render()
+    uncached = await run(bot_module, args.calls, args.update_every)
+    bot_module.render_cache.get = cache_get
+    cached = await run(bot_module, args.calls, args.update_every)
+
+    stats = bot_module.render_cache.stats()
+    print(f"{args.calls} нажатий, курсы меняются каждые {args.update_every}")
+    print(f"без кэша   {uncached:8.1f} мкс/вызов")
+    print(f"с кэшем    {cached:8.1f} мкс/вызов, попаданий {stats['hit_rate']:.1%} "
+          f"({stats['hits']} / {stats['misses']} промахов)")
+    await bot_module.bot.session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200_000)
+    parser.add_argument("--update-every", type=int, default=10_000)
+    asyncio.run(main(parser.parse_args()))
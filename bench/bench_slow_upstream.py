@@ -0,0 +1,102 @@
+"""Латентность обработчика бота во время медленного ответа ЦБ/CoinGecko.
+
+Поднимает локальную заглушку, которая отвечает с задержкой --delay, и во время
+обновления курсов каждые 20 мс вызывает currency_rates_command. Для сравнения
+тот же замер повторяется с блокирующим requests.get внутри корутины (как было
+раньше в update_rates_periodically).
+
+    python bench/bench_slow_upstream.py --delay 2
+"""
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+
+import requests
+from aiohttp import web
+
+from bot_env import FakeMessage, import_bot
+
+CBR_XML = ('<?xml version="1.0" encoding="windows-1251"?><ValCurs Date="13.01.2024" name="Foreign Currency Market">'
+           + "".join(f'<Valute ID="R{i}"><CharCode>{code}</CharCode><Nominal>1</Nominal><Name>{code}</Name>'
+                     f'<Value>{value}</Value></Valute>'
+                     for i, (code, value) in enumerate([("USD", "88,6846"), ("EUR", "97,2408"),
+                                                        ("CNY", "12,3346"), ("JPY", "61,1869")]))
+           + "</ValCurs>").encode("cp1251")
+CRYPTO_JSON = {"bitcoin": {"usd": 65000}, "ethereum": {"usd": 3200}}
+
+
+def start_stub(delay: float):
+    """Заглушка в отдельном потоке со своим циклом событий (иначе блокирующий вариант её бы остановил)"""
+    async def cbr(request):
+        await asyncio.sleep(delay)
+        return web.Response(body=CBR_XML, content_type="application/xml")
+
+    async def crypto(request):
+        await asyncio.sleep(delay)
+        return web.json_response(CRYPTO_JSON)
+
+    loop = asyncio.new_event_loop()
+    app = web.Application()
+    app.router.add_get("/cbr", cbr)
+    app.router.add_get("/crypto", crypto)
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    loop.run_until_complete(site.start())
+    port = runner.addresses[0][1]
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return f"http://127.0.0.1:{port}"
+
+
+async def probe(bot_module, stop: asyncio.Event):
+    """Латентность обработчика, включая ожидание своей очереди в цикле событий"""
+    samples = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.02)
+        await bot_module.currency_rates_command(FakeMessage(1))
+        samples.append((time.perf_counter() - started - 0.02) * 1000)
+    return samples
+
+
+async def blocking_fetch(bot_module):
+    """Прежний вариант: синхронные запросы внутри корутины"""
+    response = requests.get(bot_module.CURRENCY_URL)
+    bot_module.parse_cbr_xml(response.content)
+    requests.get(bot_module.CRYPTO_URL).json()
+
+
+def report(name, samples):
+    samples.sort()
+    p99 = samples[max(0, int(len(samples) * 0.99) - 1)]
+    print(f"{name:<34}{len(samples):>8}{statistics.median(samples):>10.2f}{p99:>10.2f}{samples[-1]:>10.2f}")
+
+
+async def main(base: str):
+    bot_module = import_bot()
+    bot_module.CURRENCY_URL = f"{base}/cbr"
+    bot_module.CRYPTO_URL = f"{base}/crypto"
+
+    print(f"{'обновление курсов':<34}{'вызовов':>8}{'p50, мс':>10}{'p99, мс':>10}{'max, мс':>10}")
+    for name, fetch in [("aiohttp (fetch_rates)", bot_module.fetch_rates),
+                        ("requests.get в корутине", lambda: blocking_fetch(bot_module))]:
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(probe(bot_module, stop))
+        await asyncio.sleep(0.2)
+        started = time.perf_counter()
+        await fetch()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        report(f"{name} ({elapsed:.1f} с)", await probe_task)
+
+    await bot_module.http_client.close()
+    await bot_module.bot.session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--delay", type=float, default=2.0, help="задержка ответа заглушки, с")
+    args = parser.parse_args()
+    asyncio.run(main(start_stub(args.delay)))
@@ -0,0 +1,100 @@
+"""Хранение подписчиков: прежний users.pkl против BotStorage (SQLite WAL).
+
+Замеряет стоимость одной подписки/отписки при --users подписчиках, загрузку
+при старте и размер файлов, затем переносит pickle-файлы прежнего формата
+в базу и сверяет результат.
+
+    python bench/bench_storage.py --users 1000000
+"""
+import argparse
+import os
+import pickle
+import random
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import bot_env  # noqa: F401  (путь к модулям бота)
+from storage import BotStorage
+
+
+# Те же классы, что и в боте, запущенном как __main__: так они записаны в старых rates.pkl
+@dataclass
+class Rate:
+    current: float
+    previous: Optional[float] = None
+
+
+class GlobalRates:
+    def __init__(self):
+        self.rates: Dict[str, Rate] = {}
+
+
+def timed(fn, repeat=1):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+def main(args):
+    rng = random.Random(1)
+    users = set(rng.sample(range(10 ** 6, 10 ** 10), args.users))
+    newcomers = [rng.randrange(10 ** 10, 10 ** 11) for _ in range(args.ops)]
+    global_rates = GlobalRates()
+    for code, value in [("USD", 88.68), ("EUR", 97.24), ("CNY", 12.33), ("JPY", 0.61),
+                        ("BTC", 5_800_000.0), ("ETH", 285_000.0)]:
+        global_rates.rates[code] = Rate(value, value * 0.99)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        users_file = os.path.join(tmp, "users.pkl")
+        rates_file = os.path.join(tmp, "rates.pkl")
+
+        def save_pickle():
+            with open(users_file, "wb") as f:
+                pickle.dump(users, f)
+
+        def load_pickle():
+            with open(users_file, "rb") as f:
+                return pickle.load(f)
+
+        # /start в старой версии = полная перезапись файла
+        pickle_write, _ = timed(save_pickle, repeat=3)
+        pickle_load, _ = timed(load_pickle)
+        pickle_size = os.path.getsize(users_file)
+        with open(rates_file, "wb") as f:
+            pickle.dump(global_rates, f)
+
+        storage = BotStorage(os.path.join(tmp, "bot.db"))
+        migrate, _ = timed(lambda: storage.migrate_pickles(users_file, rates_file))
+        assert not os.path.exists(users_file) and os.path.exists(users_file + ".migrated")
+
+        started = time.perf_counter()
+        for user_id in newcomers:
+            storage.add_user(user_id)
+        sqlite_add = (time.perf_counter() - started) / len(newcomers) * 1000
+        started = time.perf_counter()
+        for user_id in newcomers:
+            storage.remove_user(user_id)
+        sqlite_remove = (time.perf_counter() - started) / len(newcomers) * 1000
+
+        sqlite_load, loaded = timed(storage.load_users)
+        assert loaded == users, "подписчики после миграции не совпадают"
+        assert storage.load_rates() == {code: (rate.current, rate.previous)
+                                        for code, rate in global_rates.rates.items()}
+        storage.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        sqlite_size = os.path.getsize(storage.path)
+        storage.close()
+
+    print(f"{args.users} подписчиков, миграция из pickle {migrate / 1000:.1f} с, данные совпадают")
+    print(f"{'хранилище':<12}{'подписка, мс':>14}{'отписка, мс':>14}{'загрузка, мс':>14}{'размер, МБ':>12}")
+    print(f"{'users.pkl':<12}{pickle_write:>14.2f}{pickle_write:>14.2f}{pickle_load:>14.1f}{pickle_size / 2 ** 20:>12.1f}")
+    print(f"{'SQLite WAL':<12}{sqlite_add:>14.3f}{sqlite_remove:>14.3f}{sqlite_load:>14.1f}{sqlite_size / 2 ** 20:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--ops", type=int, default=1000, help="число подписок/отписок для замера")
+    main(parser.parse_args())
@@ -0,0 +1,83 @@
+"""Стоимость обновления курсов в зависимости от числа пользователей со списками.
+
+Пользователи отслеживают случайные валюты ЦБ и монеты из пула --coins.
+Заглушки ЦБ и CoinGecko считают запросы; обновление должно зависеть только
+от числа разных символов, а не от числа пользователей.
+
+    python bench/bench_watchlist.py --users 10000 100000 1000000
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+from aiohttp import web
+
+from bot_env import import_bot
+from bench_slow_upstream import CBR_XML
+
+
+class Upstream:
+    def __init__(self):
+        self.requests = 0
+        self.max_ids_length = 0
+
+    async def cbr(self, request):
+        return web.Response(body=CBR_XML, content_type="application/xml")
+
+    async def crypto(self, request):
+        self.requests += 1
+        ids = request.query["ids"]
+        self.max_ids_length = max(self.max_ids_length, len(ids))
+        return web.json_response({coin_id: {"usd": 1.0 + len(coin_id)} for coin_id in ids.split(",")})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/cbr", self.cbr)
+        app.router.add_get("/crypto", self.crypto)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        return f"http://127.0.0.1:{self.runner.addresses[0][1]}"
+
+
+async def main(args):
+    bot_module = import_bot()
+    logging.disable(logging.INFO)
+    upstream = Upstream()
+    base = await upstream.start()
+    bot_module.CURRENCY_URL = f"{base}/cbr"
+    bot_module.CRYPTO_URL = f"{base}/crypto"
+
+    rng = random.Random(1)
+    pool = ["USD", "EUR", "CNY", "JPY"] + [f"coin-{i:04d}" for i in range(args.coins)]
+    print(f"{'пользователей':>14}{'символов':>10}{'запросов CG':>13}{'макс. ids':>11}{'обновление, мс':>16}")
+    for users in args.users:
+        bot_module.watchlists = watchlists = bot_module.Watchlists()
+        for user_id in range(users):
+            for symbol in rng.sample(pool, rng.randint(1, 5)):
+                watchlists.add(user_id, symbol)
+
+        upstream.requests = upstream.max_ids_length = 0
+        started = time.perf_counter()
+        current_rates, data = await bot_module.fetch_rates()
+        bot_module.apply_rates(current_rates, data, bot_module.global_rates.update)
+        elapsed = (time.perf_counter() - started) * 1000
+
+        coins = watchlists.coins()
+        assert all(bot_module.coin_key(coin_id) in bot_module.global_rates.rates for coin_id in coins)
+        print(f"{users:>14}{len(watchlists.counts):>10}{upstream.requests:>13}"
+              f"{upstream.max_ids_length:>11}{elapsed:>16.1f}")
+
+    await bot_module.http_client.close()
+    await bot_module.bot.session.close()
+    await upstream.runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--coins", type=int, default=500, help="размер пула монет")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,184 @@
+"""Обработка обновлений в режиме webhook и polling через заглушку Bot API.
+
+Каждое обновление - нажатие "💰 Курсы валют" в своём чате; обработчик
+отвечает sendMessage в заглушку. Задержка обработки считается от отправки
+обновления (POST в webhook или появления в getUpdates) до ответа в
+заглушке. Заглушка отвечает на каждый метод Bot API с задержкой --latency,
+как Telegram по сети; POST webhook идёт напрямую по localhost.
+
+Каждый режим замеряется дважды: --updates обновлений сразу (пропускная
+способность, задержка здесь - в основном ожидание в очереди) и с постоянным
+потоком --rate обновлений в секунду (задержка без перегрузки). Заглушка и
+бот работают в одном процессе и делят процессор, поэтому абсолютные цифры
+занижены.
+
+Перед замером проверяется, что при переполненных очередях webhook отвечает
+503 и не теряет принятые обновления, а остановка дорабатывает всё принятое.
+
+    python bench/bench_webhook.py --updates 5000 --connections 40 --latency 0.05
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+import aiohttp
+
+from bot_env import TEST_TOKEN, import_bot
+from telegram_stub import TelegramStub
+
+from webhook import SECRET_HEADER, WebhookServer
+
+SECRET = "bench-secret"
+
+
+def make_update(update_id: int, chat_id: int) -> dict:
+    return {"update_id": update_id, "message": {
+        "message_id": update_id, "date": int(time.time()), "text": "💰 Курсы валют",
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": chat_id, "is_bot": False, "first_name": "Test"},
+    }}
+
+
+async def wait_delivered(stub, chat_ids, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    while any(chat_id not in stub.delivered_at for chat_id in chat_ids):
+        assert time.monotonic() < deadline, "не все обновления обработаны"
+        await asyncio.sleep(0.01)
+
+
+async def pace(started: float, i: int, rate):
+    """Ожидание момента отправки i-го обновления при потоке rate обновлений в секунду"""
+    if rate:
+        delay = started + i / rate - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def post_updates(url: str, updates, connections: int, sent: dict, rate=None):
+    """Отправка как у Telegram: не больше connections запросов одновременно; 503 - повтор"""
+    statuses = {}
+    queue = enumerate(updates)
+    started = time.monotonic()
+    async with aiohttp.ClientSession() as session:
+        async def sender():
+            for i, update in queue:
+                await pace(started, i, rate)
+                chat_id = update["message"]["chat"]["id"]
+                sent.setdefault(chat_id, time.monotonic())
+                while True:
+                    async with session.post(url, json=update, headers={SECRET_HEADER: SECRET}) as response:
+                        statuses[response.status] = statuses.get(response.status, 0) + 1
+                        if response.status == 200:
+                            break
+                    await asyncio.sleep(0.05)
+
+        await asyncio.gather(*(sender() for _ in range(connections)))
+    return statuses
+
+
+def report(name: str, count: int, elapsed: float, stub, sent: dict, extra: str = ""):
+    samples = sorted((stub.delivered_at[chat_id] - started) * 1000 for chat_id, started in sent.items())
+    p99 = samples[max(0, int(len(samples) * 0.99) - 1)]
+    print(f"{name:<20}{count / elapsed:>10.0f}{statistics.median(samples):>10.1f}{p99:>10.1f}{samples[-1]:>10.1f}  {extra}")
+
+
+# Чаты, уже использованные в замерах
+stub_chats = set()
+
+
+def new_chats(count: int):
+    """Чаты, которых ещё не было в заглушке"""
+    first = max(max(stub_chats, default=0) + 1, 10 ** 7)
+    chats = range(first, first + count)
+    stub_chats.update(chats)
+    return chats
+
+
+async def check_backpressure(stub, bot, dp):
+    """Маленькие очереди: лишние запросы получают 503, принятое дорабатывается при остановке"""
+    server = WebhookServer(bot, dp, secret=SECRET, workers=2, queue_size=4, enqueue_timeout=0.05)
+    await server.setup("127.0.0.1", 0, "https://bench/webhook")
+    url = f"http://127.0.0.1:{server.port}/webhook"
+    chat_ids = new_chats(200)
+    async with aiohttp.ClientSession() as session:
+        denied = await session.post(url, json=make_update(1, 1))
+        assert denied.status == 401, denied.status
+        responses = await asyncio.gather(*(
+            session.post(url, json=make_update(chat_id, chat_id), headers={SECRET_HEADER: SECRET})
+            for chat_id in chat_ids))
+    accepted = [chat_id for chat_id, response in zip(chat_ids, responses) if response.status == 200]
+    rejected = sum(response.status == 503 for response in responses)
+    assert rejected and len(accepted) + rejected == len(chat_ids), (len(accepted), rejected)
+    await server.stop()
+    delivered = [chat_id for chat_id in chat_ids if chat_id in stub.delivered_at]
+    assert delivered == accepted, (len(delivered), len(accepted))
+    print(f"переполнение: {len(accepted)} принято, {rejected} получили 503; "
+          f"после остановки обработаны все принятые, потерянных нет")
+
+
+async def run_webhook(stub, bot, dp, args):
+    server = WebhookServer(bot, dp, secret=SECRET, workers=args.workers, queue_size=args.queue_size)
+    await server.setup("127.0.0.1", 0, "https://bench/webhook")
+    url = f"http://127.0.0.1:{server.port}/webhook"
+    for name, count, rate in (("webhook", args.updates, None), (f"webhook, {args.rate:.0f}/с", args.rate_updates, args.rate)):
+        chat_ids = new_chats(count)
+        sent = {}
+        started = time.perf_counter()
+        statuses = await post_updates(url, [make_update(chat_id, chat_id) for chat_id in chat_ids],
+                                      args.connections, sent, rate)
+        await wait_delivered(stub, chat_ids)
+        report(name, count, time.perf_counter() - started, stub, sent, f"ответы webhook {statuses}")
+    await server.stop()
+
+
+async def run_polling(stub, bot, dp, args):
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=10))
+    await asyncio.sleep(0.2)
+    update_id = 0
+    for name, count, rate in (("polling", args.updates, None), (f"polling, {args.rate:.0f}/с", args.rate_updates, args.rate)):
+        chat_ids = new_chats(count)
+        sent = {}
+        started = time.perf_counter()
+        for i, chat_id in enumerate(chat_ids):
+            await pace(started, i, rate)
+            update_id += 1
+            sent[chat_id] = time.monotonic()
+            stub.push_update(make_update(update_id, chat_id))
+        await wait_delivered(stub, chat_ids)
+        report(name, count, time.perf_counter() - started, stub, sent)
+    await dp.stop_polling()
+    await polling
+
+
+async def main(args):
+    stub = await TelegramStub(latency=args.latency, limit=10 ** 9).start()
+    bot_module = import_bot()
+    logging.disable(logging.INFO)
+    dp = bot_module.dp
+    dp.include_router(bot_module.router)
+    bot = stub.bot(TEST_TOKEN)
+
+    await check_backpressure(stub, bot, dp)
+    print(f"\n{args.updates} обновлений, задержка Bot API {args.latency * 1000:.0f} мс")
+    print(f"{'режим':<20}{'обн./с':>10}{'p50, мс':>10}{'p99, мс':>10}{'max, мс':>10}")
+    await run_webhook(stub, bot, dp, args)
+    # start_polling закрывает сессию бота по завершении
+    await run_polling(stub, bot, dp, args)
+
+    bot_module.storage.close()
+    await bot_module.bot.session.close()
+    await stub.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--connections", type=int, default=40, help="max_connections webhook у Telegram")
+    parser.add_argument("--workers", type=int, default=64)
+    parser.add_argument("--queue-size", type=int, default=1024)
+    parser.add_argument("--rate", type=float, default=100, help="поток обновлений в секунду для замера задержки")
+    parser.add_argument("--rate-updates", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка ответа Bot API, с")
+    asyncio.run(main(parser.parse_args()))
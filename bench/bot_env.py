@@ -0,0 +1,30 @@
+"""Импорт currency_crypto_bot вне боевого окружения: тестовый токен и временный рабочий каталог."""
+import os
+import sys
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+TEST_TOKEN = "123456789:AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA"
+
+
+def import_bot(workdir: str = None):
+    """Импортирует бота так, чтобы data/ создавалась во временном каталоге"""
+    os.environ.setdefault("BOT_TOKEN", TEST_TOKEN)
+    os.chdir(workdir or tempfile.mkdtemp(prefix="bot-bench-"))
+    import currency_crypto_bot
+    return currency_crypto_bot
+
+
+class FakeMessage(SimpleNamespace):
+    """Минимальная замена aiogram.types.Message для вызова обработчиков напрямую"""
+
+    def __init__(self, user_id: int, text: str = ""):
+        user = SimpleNamespace(id=user_id, username=f"user{user_id}", first_name="Test")
+        super().__init__(from_user=user, chat=SimpleNamespace(id=user_id), text=text, answers=[])
+
+    async def answer(self, text, **kwargs):
+        self.answers.append(text)
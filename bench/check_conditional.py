@@ -0,0 +1,104 @@
+"""Проверка условных запросов бота к ЦБ: 304 и повтор того же тела.
+
+Заглушка отдаёт XML_daily с ETag, с Last-Modified или без валидаторов.
+Тик обновления с неизменившимся ответом не должен разбирать XML и вызывать
+Rate.update, поэтому previous сохраняет значение прошлой публикации, а не
+затирается тем же курсом ("➖ 0.00"). Прежние курсы при этом добавляются в
+историю, чтобы в окнах /trend были замеры и между публикациями ЦБ.
+
+    python bench/check_conditional.py
+"""
+import asyncio
+import hashlib
+import logging
+
+from aiohttp import web
+
+from bot_env import import_bot
+from bench_slow_upstream import CBR_XML
+
+NEW_XML = CBR_XML.replace("88,6846".encode("cp1251"), "89,1234".encode("cp1251"))
+
+
+class ConditionalStub:
+    def __init__(self, validators):
+        self.validators = validators
+        self.body = CBR_XML
+        self.not_modified = 0
+
+    async def cbr(self, request):
+        digest = hashlib.sha256(self.body).hexdigest()
+        if self.validators == "etag":
+            header, condition, value = "ETag", "If-None-Match", f'"{digest[:16]}"'
+        elif self.validators == "last-modified":
+            header, condition, value = "Last-Modified", "If-Modified-Since", f"Sat, 13 Jan 2024 {digest[:2]}:00:00 GMT"
+        else:
+            header = None
+        if header and request.headers.get(condition) == value:
+            self.not_modified += 1
+            return web.Response(status=304, headers={header: value})
+        return web.Response(body=self.body, content_type="application/xml",
+                            headers={header: value} if header else None)
+
+    async def crypto(self, request):
+        return web.json_response({coin_id: {"usd": 1000.0} for coin_id in request.query["ids"].split(",")})
+
+
+async def tick(bot_module):
+    current_rates, data = await bot_module.fetch_rates()
+    bot_module.apply_rates(current_rates, data, bot_module.global_rates.update)
+
+
+async def check(bot_module, validators):
+    stub = ConditionalStub(validators)
+    app = web.Application()
+    app.router.add_get("/cbr", stub.cbr)
+    app.router.add_get("/crypto", stub.crypto)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    base = f"http://127.0.0.1:{runner.addresses[0][1]}"
+    bot_module.CURRENCY_URL = f"{base}/cbr"
+    bot_module.CRYPTO_URL = f"{base}/crypto"
+    bot_module.http_client.validators.clear()
+    bot_module.http_client.stats.clear()
+    bot_module.global_rates.replace({})
+    bot_module.global_rates.history.clear()
+
+    current_rates, data = await bot_module.fetch_rates()
+    bot_module.apply_rates(current_rates, data, bot_module.global_rates.initialize)
+    stub.body = NEW_XML
+    await tick(bot_module)
+    usd = bot_module.global_rates.rates["USD"]
+    assert (usd.current, usd.previous) == (89.1234, 88.6846), usd
+
+    version = bot_module.global_rates.version
+    for _ in range(3):
+        await tick(bot_module)
+    assert (usd.current, usd.previous) == (89.1234, 88.6846), f"previous затёрт: {usd}"
+    assert len(bot_module.global_rates.history["USD"]) == 5
+    assert "замеров: 5" in bot_module.get_trend("USD")
+    # Версия растёт от курсов монет и замеров валют в истории
+    assert bot_module.global_rates.version - version == 3 * (2 + len(bot_module.cbr_rates))
+    assert "📈 +0.44₽" in bot_module.get_currency_rates()
+
+    repeated = "not_modified" if validators else "unchanged"
+    assert bot_module.http_client.stats == {"changed": 2, repeated: 3}, bot_module.http_client.stats
+    assert stub.not_modified == (3 if validators else 0)
+    print(f"{validators or 'без валидаторов':<16} {dict(bot_module.http_client.stats)}, USD {usd}")
+    await runner.cleanup()
+
+
+async def main():
+    bot_module = import_bot()
+    logging.disable(logging.INFO)
+    for validators in ("etag", "last-modified", None):
+        await check(bot_module, validators)
+    print("Неизменившийся ответ ЦБ не разбирается, не затирает previous и попадает в историю")
+    await bot_module.http_client.close()
+    await bot_module.bot.session.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""Локальная заглушка api.coingecko.com для бенчмарков: simple/price и coins/markets.
+
+Цены детерминированы по id монеты и медленно меняются со временем, как у
+CoinGecko. Задержка ответа и доля ответов 429/500 настраиваются; запросы и
+отказы считаются по эндпоинтам.
+"""
+import asyncio
+import random
+import time
+import zlib
+from collections import Counter
+
+from aiohttp import web
+
+TOP_COINS = [
+    ("bitcoin", "Bitcoin", "btc", 65000.0), ("ethereum", "Ethereum", "eth", 3200.0),
+    ("tether", "Tether", "usdt", 1.0), ("binancecoin", "BNB", "bnb", 580.0), ("solana", "Solana", "sol", 150.0),
+    ("usd-coin", "USDC", "usdc", 1.0), ("ripple", "XRP", "xrp", 0.52), ("dogecoin", "Dogecoin", "doge", 0.15),
+    ("toncoin", "Toncoin", "ton", 6.9), ("cardano", "Cardano", "ada", 0.45),
+]
+
+
+class CoinGeckoStub:
+    def __init__(self, latency: float = 0.0, fail_rate: float = 0.0, seed: int = 1):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self.requests = Counter()
+        self.failures = Counter()
+        self.started = time.monotonic()
+        self.runner = None
+        self.base = None
+
+    def price(self, coin_id: str, base: float = None) -> float:
+        if base is None:
+            # Монеты вне списка: цена из хеша id, от 0.01 до 100 долларов
+            base = 10 ** (zlib.crc32(coin_id.encode()) % 5 - 2)
+        minutes = (time.monotonic() - self.started) / 60
+        return round(base * (1 + 0.01 * ((zlib.crc32(coin_id.encode()) + int(minutes)) % 7 - 3)), 6)
+
+    async def reply(self, endpoint: str, build):
+        self.requests[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail_rate and self.rng.random() < self.fail_rate:
+            status = self.rng.choice((429, 500))
+            self.failures[endpoint] += 1
+            return web.json_response({"status": {"error_code": status}}, status=status)
+        return web.json_response(build())
+
+    async def simple_price(self, request: web.Request) -> web.Response:
+        known = {coin_id: base for coin_id, _, _, base in TOP_COINS}
+        ids = [coin_id for coin_id in request.query.get("ids", "").split(",") if coin_id]
+        return await self.reply("simple/price", lambda: {
+            coin_id: {"usd": self.price(coin_id, known.get(coin_id))} for coin_id in ids
+        })
+
+    async def markets(self, request: web.Request) -> web.Response:
+        per_page = int(request.query.get("per_page", 100))
+        coins = [TOP_COINS[i] if i < len(TOP_COINS) else (f"coin-{i}", f"Coin {i}", f"c{i}", None)
+                 for i in range(per_page)]
+
+        def build():
+            result = []
+            for rank, (coin_id, name, symbol, base) in enumerate(coins, 1):
+                price = self.price(coin_id, base)
+                result.append({"id": coin_id, "name": name, "symbol": symbol, "current_price": price,
+                               "market_cap": price * 10 ** 9 / rank, "market_cap_rank": rank})
+            return result
+
+        return await self.reply("coins/markets", build)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/api/v3/simple/price", self.simple_price)
+        app.router.add_get("/api/v3/coins/markets", self.markets)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.base = f"http://127.0.0.1:{self.runner.addresses[0][1]}/api/v3"
+        return self
+
+    async def stop(self):
+        await self.runner.cleanup()
@@ -0,0 +1,130 @@
+"""Локальная заглушка Telegram Bot API для бенчмарков рассылки.
+
+Принимает sendMessage, ограничивает скорость как Telegram (не больше limit
+сообщений за скользящую секунду, иначе 429 с retry_after), отвечает 403 для
+заблокировавших бота, доле fail_rate сообщений - 502, и считает
+доставленные сообщения по чатам. Для polling отдаёт через getUpdates
+обновления, добавленные push_update.
+"""
+import asyncio
+import random
+import time
+from collections import Counter, deque
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiohttp import web
+
+
+class TelegramStub:
+    def __init__(self, latency: float = 0.0, limit: int = 30, retry_after: int = 1, blocked=(),
+                 fail_rate: float = 0.0, seed: int = 1):
+        self.latency = latency
+        self.limit = limit
+        self.retry_after = retry_after
+        self.blocked = set(blocked)
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self.delivered = Counter()
+        self.flood_errors = 0
+        self.server_errors = 0
+        # on_message(token, chat_id) вызывается для каждого доставленного сообщения
+        self.on_message = None
+        self.window = deque()
+        self.message_id = 0
+        # chat_id -> time.monotonic() последнего доставленного сообщения
+        self.delivered_at = {}
+        self.updates = deque()
+        self.updates_event = asyncio.Event()
+        self.runner = None
+        self.base = None
+
+    def bot(self, token: str) -> Bot:
+        return Bot(token=token, session=AiohttpSession(api=TelegramAPIServer.from_base(self.base)))
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        try:
+            data = await request.post()
+        except ConnectionResetError:
+            # Клиент отменил запрос (прерванная рассылка)
+            return web.Response(status=499)
+        chat_id = int(data["chat_id"])
+
+        now = time.monotonic()
+        while self.window and now - self.window[0] >= 1:
+            self.window.popleft()
+        if len(self.window) >= self.limit:
+            self.flood_errors += 1
+            return web.json_response({
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after}
+            }, status=429)
+        self.window.append(now)
+
+        if chat_id in self.blocked:
+            return web.json_response({"ok": False, "error_code": 403,
+                                      "description": "Forbidden: bot was blocked by the user"}, status=403)
+        if self.fail_rate and self.rng.random() < self.fail_rate:
+            self.server_errors += 1
+            return web.json_response({"ok": False, "error_code": 502, "description": "Bad Gateway"}, status=502)
+        self.delivered[chat_id] += 1
+        self.delivered_at[chat_id] = time.monotonic()
+        if self.on_message is not None:
+            self.on_message(request.match_info["token"], chat_id)
+        self.message_id += 1
+        return web.json_response({"ok": True, "result": {
+            "message_id": self.message_id, "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"}, "text": data.get("text", "")
+        }})
+
+    def push_update(self, update: dict):
+        self.updates.append(update)
+        self.updates_event.set()
+
+    async def get_updates(self, request: web.Request) -> web.Response:
+        """Long polling: ждёт обновлений до timeout секунд, как Telegram"""
+        data = await request.post()
+        offset = int(data.get("offset", 0))
+        while self.updates and self.updates[0]["update_id"] < offset:
+            self.updates.popleft()
+        if not self.updates:
+            self.updates_event.clear()
+            try:
+                await asyncio.wait_for(self.updates_event.wait(), float(data.get("timeout", 0)))
+            except asyncio.TimeoutError:
+                pass
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        limit = int(data.get("limit", 100))
+        return web.json_response({"ok": True, "result": [self.updates[i] for i in range(min(limit, len(self.updates)))]})
+
+    async def get_me(self, request: web.Request) -> web.Response:
+        return web.json_response({"ok": True, "result": {
+            "id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"
+        }})
+
+    async def ok(self, request: web.Request) -> web.Response:
+        """setWebhook, deleteWebhook"""
+        return web.json_response({"ok": True, "result": True})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/sendMessage", self.handle)
+        app.router.add_post("/bot{token}/getUpdates", self.get_updates)
+        app.router.add_post("/bot{token}/getMe", self.get_me)
+        app.router.add_post("/bot{token}/setWebhook", self.ok)
+        app.router.add_post("/bot{token}/deleteWebhook", self.ok)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.base = f"http://127.0.0.1:{port}"
+        return self
+
+    async def stop(self):
+        await self.runner.cleanup()
@@ -0,0 +1,220 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError
+)
+
+logger = logging.getLogger(__name__)
+
+# Telegram допускает около 30 сообщений в секунду в разные чаты
+DEFAULT_RATE = 25
+DEFAULT_CONCURRENCY = 10
+MAX_ATTEMPTS = 5
+# Незавершённую рассылку старше этого возраста после перезапуска не продолжаем
+RESUME_WINDOW = 6 * 3600
+
+
+class TokenBucket:
+    """Общий лимит скорости отправки; pause() останавливает всех после RetryAfter"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+class BroadcastProgress:
+    """Состояние рассылки на диске: заголовок с текстом и журнал доставленных user_id.
+
+    Журнал дописывается построчно, поэтому после падения повторно уйдут только
+    сообщения, отправленные, но ещё не записанные (не больше concurrency).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done_path = path + '.done'
+        self._done_file = None
+
+    def start(self, text: str) -> dict:
+        state = {'id': time.strftime('%Y%m%d%H%M%S'), 'text': text, 'started': time.time()}
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        open(self.done_path, 'w').close()
+        return state
+
+    def load(self) -> Optional[dict]:
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def load_done(self) -> Set[int]:
+        if not os.path.exists(self.done_path):
+            return set()
+        with open(self.done_path) as f:
+            # Последняя строка может быть оборвана на середине
+            return {int(line) for line in f if line.endswith('\n')}
+
+    def mark_done(self, user_id: int):
+        if self._done_file is None:
+            self._done_file = open(self.done_path, 'a')
+        self._done_file.write(f"{user_id}\n")
+        self._done_file.flush()
+
+    def close(self):
+        if self._done_file is not None:
+            self._done_file.close()
+            self._done_file = None
+
+    def finish(self):
+        self.close()
+        for path in (self.path, self.done_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+@dataclass
+class BroadcastResult:
+    sent: int = 0
+    failed: int = 0
+    blocked: List[int] = field(default_factory=list)
+    elapsed: float = 0.0
+
+
+class Broadcaster:
+    """Рассылка одного готового текста всем подписчикам с ограничением скорости.
+
+    Лимит скорости общий для всех рассылок бота, в том числе для оповещений
+    send_each, чтобы вместе они не превышали ограничение Telegram.
+    """
+
+    def __init__(self, bot: Bot, progress_path: str, rate: float = DEFAULT_RATE,
+                 concurrency: int = DEFAULT_CONCURRENCY, max_attempts: int = MAX_ATTEMPTS,
+                 resume_window: float = RESUME_WINDOW):
+        self.bot = bot
+        self.progress = BroadcastProgress(progress_path)
+        self.rate = rate
+        self.bucket = TokenBucket(rate)
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.resume_window = resume_window
+        self.sent = 0
+        self.total = 0
+        self.running = False
+
+    async def run(self, text: str, user_ids: Iterable[int], reply_markup=None) -> BroadcastResult:
+        """Новая рассылка; незавершённая предыдущая отбрасывается"""
+        self.progress.start(text)
+        return await self._send(text, sorted(user_ids), reply_markup)
+
+    async def resume(self, user_ids: Iterable[int], reply_markup=None) -> Optional[BroadcastResult]:
+        """Продолжает рассылку, прерванную перезапуском, если она есть и не устарела"""
+        state = self.progress.load()
+        if state is None:
+            return None
+        age = time.time() - state['started']
+        if age > self.resume_window:
+            logger.info(f"Discarding stale broadcast {state['id']} started {age / 3600:.1f} h ago")
+            self.progress.finish()
+            return None
+        done = self.progress.load_done()
+        pending = sorted(set(user_ids) - done)
+        logger.info(f"Resuming broadcast {state['id']}: {len(done)} delivered, {len(pending)} pending")
+        return await self._send(state['text'], pending, reply_markup)
+
+    async def send_each(self, messages: Iterable[Tuple[int, str]], reply_markup=None) -> BroadcastResult:
+        """Разные тексты разным пользователям, без сохранения прогресса"""
+        messages = list(messages)
+        result = BroadcastResult()
+        started = time.perf_counter()
+        queue = iter(messages)
+
+        async def worker():
+            for user_id, text in queue:
+                if await self._deliver(user_id, text, reply_markup, result):
+                    result.sent += 1
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(messages)) or 1)))
+        result.elapsed = time.perf_counter() - started
+        return result
+
+    async def _send(self, text: str, user_ids: List[int], reply_markup) -> BroadcastResult:
+        result = BroadcastResult()
+        self.sent = 0
+        self.total = len(user_ids)
+        self.running = True
+        started = time.perf_counter()
+        queue = iter(user_ids)
+
+        async def worker():
+            for user_id in queue:
+                if await self._deliver(user_id, text, reply_markup, result):
+                    result.sent += 1
+                    self.sent += 1
+                self.progress.mark_done(user_id)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(user_ids)) or 1)))
+        finally:
+            self.progress.close()
+            self.running = False
+        self.progress.finish()
+        result.elapsed = time.perf_counter() - started
+        logger.info(f"Broadcast finished: {result.sent} sent, {len(result.blocked)} blocked, "
+                    f"{result.failed} failed in {result.elapsed:.1f} s")
+        return result
+
+    async def _deliver(self, user_id: int, text: str, reply_markup, result: BroadcastResult) -> bool:
+        for attempt in range(self.max_attempts):
+            await self.bucket.acquire()
+            try:
+                await self.bot.send_message(user_id, text, reply_markup=reply_markup)
+                return True
+            except TelegramRetryAfter as e:
+                logger.warning(f"Flood limit hit, pausing broadcast for {e.retry_after} s")
+                self.bucket.pause(e.retry_after)
+            except TelegramForbiddenError:
+                logger.info(f"User {user_id} blocked the bot, removing from subscribers")
+                result.blocked.append(user_id)
+                return False
+            except (TelegramNetworkError, TelegramServerError) as e:
+                logger.warning(f"Error sending to user {user_id}: {e}, attempt {attempt + 1}/{self.max_attempts}")
+                await asyncio.sleep(min(2 ** attempt, 30))
+            except Exception as e:
+                logger.error(f"Error sending scheduled message to user {user_id}: {e}")
+                break
+        result.failed += 1
+        return False
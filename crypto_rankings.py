@@ -1,9 +1,11 @@
-import requests
+import aiohttp
 import logging
 import time
 from typing import List, Dict
 import asyncio
 
+from http_client import http_client
+
 logger = logging.getLogger(__name__)
 
 COINGECKO_API_URL = "https://api.coingecko.com/api/v3"
@@ -14,16 +16,16 @@ crypto_cache = {
 }
 CACHE_TTL = 300  
 
-def get_cached_top_cryptocurrencies(limit: int = 10) -> List[Dict]:
+async def get_cached_top_cryptocurrencies(limit: int = 10) -> List[Dict]:
     current_time = time.time()
     if current_time - crypto_cache['timestamp'] > CACHE_TTL or not crypto_cache['data']:
-        data = get_top_cryptocurrencies_from_api(limit=100) 
+        data = await get_top_cryptocurrencies_from_api(limit=100)
         if data:
             crypto_cache['data'] = data
             crypto_cache['timestamp'] = current_time
     return crypto_cache['data'][:limit]
 
-def get_top_cryptocurrencies_from_api(limit: int) -> List[Dict]:
+async def get_top_cryptocurrencies_from_api(limit: int) -> List[Dict]:
     try:
         url = f"{COINGECKO_API_URL}/coins/markets"
         params = {
@@ -33,11 +35,8 @@ def get_top_cryptocurrencies_from_api(limit: int) -> List[Dict]:
             'page': 1,
             'sparkline': 'false'
         }
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        return data
-    except requests.exceptions.RequestException as e:
+        return await http_client.get_json(url, params=params)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         logger.error(f"Network error: {e}")
         return []
     except Exception as e:
@@ -62,7 +61,7 @@ def format_top_cryptocurrencies(data: List[Dict], usd_to_rub: float) -> str:
 
 async def update_crypto_cache():
     while True:
-        data = get_top_cryptocurrencies_from_api(limit=100)
+        data = await get_top_cryptocurrencies_from_api(limit=100)
         if data:
             crypto_cache['data'] = data
             crypto_cache['timestamp'] = time.time()
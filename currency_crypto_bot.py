@@ -1,26 +1,36 @@
 import os
+import re
 import time
 from dotenv import load_dotenv
 from aiogram import Bot, Dispatcher, Router, F
-from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton
+from aiogram.types import InlineQuery, Message, ReplyKeyboardMarkup, KeyboardButton
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.filters.command import Command
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import asyncio
-import requests
+import signal
 from datetime import datetime
 import logging
 import pytz
-import xml.etree.ElementTree as ET
 from dataclasses import dataclass
 from typing import Dict, Optional
-import pickle
 
 from crypto_rankings import (
+    crypto_cache,
     get_cached_top_cryptocurrencies,
     format_top_cryptocurrencies,
     update_crypto_cache
 )
+from backend.cbr_parser import parse_daily
+from http_client import http_client
+from inline_converter import InlineConverter, symbol_names
+from metrics import HandlerMetrics, MetricsServer, registry
+from broadcast import Broadcaster
+from storage import BotStorage
+from rate_history import DEFAULT_DEPTH, RateHistory
+from alerts import Alert, AlertEngine
+from watchlist import COIN_ALIASES, Watchlists, chunk_ids, coin_key, is_currency
+from webhook import DEFAULT_QUEUE_SIZE, DEFAULT_WORKERS, WebhookServer
 
 logging.basicConfig(
     level=logging.INFO,  
@@ -36,9 +46,20 @@ if not API_TOKEN:
     logger.error("BOT_TOKEN не найден. Убедитесь, что он задан в файле .env")
     exit(1)
 
+# Публичный адрес бота (например, https://bot.example.com); без него бот работает через polling
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8080))
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+# Метрики Prometheus на http://METRICS_HOST:METRICS_PORT/metrics; METRICS_PORT=0 - выключены
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9108))
+
 CURRENCY_URL = "https://www.cbr.ru/scripts/XML_daily.asp"
-CRYPTO_URL = ("https://api.coingecko.com/api/v3/simple/price?ids=bitcoin,"
-              "ethereum&vs_currencies=usd")
+CRYPTO_URL = "https://api.coingecko.com/api/v3/simple/price"
+# Секунды между обновлениями курсов ЦБ и CoinGecko
+RATES_UPDATE_INTERVAL = float(os.getenv('RATES_UPDATE_INTERVAL', 300))
 
 bot = Bot(token=API_TOKEN)
 dp = Dispatcher(storage=MemoryStorage())
@@ -47,6 +68,13 @@ router = Router()
 moscow_tz = pytz.timezone('Europe/Moscow')
 
 active_users = set()
+watchlists = Watchlists()
+alert_engine = AlertEngine()
+MAX_ALERTS_PER_USER = 20
+# Коды и названия валют из последнего ответа ЦБ
+cbr_names: Dict[str, str] = {}
+# Последние разобранные курсы ЦБ, повторяются в истории, пока ответ не меняется
+cbr_rates: list = []
 
 @dataclass
 class Rate:
@@ -59,19 +87,104 @@ class Rate:
         return self.current, self.previous
 
 class GlobalRates:
-    def __init__(self):
+    def __init__(self, history_depth: int = DEFAULT_DEPTH):
         self.rates: Dict[str, Rate] = {}
+        # Последние замеры каждого курса для /trend
+        self.history: Dict[str, RateHistory] = {}
+        self.history_depth = history_depth
+        # Увеличивается при каждом изменении курсов, по нему сбрасывается кэш текстов
+        self.version = 0
+        # Время последнего изменения курсов (time.time()), 0 - курсов ещё нет
+        self.updated = 0.0
 
     def get_or_create(self, currency: str) -> Rate:
         if currency not in self.rates:
             self.rates[currency] = Rate(0)
         return self.rates[currency]
 
+    def get_history(self, currency: str) -> RateHistory:
+        if currency not in self.history:
+            self.history[currency] = RateHistory(self.history_depth)
+        return self.history[currency]
+
     def update(self, currency: str, value: float) -> tuple[float, Optional[float]]:
         rate = self.get_or_create(currency)
+        self.get_history(currency).append(value)
+        self.version += 1
+        self.updated = time.time()
         return rate.update(value)
 
-global_rates = GlobalRates()
+    def sample(self, currency: str, value: float):
+        """Замер неизменившегося курса: только история для /trend, current и previous не трогаем"""
+        self.get_history(currency).append(value)
+        self.version += 1
+
+    def initialize(self, currency: str, value: float):
+        """Текущий курс при старте; предыдущий сохраняется, если уже был"""
+        rate = self.get_or_create(currency)
+        rate.current = value
+        if rate.previous is None:
+            rate.previous = value
+        self.get_history(currency).append(value)
+        self.version += 1
+        self.updated = time.time()
+
+    def replace(self, rates: Dict[str, Rate]):
+        self.rates = rates
+        self.version += 1
+        self.updated = time.time()
+
+global_rates = GlobalRates(int(os.getenv('RATE_HISTORY_DEPTH', DEFAULT_DEPTH)))
+
+class RenderCache:
+    """Готовые тексты ответов для текущей версии курсов.
+
+    Для каждого текста хранится одна запись (время в заголовке, текст);
+    при смене версии курсов кэш очищается целиком.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.items: Dict[str, tuple] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name: str, version: int, time_key, render):
+        if version != self.version:
+            self.items.clear()
+            self.version = version
+        item = self.items.get(name)
+        if item is not None and item[0] == time_key:
+            self.hits += 1
+            return item[1]
+        self.misses += 1
+        text = render()
+        self.items[name] = (time_key, text)
+        return text
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+render_cache = RenderCache()
+
+def current_rate(symbol: str) -> Optional[float]:
+    rate = global_rates.rates.get(symbol)
+    return rate.current if rate is not None and rate.current else None
+
+inline_converter = InlineConverter(current_rate)
+# Версия курсов и символы, по которым построен индекс inline-режима
+inline_index_state = {'version': None, 'symbols': frozenset(), 'names': 0}
+# Сколько секунд Telegram может показывать прежний ответ на тот же inline-запрос
+INLINE_CACHE_TIME = int(os.getenv('INLINE_CACHE_TIME', 60))
+
+# Время в заголовке ответов: seconds - с точностью до секунды (кэш почти не
+# работает), minutes - до минуты, none - без времени
+RATES_TIMESTAMP = os.getenv('RATES_TIMESTAMP', 'minutes')
 
 DATA_DIR = os.path.join(os.getcwd(), 'data')
 
@@ -82,57 +195,138 @@ if not os.path.exists(DATA_DIR):
 else:
     logger.info(f"Data directory exists at {DATA_DIR}")
 
+# pickle-файлы прежних версий, переносятся в STORAGE_FILE при первом запуске
 RATES_FILE = os.path.join(DATA_DIR, 'rates.pkl')
 USERS_FILE = os.path.join(DATA_DIR, 'users.pkl')
+STORAGE_FILE = os.path.join(DATA_DIR, 'bot.db')
+BROADCAST_FILE = os.path.join(DATA_DIR, 'broadcast.json')
+
+storage = BotStorage(STORAGE_FILE)
+
+broadcaster = Broadcaster(
+    bot,
+    BROADCAST_FILE,
+    rate=float(os.getenv('BROADCAST_RATE', 25)),
+    concurrency=int(os.getenv('BROADCAST_CONCURRENCY', 10))
+)
+
+def age(timestamp: float) -> float:
+    """Секунды с момента timestamp; NaN, если данных ещё не было"""
+    return time.time() - timestamp if timestamp else float('nan')
+
+registry.gauge('bot_rates_age_seconds', "Возраст курсов в global_rates",
+               function=lambda: age(global_rates.updated))
+registry.gauge('bot_crypto_cache_age_seconds', "Возраст кэша топа криптовалют",
+               function=lambda: age(crypto_cache['timestamp']))
+registry.gauge('bot_render_cache_hit_ratio', "Доля ответов из кэша текстов",
+               function=lambda: render_cache.stats()['hit_rate'])
+registry.gauge('bot_inline_cache_hit_ratio', "Доля inline-ответов из кэша",
+               function=lambda: inline_converter.stats()['hit_rate'])
+registry.gauge('bot_active_users', "Подписчики рассылки", function=lambda: len(active_users))
+registry.gauge('bot_broadcast_running', "Идёт ли рассылка", function=lambda: broadcaster.running)
+registry.gauge('bot_broadcast_sent', "Доставлено сообщений в текущей или последней рассылке",
+               function=lambda: broadcaster.sent)
+registry.gauge('bot_broadcast_total', "Получателей в текущей или последней рассылке",
+               function=lambda: broadcaster.total)
+scheduled_job_seconds = registry.histogram(
+    'bot_scheduled_job_duration_seconds', "Время ежедневной рассылки scheduled_jobs",
+    buckets=(1, 10, 60, 300, 900, 1800, 3600, 7200))
+
+MAIN_KEYBOARD = ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="💰 Курсы валют"),
+         KeyboardButton(text="🪙 Криптовалюты")],
+        [KeyboardButton(text="📊 Все курсы"),
+         KeyboardButton(text="🏆 Топ криптовалют")],
+        [KeyboardButton(text="ℹ️ Помощь")]
+    ],
+    resize_keyboard=True,
+    input_field_placeholder="Выберите действие"
+)
 
 def create_main_keyboard():
-    return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="💰 Курсы валют"),
-             KeyboardButton(text="🪙 Криптовалюты")],
-            [KeyboardButton(text="📊 Все курсы"),
-             KeyboardButton(text="🏆 Топ криптовалют")],
-            [KeyboardButton(text="ℹ️ Помощь")]
-        ],
-        resize_keyboard=True,
-        input_field_placeholder="Выберите действие"
-    )
+    # Клавиатура не зависит от курсов, создаётся один раз
+    return MAIN_KEYBOARD
 
 def format_rate_change(current: float, previous: Optional[float],
                        currency_code: str) -> str:
+    # Для дешёвых монет двух знаков после запятой не хватает
+    digits = 2 if abs(current) >= 0.01 or current == 0 else 6
     if previous is None or previous == 0:
-        return f"{current:.2f}₽"
+        return f"{current:.{digits}f}₽"
 
     change = current - previous
     percent = (change / previous) * 100 if previous else 0
 
-    value_str = f"{current:.2f}"
+    value_str = f"{current:.{digits}f}"
 
     if change > 0:
-        return (f"{value_str}₽ (📈 +{change:.2f}₽, +{percent:.2f}%)")
+        return (f"{value_str}₽ (📈 +{change:.{digits}f}₽, +{percent:.2f}%)")
     elif change < 0:
-        return (f"{value_str}₽ (📉 {change:.2f}₽, {percent:.2f}%)")
+        return (f"{value_str}₽ (📉 {change:.{digits}f}₽, {percent:.2f}%)")
     else:
         return f"{value_str}₽ (➖ 0.00₽, 0.00%)"
 
 def parse_cbr_xml(xml_content):
+    """Курсы ЦБ (DailyRate: код, название, курс за единицу) или None, если ответ не разобран"""
     try:
-        root = ET.fromstring(xml_content)
-        currencies = {}
-        for valute in root.findall(".//Valute"):
-            char_code = valute.find('CharCode').text
-            value = float(valute.find('Value').text.replace(',', '.'))
-            nominal = int(valute.find('Nominal').text)
-            currencies[char_code] = value / nominal
-        return currencies
+        return parse_daily(xml_content)[1]
     except Exception as e:
         logger.error(f"Error parsing CBR XML: {e}")
         return None
 
+def time_key():
+    """Ключ времени для кэша: меняется только тогда, когда меняется время в заголовке"""
+    if RATES_TIMESTAMP == 'none':
+        return None
+    if RATES_TIMESTAMP == 'seconds':
+        return int(time.time())
+    return int(time.time() // 60)
+
+def rates_time_header() -> str:
+    if RATES_TIMESTAMP == 'none':
+        return ""
+    time_format = '%H:%M:%S' if RATES_TIMESTAMP == 'seconds' else '%H:%M'
+    return f" на {datetime.now(moscow_tz).strftime(time_format)} МСК"
+
 def get_currency_rates():
+    return render_cache.get('currency', global_rates.version, time_key(), render_currency_rates)
+
+def get_crypto_rates():
+    return render_cache.get('crypto', global_rates.version, time_key(), render_crypto_rates)
+
+def get_all_rates():
+    return render_cache.get('all', global_rates.version, time_key(), render_all_rates)
+
+TREND_WINDOWS = [(3600, "1 ч"), (24 * 3600, "24 ч")]
+
+def get_trend(code: str):
+    return render_cache.get(f'trend:{code}', global_rates.version, time_key(), lambda: render_trend(code))
+
+def render_trend(code: str):
+    history = global_rates.history.get(code)
+    if not history:
+        return f"ℹ️ По {code} пока нет замеров, попробуйте позже."
+
+    output = [f"📊 Динамика {code}{rates_time_header()}:"]
+    for seconds, label in TREND_WINDOWS:
+        stats = history.window(seconds)
+        if stats is None:
+            continue
+        sign = "+" if stats.change >= 0 else ""
+        output.append(
+            f"\n⏱ За {label} (замеров: {stats.count}):\n"
+            f"Мин: {stats.low:,.2f}₽, макс: {stats.high:,.2f}₽\n"
+            f"Среднее: {stats.mean:,.2f}₽\n"
+            f"Изменение: {sign}{stats.change:,.2f}₽ ({sign}{stats.change_percent:.2f}%)"
+        )
+    if len(output) == 1:
+        output.append(f"\nℹ️ За последние {TREND_WINDOWS[-1][1]} замеров нет, попробуйте позже.")
+    return "\n".join(output)
+
+def render_currency_rates():
     try:
-        current_time = datetime.now(moscow_tz).strftime('%H:%M:%S')
-        output = [f"💰 Курс валют на {current_time} МСК:\n"]
+        output = [f"💰 Курс валют{rates_time_header()}:\n"]
 
         for currency, code, symbol in [
             ("Доллар США", "USD", "💵"),
@@ -151,10 +345,8 @@ def get_currency_rates():
         logger.error(f"Error getting currency rates: {e}")
         return ("❌ Ошибка при получении курса валют. Попробуйте позже.")
 
-def get_crypto_rates():
+def render_crypto_rates():
     try:
-        current_time = datetime.now(moscow_tz).strftime('%H:%M:%S')
-
         usd_rate = global_rates.get_or_create('USD').current
         btc_rate = global_rates.get_or_create('BTC')
         eth_rate = global_rates.get_or_create('ETH')
@@ -167,19 +359,22 @@ def get_crypto_rates():
         eth_formatted = format_rate_change(eth_rate.current,
                                            eth_rate.previous, 'ETH')
 
-        return (f"🪙 Курс криптовалют на {current_time} МСК:\n\n"
+        return (f"🪙 Курс криптовалют{rates_time_header()}:\n\n"
                 f"₿ Bitcoin:\n${int(btc_usd):,} = {btc_formatted}\n\n"
                 f"Ξ Ethereum:\n${int(eth_usd):,} = {eth_formatted}")
     except Exception as e:
         logger.error(f"Error getting crypto rates: {e}")
         return ("❌ Ошибка при получении курса криптовалют. Попробуйте позже.")
 
-async def send_all_rates(chat_id):
+def render_all_rates():
     currency_rates = get_currency_rates()
     crypto_rates = get_crypto_rates()
+    return f"{currency_rates}\n\n{'-' * 30}\n\n{crypto_rates}"
+
+async def send_all_rates(chat_id):
     await bot.send_message(
         chat_id,
-        f"{currency_rates}\n\n{'-' * 30}\n\n{crypto_rates}",
+        get_all_rates(),
         reply_markup=create_main_keyboard()
     )
 
@@ -190,6 +385,7 @@ async def start_command(message: Message):
     logger.info(f"New user started bot - ID: {user_id}, Username: @{username}")
 
     active_users.add(user_id)
+    storage.add_user(user_id)
 
     welcome_text = (
         f"👋 Привет, {message.from_user.first_name}!\n\n"
@@ -202,7 +398,6 @@ async def start_command(message: Message):
 
     await message.answer(welcome_text, reply_markup=create_main_keyboard())
     await send_all_rates(user_id)
-    save_users()  
 
 @router.message(Command(commands=["help"]))
 @router.message(F.text == "ℹ️ Помощь")
@@ -215,6 +410,11 @@ async def help_command(message: Message):
         "🏆 Топ криптовалют - рейтинг топовых криптовалют\n"
         "   Использование: /topcrypto [количество], по умолчанию 10, максимум 100\n"
         "📊 Все курсы - показать все курсы\n"
+        "/trend USD - мин., макс. и среднее за час и сутки\n"
+        "/add EUR, /add solana - добавить валюту ЦБ или монету CoinGecko в свой список\n"
+        "/remove EUR - убрать из списка, /watchlist - показать список\n"
+        "/alert BTC > 7000000 - оповестить, когда курс в рублях пересечёт порог\n"
+        "/alerts - ваши оповещения, /unalert 5 - удалить оповещение\n"
         "/stop - отписаться от рассылки\n"
         "/start - подписаться на рассылку\n"
         "/help - показать эту справку\n\n"
@@ -231,13 +431,13 @@ async def stop_command(message: Message):
 
     if user_id in active_users:
         active_users.remove(user_id)
+        storage.remove_user(user_id)
         logger.info(f"User {user_id} unsubscribed from notifications")
         await message.answer(
             "✅ Вы отписались от автоматической рассылки курсов.\n"
             "Чтобы подписаться снова, используйте команду /start",
             reply_markup=create_main_keyboard()
         )
-        save_users() 
     else:
         await message.answer(
             "ℹ️ Вы уже отписаны от рассылки.\n"
@@ -282,133 +482,442 @@ async def top_crypto_command(message: Message):
     else:
         limit = 5
 
-    data = get_cached_top_cryptocurrencies(limit)
+    data = await get_cached_top_cryptocurrencies(limit)
     usd_rate = global_rates.get_or_create('USD').current or 0
     formatted_data = format_top_cryptocurrencies(data, usd_to_rub=usd_rate)
     await message.answer(formatted_data, reply_markup=create_main_keyboard(), parse_mode='HTML')
 
-def initialize_rates():
-    load_rates()
-    response = requests.get(CURRENCY_URL)
-    response.encoding = "utf-8"
-    current_rates = parse_cbr_xml(response.text)
-
-    if current_rates:
-        for code in ["USD", "EUR", "CNY", "JPY"]:
-            rate = global_rates.get_or_create(code)
-            rate.current = current_rates[code]
-            if rate.previous is None:
-                rate.previous = current_rates[code]
+@router.message(Command(commands=["trend"]))
+async def trend_command(message: Message):
+    logger.info(f"Trend requested by user {message.from_user.id}")
+    parts = message.text.split()
+    code = rate_key(resolve_symbol(parts[1])) if len(parts) > 1 else ''
+    if code not in global_rates.rates:
+        await message.answer(
+            "ℹ️ Использование: /trend КОД, например /trend USD\n"
+            f"Доступные коды: {', '.join(sorted(global_rates.rates))}",
+            reply_markup=create_main_keyboard()
+        )
+        return
+    await message.answer(get_trend(code), reply_markup=create_main_keyboard())
+
+def resolve_symbol(text: str) -> str:
+    """Код валюты ЦБ (заглавными) или id монеты CoinGecko (строчными)"""
+    if text.upper() in cbr_names:
+        return text.upper()
+    return COIN_ALIASES.get(text.lower(), text.lower())
+
+def rate_key(symbol: str) -> str:
+    return symbol if is_currency(symbol) else coin_key(symbol)
+
+async def ensure_symbol(symbol: str) -> bool:
+    """Есть ли курс символа; новую монету проверяем в CoinGecko и сразу получаем курс"""
+    if rate_key(symbol) in global_rates.rates:
+        return True
+    if is_currency(symbol) or not re.fullmatch(r'[a-z0-9-]{1,64}', symbol):
+        return False
+    prices = await fetch_coin_prices([symbol])
+    if not prices or 'usd' not in prices.get(symbol, {}):
+        return False
+    global_rates.initialize(rate_key(symbol), prices[symbol]['usd'] * global_rates.get_or_create('USD').current)
+    return True
+
+def unknown_symbol_text(text: str) -> str:
+    return (f"❌ Не нашёл валюту или монету «{text}». "
+            "Для монет используйте id CoinGecko, например solana.")
+
+@router.message(Command(commands=["add"]))
+async def add_command(message: Message):
+    user_id = message.from_user.id
+    parts = message.text.split()
+    if len(parts) < 2:
+        await message.answer("ℹ️ Использование: /add КОД или /add id-монеты, например /add EUR или /add solana",
+                             reply_markup=create_main_keyboard())
+        return
+    symbol = resolve_symbol(parts[1])
+    logger.info(f"User {user_id} adds {symbol} to watchlist")
+
+    if not await ensure_symbol(symbol):
+        await message.answer(unknown_symbol_text(parts[1]), reply_markup=create_main_keyboard())
+        return
+
+    if watchlists.add(user_id, symbol):
+        storage.add_watch(user_id, symbol)
+        await message.answer(f"✅ {symbol} добавлен в ваш список. Посмотреть: /watchlist",
+                             reply_markup=create_main_keyboard())
     else:
-        logger.error("Failed to initialize currency rates.")
-
-    response = requests.get(CRYPTO_URL)
-    data = response.json()
+        await message.answer(f"ℹ️ {symbol} уже есть в вашем списке.", reply_markup=create_main_keyboard())
 
-    if data:
-        usd_rate = current_rates.get('USD', 0)
-        btc_usd = data['bitcoin']['usd']
-        eth_usd = data['ethereum']['usd']
-        btc_rub = btc_usd * usd_rate
-        eth_rub = eth_usd * usd_rate
+@router.message(Command(commands=["remove"]))
+async def remove_command(message: Message):
+    user_id = message.from_user.id
+    parts = message.text.split()
+    symbol = resolve_symbol(parts[1]) if len(parts) > 1 else ''
+    if symbol and watchlists.remove(user_id, symbol):
+        storage.remove_watch(user_id, symbol)
+        await message.answer(f"✅ {symbol} удалён из вашего списка.", reply_markup=create_main_keyboard())
+    else:
+        await message.answer("ℹ️ Такого символа нет в вашем списке. Посмотреть: /watchlist",
+                             reply_markup=create_main_keyboard())
 
-        for code, value in [("BTC", btc_rub), ("ETH", eth_rub)]:
-            rate = global_rates.get_or_create(code)
-            rate.current = value
-            if rate.previous is None:
-                rate.previous = value
+@router.message(Command(commands=["watchlist"]))
+async def watchlist_command(message: Message):
+    user_id = message.from_user.id
+    logger.info(f"Watchlist requested by user {user_id}")
+    symbols = watchlists.of(user_id)
+    if not symbols:
+        await message.answer("ℹ️ Ваш список пуст. Добавьте валюту или монету: /add EUR, /add solana",
+                             reply_markup=create_main_keyboard())
+        return
+
+    output = ["⭐ Ваш список:\n"]
+    for symbol in symbols:
+        rate = global_rates.rates.get(rate_key(symbol))
+        value = format_rate_change(rate.current, rate.previous, symbol) if rate else "нет данных"
+        output.append(f"{symbol}: {value}")
+    await message.answer("\n".join(output), reply_markup=create_main_keyboard())
+
+def refresh_inline_index():
+    """Перестраивает индекс символов, если появились новые валюты или монеты.
+
+    Набор символов сравнивается только при смене версии курсов, то есть не
+    чаще обновления курсов, а не на каждый inline-запрос.
+    """
+    state = inline_index_state
+    if state['version'] == global_rates.version:
+        return
+    state['version'] = global_rates.version
+    symbols = frozenset(global_rates.rates)
+    if symbols != state['symbols'] or len(cbr_names) != state['names']:
+        inline_converter.rebuild(symbol_names(symbols, cbr_names))
+        state['symbols'], state['names'] = symbols, len(cbr_names)
+
+@router.inline_query()
+async def inline_query_handler(inline_query: InlineQuery):
+    """@bot 100 usd eur: конвертация по курсам в памяти, без запросов к ЦБ и CoinGecko"""
+    refresh_inline_index()
+    results = inline_converter.answer(inline_query.query, global_rates.version)
+    await inline_query.answer(results, cache_time=INLINE_CACHE_TIME)
+
+ALERT_PATTERN = re.compile(r'(\S+?)\s*([<>])\s*(\d[\d\s]*(?:[.,]\d+)?)')
+
+def format_alert(alert: Alert) -> str:
+    direction = "выше" if alert.direction == '>' else "ниже"
+    return f"#{alert.alert_id} {alert.symbol} {direction} {alert.threshold:,.2f}₽"
+
+@router.message(Command(commands=["alert"]))
+async def alert_command(message: Message):
+    user_id = message.from_user.id
+    args = message.text.partition(' ')[2].strip()
+    match = ALERT_PATTERN.fullmatch(args)
+    if not match:
+        await message.answer("ℹ️ Использование: /alert КОД > ЦЕНА или /alert КОД < ЦЕНА, "
+                             "например /alert BTC > 7000000", reply_markup=create_main_keyboard())
+        return
+    if len(storage.user_alerts(user_id)) >= MAX_ALERTS_PER_USER:
+        await message.answer(f"❌ Не больше {MAX_ALERTS_PER_USER} оповещений. Удалите лишние: /alerts",
+                             reply_markup=create_main_keyboard())
+        return
+
+    symbol = resolve_symbol(match.group(1))
+    direction = match.group(2)
+    threshold = float(re.sub(r'\s', '', match.group(3)).replace(',', '.'))
+    if not await ensure_symbol(symbol):
+        await message.answer(unknown_symbol_text(match.group(1)), reply_markup=create_main_keyboard())
+        return
+
+    current = global_rates.rates[rate_key(symbol)].current
+    alert = Alert(0, user_id, symbol, direction, threshold)
+    if alert.triggered_by(current):
+        await message.answer(f"ℹ️ Условие уже выполнено: {symbol} сейчас {current:,.2f}₽",
+                             reply_markup=create_main_keyboard())
+        return
+
+    alert = alert._replace(alert_id=storage.add_alert(user_id, symbol, direction, threshold))
+    alert_engine.add(alert)
+    logger.info(f"User {user_id} created alert {alert.alert_id}")
+    await message.answer(f"🔔 Оповещение создано: {format_alert(alert)}\nСейчас: {current:,.2f}₽",
+                         reply_markup=create_main_keyboard())
+
+@router.message(Command(commands=["alerts"]))
+async def alerts_command(message: Message):
+    alerts = [Alert(*row) for row in storage.user_alerts(message.from_user.id)]
+    if not alerts:
+        text = "ℹ️ У вас нет оповещений. Создать: /alert BTC > 7000000"
     else:
+        text = "🔔 Ваши оповещения:\n\n" + "\n".join(format_alert(alert) for alert in alerts)
+    await message.answer(text, reply_markup=create_main_keyboard())
+
+@router.message(Command(commands=["unalert"]))
+async def unalert_command(message: Message):
+    parts = message.text.split()
+    alert_id = int(parts[1].lstrip('#')) if len(parts) > 1 and parts[1].lstrip('#').isdigit() else None
+    alert = alert_engine.alerts.get(alert_id)
+    if alert is None or alert.user_id != message.from_user.id:
+        await message.answer("ℹ️ Оповещение не найдено. Список: /alerts", reply_markup=create_main_keyboard())
+        return
+    alert_engine.remove(alert_id)
+    storage.remove_alerts([alert_id])
+    await message.answer(f"✅ Оповещение {format_alert(alert)} удалено.", reply_markup=create_main_keyboard())
+
+def check_alerts():
+    """Сработавшие после обновления курсов оповещения, O(log n + k) на символ"""
+    fired = []
+    for symbol in list(alert_engine.by_symbol):
+        rate = global_rates.rates.get(rate_key(symbol))
+        # 0 - заглушка курса, который ещё не загружен, а не котировка
+        if rate is not None and rate.current:
+            fired.extend(alert_engine.check(symbol, rate.current))
+    return fired
+
+# Ссылки на фоновые рассылки оповещений: asyncio хранит задачи только по слабой ссылке
+notification_tasks = set()
+
+def notification_done(task: asyncio.Task):
+    notification_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Alert notification failed: {task.exception()!r}")
+
+async def notify_alerts(fired):
+    """Отправка через общий лимит скорости; из базы удаляем после отправки, чтобы не потерять при падении"""
+    messages = []
+    for alert in fired:
+        current = global_rates.rates[rate_key(alert.symbol)].current
+        messages.append((alert.user_id, f"🔔 Сработало оповещение {format_alert(alert)}\n"
+                                        f"Сейчас: {current:,.2f}₽"))
+    result = await broadcaster.send_each(messages)
+    storage.remove_alerts(alert.alert_id for alert in fired)
+    remove_blocked_users(result)
+    logger.info(f"Alerts fired: {len(fired)}, delivered {result.sent}")
+
+async def fetch_coin_prices(coin_ids):
+    """Цены монет в долларах пачками simple/price; None, если не ответил ни один запрос"""
+    chunks = chunk_ids(coin_ids)
+    responses = await asyncio.gather(
+        *(http_client.get_json(CRYPTO_URL, params={'ids': ','.join(chunk), 'vs_currencies': 'usd'})
+          for chunk in chunks),
+        return_exceptions=True
+    )
+    prices = {}
+    failed = 0
+    for response in responses:
+        if isinstance(response, Exception):
+            logger.error(f"Error fetching crypto rates: {response!r}")
+            failed += 1
+        else:
+            prices.update(response)
+    return None if failed == len(chunks) else prices
+
+async def fetch_rates():
+    """Параллельная загрузка курсов ЦБ и CoinGecko, ошибка одного источника не мешает другому.
+
+    Запрашиваются все монеты из списков пользователей; число запросов
+    зависит от числа разных монет, а не от числа пользователей.
+    """
+    cbr_xml, crypto_data = await asyncio.gather(
+        http_client.get_changed(CURRENCY_URL),
+        fetch_coin_prices(watchlists.coins() | {symbol for symbol in alert_engine.by_symbol
+                                                 if not is_currency(symbol)}),
+        return_exceptions=True
+    )
+    # None без ошибки - ответ ЦБ не изменился с прошлого запроса
+    cbr_unchanged = cbr_xml is None
+    if isinstance(cbr_xml, Exception):
+        logger.error(f"Error fetching CBR rates: {cbr_xml!r}")
+        cbr_xml = None
+    if isinstance(crypto_data, Exception):
+        logger.error(f"Error fetching crypto rates: {crypto_data!r}")
+        crypto_data = None
+    current_rates = parse_cbr_xml(cbr_xml) if cbr_xml else None
+    if cbr_xml and current_rates is None:
+        # Не разобрали - забываем хеш, чтобы в следующий раз разобрать заново
+        http_client.validators.pop(CURRENCY_URL, None)
+    if current_rates:
+        cbr_rates[:] = current_rates
+    elif cbr_unchanged:
+        # ЦБ публикует курсы раз в день: current и previous не трогаем, но
+        # прежние курсы идут в историю, иначе окна /trend для валют пустеют
+        for rate in cbr_rates:
+            global_rates.sample(rate.code, rate.unit_rate)
+    return current_rates, crypto_data
+
+def apply_rates(current_rates, data, set_rate):
+    """Записывает курсы ЦБ (все валюты) и монет CoinGecko в global_rates"""
+    if current_rates:
+        for rate in current_rates:
+            cbr_names[rate.code] = rate.name
+            set_rate(rate.code, rate.unit_rate)
+
+    usd = global_rates.rates.get('USD')
+    usd_rate = usd.current if usd is not None else 0
+    if data and not usd_rate:
+        # Без курса доллара цены монет в рублях были бы нулями
+        logger.error("USD rate is not loaded yet, skipping crypto rates")
+    elif data:
+        for coin_id, prices in data.items():
+            if 'usd' in prices:
+                set_rate(coin_key(coin_id), prices['usd'] * usd_rate)
+
+async def initialize_rates():
+    load_rates()
+    current_rates, data = await fetch_rates()
+    apply_rates(current_rates, data, global_rates.initialize)
+
+    if not current_rates:
+        logger.error("Failed to initialize currency rates.")
+    if not data:
         logger.error("Failed to initialize crypto rates.")
 
 def save_rates():
-    with open(RATES_FILE, 'wb') as f:
-        pickle.dump(global_rates, f)
-    logger.info(f"Rates saved to {RATES_FILE}")
+    storage.save_rates({code: (rate.current, rate.previous) for code, rate in global_rates.rates.items()})
+    logger.info(f"Rates saved to {STORAGE_FILE}")
 
 def load_rates():
-    global global_rates
-    if os.path.exists(RATES_FILE):
-        with open(RATES_FILE, 'rb') as f:
-            global_rates = pickle.load(f)
-        logger.info(f"Rates loaded from {RATES_FILE}")
+    saved = storage.load_rates()
+    if saved:
+        global_rates.replace({code: Rate(current, previous) for code, (current, previous) in saved.items()})
+        logger.info(f"Rates loaded from {STORAGE_FILE}")
     else:
-        logger.info("No rates.pkl file found. Initializing rates.")
-
-def save_users():
-    with open(USERS_FILE, 'wb') as f:
-        pickle.dump(active_users, f)
-    logger.info(f"Active users saved to {USERS_FILE}")
+        logger.info("No saved rates found. Initializing rates.")
 
 def load_users():
     global active_users
-    if os.path.exists(USERS_FILE):
-        with open(USERS_FILE, 'rb') as f:
-            active_users = pickle.load(f)
-        logger.info(f"Active users loaded from {USERS_FILE}")
-    else:
-        logger.info("No users.pkl file found. Starting with empty user list.")
+    storage.migrate_pickles(USERS_FILE, RATES_FILE)
+    active_users = storage.load_users()
+    logger.info(f"{len(active_users)} active users loaded from {STORAGE_FILE}")
+    watchlists.load(storage.load_watchlist())
+    alert_engine.load(Alert(*row) for row in storage.load_alerts())
+    logger.info(f"{len(alert_engine)} alerts loaded")
+    logger.info(f"{len(watchlists.by_user)} watchlists with {len(watchlists.counts)} symbols loaded")
 
 async def update_rates_periodically():
     while True:
-        response = requests.get(CURRENCY_URL)
-        response.encoding = "utf-8"
-        current_rates = parse_cbr_xml(response.text)
-
-        if current_rates:
-            for code in ["USD", "EUR", "CNY", "JPY"]:
-                rate = global_rates.get_or_create(code)
-                rate.update(current_rates[code])
-
-        response = requests.get(CRYPTO_URL)
-        data = response.json()
-
-        if data:
-            usd_rate = global_rates.get_or_create('USD').current
-            btc_usd = data['bitcoin']['usd']
-            eth_usd = data['ethereum']['usd']
-            btc_rub = btc_usd * usd_rate
-            eth_rub = eth_usd * usd_rate
-
-            for code, value in [("BTC", btc_rub), ("ETH", eth_rub)]:
-                rate = global_rates.get_or_create(code)
-                rate.update(value)
+        current_rates, data = await fetch_rates()
+        apply_rates(current_rates, data, global_rates.update)
+        fired = check_alerts()
+        if fired:
+            # Не ждём рассылку, чтобы она не задерживала следующее обновление курсов
+            task = asyncio.create_task(notify_alerts(fired))
+            notification_tasks.add(task)
+            task.add_done_callback(notification_done)
 
         save_rates()  
-        await asyncio.sleep(300) 
+        stats = render_cache.stats()
+        logger.info(f"Render cache: {stats['hits']} hits, {stats['misses']} misses, "
+                    f"hit rate {stats['hit_rate']:.1%}")
+        stats = inline_converter.stats()
+        logger.info(f"Inline cache: {stats['hits']} hits, {stats['misses']} misses, "
+                    f"hit rate {stats['hit_rate']:.1%}")
+        logger.info(f"CBR fetches: {http_client.stats['changed']} changed, "
+                    f"{http_client.stats['not_modified']} not modified, "
+                    f"{http_client.stats['unchanged']} unchanged (parse skipped)")
+        await asyncio.sleep(RATES_UPDATE_INTERVAL)
 
 async def scheduled_jobs():
     current_time = datetime.now(moscow_tz).strftime('%H:%M:%S')
     logger.info(f"Running scheduled job at {current_time}")
     logger.info(f"Sending scheduled messages to {len(active_users)} users")
 
-    for user_id in active_users:
-        try:
-            await send_all_rates(user_id)
-            logger.info(f"Successfully sent scheduled message to user {user_id}")
-        except Exception as e:
-            logger.error(f"Error sending scheduled message to user {user_id}: {e}")
+    # Текст одинаков для всех подписчиков, формируем его один раз
+    result = await broadcaster.run(get_all_rates(), list(active_users),
+                                   reply_markup=create_main_keyboard())
+    scheduled_job_seconds.observe(result.elapsed)
+    remove_blocked_users(result)
+
+async def resume_broadcast():
+    result = await broadcaster.resume(list(active_users), reply_markup=create_main_keyboard())
+    if result:
+        remove_blocked_users(result)
+
+def remove_blocked_users(result):
+    if result.blocked:
+        active_users.difference_update(result.blocked)
+        storage.remove_users(result.blocked)
 
 scheduler = AsyncIOScheduler()
 
 async def scheduler_setup():
-    scheduler.add_job(scheduled_jobs, "cron", hour=8, minute=0)
+    scheduler.add_job(scheduled_jobs, "cron", hour=8, minute=0, max_instances=1)
     scheduler.start()
     logger.info("Scheduler started successfully")
 
+def setup_handler_metrics():
+    """Время и ошибки всех обработчиков сообщений и inline-запросов"""
+    handler_metrics = HandlerMetrics()
+    router.message.middleware(handler_metrics)
+    router.inline_query.middleware(handler_metrics)
+
+async def start_metrics() -> Optional[MetricsServer]:
+    if not METRICS_PORT:
+        return None
+    server = MetricsServer()
+    try:
+        await server.start(METRICS_HOST, METRICS_PORT)
+    except OSError as e:
+        # Занятый порт не повод не запускать бота
+        logger.error(f"Failed to start metrics server: {e}")
+        return None
+    return server
+
+async def start_webhook() -> Optional[WebhookServer]:
+    """Сервер webhook или None, если его не удалось поднять (тогда работаем через polling)"""
+    server = WebhookServer(
+        bot, dp, WEBHOOK_PATH, secret=WEBHOOK_SECRET,
+        workers=int(os.getenv('WEBHOOK_WORKERS', DEFAULT_WORKERS)),
+        queue_size=int(os.getenv('WEBHOOK_QUEUE_SIZE', DEFAULT_QUEUE_SIZE))
+    )
+    try:
+        await server.setup(WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+                           max_connections=int(os.getenv('WEBHOOK_MAX_CONNECTIONS', 40)))
+    except Exception as e:
+        logger.error(f"Failed to start webhook, falling back to polling: {e}")
+        return None
+    return server
+
+async def run_webhook(server: WebhookServer):
+    """Работа до SIGINT/SIGTERM, затем остановка с дообработкой принятых обновлений"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await dp.emit_startup(bot=bot)
+    logger.info("Bot is running in webhook mode...")
+    try:
+        await stop.wait()
+    finally:
+        await server.stop()
+        await dp.emit_shutdown(bot=bot)
+        await bot.session.close()
+
+async def run_polling():
+    # Polling не работает, пока у бота установлен webhook (например, от прошлого запуска)
+    await bot.delete_webhook()
+    logger.info("Bot is running in polling mode...")
+    await dp.start_polling(bot)
+
 async def main():
     logger.info("Starting bot...")
+    setup_handler_metrics()
     dp.include_router(router)
+    metrics_server = await start_metrics()
     load_users()  
-    initialize_rates()
+    await initialize_rates()
     await scheduler_setup()
     asyncio.create_task(update_rates_periodically())
     asyncio.create_task(update_crypto_cache()) 
-    logger.info("Bot is running...")
+    asyncio.create_task(resume_broadcast())
     try:
-        await dp.start_polling(bot)
+        server = await start_webhook() if WEBHOOK_URL else None
+        if server is not None:
+            await run_webhook(server)
+        else:
+            await run_polling()
     finally:
         save_rates()  
-        save_users() 
+        storage.close()
+        await http_client.close()
+        if metrics_server is not None:
+            await metrics_server.stop()
 
 if __name__ == "__main__":
     try:
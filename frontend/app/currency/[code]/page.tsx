@@ -117,8 +117,9 @@ export default function CurrencyDetail() {
             const startDateObj = new Date(now.getTime() - days * 24 * 60 * 60 * 1000)
             const startDate = startDateObj.toLocaleDateString("en-GB") // дата начала периода
 
+            // resolution=auto: для длинных периодов API отдаёт недельные или месячные точки
             const res = await fetch(
-              `https://api.heavenlyweiner.ru/api/currencies/${currencyCode}/history_range?start=${startDate}&end=${endDate}`
+              `https://api.heavenlyweiner.ru/api/currencies/${currencyCode}/history_range?start=${startDate}&end=${endDate}&resolution=auto&points=400`
             )
             if (!res.ok) {
                 throw new Error("Ошибка при получении данных графика")
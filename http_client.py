@@ -0,0 +1,116 @@
+import asyncio
+import hashlib
+import logging
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from metrics import upstream_errors, upstream_retries, upstream_seconds
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class HttpClient:
+    """Общий асинхронный HTTP-клиент бота: пул соединений, таймауты и повторы"""
+
+    def __init__(self, timeout: float = 10, retries: int = 3, backoff: float = 0.5,
+                 max_backoff: float = 10, limit: int = 20):
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.limit = limit
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Для условных запросов: URL -> (ETag, Last-Modified, хеш тела)
+        self.validators: Dict[str, Tuple[Optional[str], Optional[str], str]] = {}
+        # changed / not_modified (304) / unchanged (то же тело, разбор пропущен)
+        self.stats = Counter()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # Сессия создаётся лениво внутри работающего цикла событий
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=self.timeout,
+                connector=aiohttp.TCPConnector(limit=self.limit, ttl_dns_cache=300)
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def _delay(self, attempt: int) -> float:
+        """Экспоненциальная задержка с полным джиттером"""
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    async def _request(self, url: str, params: Optional[dict], read, headers: Optional[dict] = None):
+        """Запрос с повторами; время и ошибки пишутся в метрики по хосту"""
+        host = urlsplit(url).hostname or url
+        started = time.perf_counter()
+        try:
+            return await self._attempts(url, params, read, headers, host)
+        except Exception as e:
+            upstream_errors.inc(host, str(e.status) if isinstance(e, aiohttp.ClientResponseError) else type(e).__name__)
+            raise
+        finally:
+            upstream_seconds.observe(time.perf_counter() - started, host)
+
+    async def _attempts(self, url: str, params: Optional[dict], read, headers: Optional[dict], host: str):
+        for attempt in range(self.retries + 1):
+            try:
+                async with self.session.get(url, params=params, headers=headers) as response:
+                    if response.status in RETRY_STATUSES and attempt < self.retries:
+                        logger.warning(f"HTTP {response.status} from {url}, retry {attempt + 1}/{self.retries}")
+                    else:
+                        response.raise_for_status()
+                        return await read(response)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if isinstance(e, aiohttp.ClientResponseError) or attempt >= self.retries:
+                    raise
+                logger.warning(f"Request to {url} failed: {e!r}, retry {attempt + 1}/{self.retries}")
+            upstream_retries.inc(host)
+            await asyncio.sleep(self._delay(attempt))
+
+    async def get_bytes(self, url: str, params: Optional[dict] = None) -> bytes:
+        return await self._request(url, params, lambda response: response.read())
+
+    async def get_changed(self, url: str) -> Optional[bytes]:
+        """Тело ответа или None, если оно не изменилось с прошлого запроса.
+
+        Отправляет If-None-Match/If-Modified-Since, если сервер прислал
+        валидаторы, и сравнивает хеш тела, если не прислал.
+        """
+        etag, last_modified, digest = self.validators.get(url, (None, None, None))
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        async def read(response):
+            return response.status, response.headers, await response.read()
+
+        status, response_headers, body = await self._request(url, None, read, headers)
+        if status == 304:
+            self.stats['not_modified'] += 1
+            return None
+        new_digest = hashlib.sha256(body).hexdigest()
+        self.validators[url] = (response_headers.get('ETag'), response_headers.get('Last-Modified'), new_digest)
+        if new_digest == digest:
+            self.stats['unchanged'] += 1
+            return None
+        self.stats['changed'] += 1
+        return body
+
+    async def get_json(self, url: str, params: Optional[dict] = None) -> Any:
+        return await self._request(url, params, lambda response: response.json(content_type=None))
+
+
+http_client = HttpClient()
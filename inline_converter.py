@@ -0,0 +1,185 @@
+import math
+import re
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from aiogram.types import InlineQueryResultArticle, InputTextMessageContent
+
+# Рубль - база курсов ЦБ, в global_rates его нет
+BASE_CURRENCY = 'RUB'
+BASE_NAME = 'Российский рубль'
+MAX_RESULTS = 20
+# Пары по умолчанию, когда в запросе нет второй валюты или валют вообще
+DEFAULT_FROM = ('USD', 'EUR', 'CNY')
+DEFAULT_TO = ('RUB', 'USD', 'EUR', 'CNY')
+# Порядок среди совпадений по префиксу: "д" - сначала доллар США, потом остальные доллары
+POPULAR = ('RUB', 'USD', 'EUR', 'CNY', 'BTC', 'ETH', 'GBP', 'JPY', 'CHF', 'TRY', 'KZT', 'BYN', 'AED')
+# Длиннее - уже не сумма, а случайный набор цифр
+MAX_AMOUNT_DIGITS = 15
+# Слова между валютами: "100 usd в eur", "100 usd to eur"
+CONNECTORS = {'в', 'во', 'на', 'to', 'in', 'into'}
+
+EN_NAMES = {
+    'AUD': 'Australian Dollar', 'AZN': 'Azerbaijan Manat', 'GBP': 'British Pound Sterling',
+    'AMD': 'Armenian Dram', 'BYN': 'Belarussian Ruble', 'BGN': 'Bulgarian Lev', 'BRL': 'Brazil Real',
+    'HUF': 'Hungarian Forint', 'VND': 'Vietnam Dong', 'HKD': 'Hong Kong Dollar', 'GEL': 'Georgian Lari',
+    'DKK': 'Danish Krone', 'AED': 'UAE Dirham', 'USD': 'US Dollar', 'EUR': 'Euro', 'EGP': 'Egyptian Pound',
+    'INR': 'Indian Rupee', 'IDR': 'Indonesian Rupiah', 'KZT': 'Kazakhstan Tenge', 'CAD': 'Canadian Dollar',
+    'QAR': 'Qatari Riyal', 'KGS': 'Kyrgyzstan Som', 'CNY': 'China Yuan', 'MDL': 'Moldova Lei',
+    'NZD': 'New Zealand Dollar', 'NOK': 'Norwegian Krone', 'PLN': 'Polish Zloty', 'RON': 'Romanian Leu',
+    'XDR': 'SDR', 'SGD': 'Singapore Dollar', 'TJS': 'Tajikistan Ruble', 'THB': 'Thai Baht',
+    'TRY': 'Turkish Lira', 'TMT': 'New Turkmenistan Manat', 'UZS': 'Uzbekistan Sum',
+    'UAH': 'Ukrainian Hryvnia', 'CZK': 'Czech Koruna', 'SEK': 'Swedish Krona', 'CHF': 'Swiss Franc',
+    'RSD': 'Serbian Dinar', 'ZAR': 'S.African Rand', 'KRW': 'Won', 'JPY': 'Japanese Yen',
+    'RUB': 'Russian Ruble', 'BTC': 'Bitcoin', 'ETH': 'Ethereum',
+}
+# Разговорные названия и формы, которых нет в названиях ЦБ
+ALIASES = {
+    'RUB': ('рубль', 'рубли', 'рублей', 'руб', 'р', 'rur', 'ruble', 'rouble'),
+    'USD': ('бакс', 'баксы', 'баксов', 'доллар', 'долларов', 'dollar', 'buck', 'bucks'),
+    'EUR': ('евро', 'euro'),
+    'CNY': ('юань', 'юаней', 'yuan', 'renminbi', 'rmb'),
+    'GBP': ('фунт', 'pound'),
+    'JPY': ('иена', 'йена', 'иен', 'yen'),
+    'BTC': ('биткоин', 'биткойн', 'биток', 'bitcoin', 'xbt'),
+    'ETH': ('эфир', 'эфириум', 'ether', 'ethereum'),
+}
+
+_TOKENS = re.compile(r'\d+(?:[.,]\d+)?|[^\W\d_]+')
+
+
+def normalize(text: str) -> Tuple[str, ...]:
+    """Токены запроса: числа и слова в нижнем регистре, ё -> е"""
+    return tuple(_TOKENS.findall(text.lower().replace('ё', 'е')))
+
+
+def _words(name: str) -> List[str]:
+    words = [word for word in normalize(name) if not word[0].isdigit()]
+    return words + [' '.join(words)] if len(words) > 1 else words
+
+
+def _popularity(symbol: str) -> tuple:
+    return (POPULAR.index(symbol) if symbol in POPULAR else len(POPULAR), symbol)
+
+
+class SymbolIndex:
+    """Символы по всем префиксам кодов, названий и синонимов.
+
+    Каждый префикс заранее сопоставлен упорядоченному списку символов: точные
+    совпадения, затем популярные валюты, затем по алфавиту. Поиск по
+    введённому слову - одно обращение к словарю.
+    """
+
+    def __init__(self, names: Dict[str, str]):
+        """names - {символ: название}; для символа без названия ищется только код"""
+        self.names = names
+        exact: Dict[str, set] = {}
+        prefixes: Dict[str, set] = {}
+        for symbol, name in names.items():
+            keys = {symbol.lower(), *_words(name), *_words(EN_NAMES.get(symbol, '')), *ALIASES.get(symbol, ())}
+            for key in keys:
+                exact.setdefault(key, set()).add(symbol)
+                for end in range(1, len(key) + 1):
+                    prefixes.setdefault(key[:end], set()).add(symbol)
+        self.lookup: Dict[str, Tuple[str, ...]] = {
+            prefix: tuple(sorted(symbols, key=lambda s: (s not in exact.get(prefix, ()), _popularity(s))))
+            for prefix, symbols in prefixes.items()
+        }
+
+    def find(self, word: str, limit: int = 3) -> Tuple[str, ...]:
+        return self.lookup.get(word, ())[:limit]
+
+
+def parse_amount(token: str) -> float:
+    return float(token.replace(',', '.'))
+
+
+def format_amount(value: float) -> str:
+    if value == 0 or abs(value) >= 1:
+        return f"{value:,.2f}"
+    # Доли копейки и крипта: шесть значащих цифр вместо двух знаков после запятой
+    decimals = min(12, 5 - math.floor(math.log10(abs(value))))
+    return f"{value:.{decimals}f}"
+
+
+class InlineConverter:
+    """Ответы на inline-запросы "@bot 100 usd eur" без обращений к сети.
+
+    Курсы берутся из памяти через rate(символ) (рублей за единицу). Готовые
+    списки результатов кэшируются по нормализованному запросу и версии курсов
+    с вытеснением давно не использованных (LRU).
+    """
+
+    def __init__(self, rate: Callable[[str], Optional[float]], max_entries: int = 4096):
+        self.rate = rate
+        self.max_entries = max_entries
+        self.index = SymbolIndex({BASE_CURRENCY: BASE_NAME})
+        self.cache: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def rebuild(self, names: Dict[str, str]):
+        """Новый индекс символов; вызывается, когда меняется набор валют и монет"""
+        self.index = SymbolIndex({BASE_CURRENCY: BASE_NAME, **names})
+        self.cache.clear()
+
+    def answer(self, query: str, version: int) -> List[InlineQueryResultArticle]:
+        tokens = normalize(query)
+        key = (tokens, version)
+        results = self.cache.get(key)
+        if results is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return results
+        self.misses += 1
+        results = self.render(tokens)
+        self.cache[key] = results
+        if len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+        return results
+
+    def pairs(self, tokens: Sequence[str]) -> Tuple[float, List[Tuple[str, str]]]:
+        """Сумма и пары (из, в) по токенам запроса"""
+        amount = 1.0
+        words = []
+        for token in tokens:
+            if token[0].isdigit():
+                if len(token) <= MAX_AMOUNT_DIGITS:
+                    amount = parse_amount(token)
+            elif not (words and token in CONNECTORS):
+                words.append(token)
+        from_symbols = self.index.find(words[0]) if words else DEFAULT_FROM
+        to_symbols = self.index.find(words[1], limit=5) if len(words) > 1 else DEFAULT_TO
+        return amount, [(a, b) for a in from_symbols for b in to_symbols if a != b]
+
+    def render(self, tokens: Sequence[str]) -> List[InlineQueryResultArticle]:
+        amount, pairs = self.pairs(tokens)
+        results = []
+        for from_symbol, to_symbol in pairs[:MAX_RESULTS]:
+            from_rate, to_rate = self.unit_rate(from_symbol), self.unit_rate(to_symbol)
+            if not from_rate or not to_rate:
+                continue
+            rate = from_rate / to_rate
+            line = f"{format_amount(amount)} {from_symbol} = {format_amount(amount * rate)} {to_symbol}"
+            results.append(InlineQueryResultArticle(
+                id=f"{from_symbol}:{to_symbol}:{amount:g}"[:64],
+                title=line,
+                description=f"{self.index.names.get(from_symbol, from_symbol)} → "
+                            f"{self.index.names.get(to_symbol, to_symbol)}, 1 {from_symbol} = {format_amount(rate)} {to_symbol}",
+                input_message_content=InputTextMessageContent(
+                    message_text=f"💱 {line}\nКурс: 1 {from_symbol} = {format_amount(rate)} {to_symbol}"
+                )
+            ))
+        return results
+
+    def unit_rate(self, symbol: str) -> Optional[float]:
+        return 1.0 if symbol == BASE_CURRENCY else self.rate(symbol)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0.0}
+
+
+def symbol_names(symbols: Iterable[str], cbr_names: Dict[str, str]) -> Dict[str, str]:
+    """Названия для индекса: валюты ЦБ по-русски из ответа ЦБ, монеты - по-английски или id"""
+    return {symbol: cbr_names.get(symbol) or EN_NAMES.get(symbol, symbol) for symbol in symbols}
@@ -0,0 +1,258 @@
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiogram import BaseMiddleware
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержек, секунды
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+UPSTREAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Как часто монитор цикла событий проверяет, вовремя ли он проснулся
+LAG_INTERVAL = 0.1
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    """Метрика с метками; значения по каждому набору меток хранятся в словаре"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _labels(self, values: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = [*zip(self.labelnames, values), *extra]
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{self._labels(labels)} {_format_value(value)}" for labels, value in self.values.items()]
+
+
+class Gauge(Metric):
+    """Значение, заданное set() или вычисляемое функцией в момент чтения метрик"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Labels, float] = {}
+        self.function = function
+
+    def set(self, value: float, *labels: str):
+        self.values[labels] = value
+
+    def samples(self) -> List[str]:
+        if self.function is not None:
+            return [f"{self.name} {_format_value(self.function())}"]
+        return [f"{self.name}{self._labels(labels)} {_format_value(value)}" for labels, value in self.values.items()]
+
+
+class Histogram(Metric):
+    """Гистограмма с фиксированными корзинами.
+
+    observe() увеличивает одну корзину (поиск делением пополам), накопленные
+    суммы по корзинам, как их ждёт Prometheus, считаются только при чтении.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # Метки -> [счётчики корзин (последняя - +Inf), сумма]
+        self.values: Dict[Labels, list] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self.values.get(labels)
+        return sum(series[0]) if series else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._labels(labels, (('le', _format_value(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              function: Optional[Callable[[], float]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # Ошибка в функции одной метрики не должна ломать весь ответ
+                logger.error(f"Failed to render metric {metric.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+handler_seconds = registry.histogram(
+    "bot_handler_duration_seconds", "Время обработки обновления обработчиком", ("handler",))
+handler_errors = registry.counter(
+    "bot_handler_errors_total", "Исключения в обработчиках", ("handler",))
+upstream_seconds = registry.histogram(
+    "bot_upstream_request_duration_seconds", "Время запроса к внешнему API вместе с повторами",
+    ("host",), UPSTREAM_BUCKETS)
+upstream_errors = registry.counter(
+    "bot_upstream_errors_total", "Неудачные запросы к внешним API после всех повторов", ("host", "error"))
+upstream_retries = registry.counter(
+    "bot_upstream_retries_total", "Повторы запросов к внешним API", ("host",))
+loop_lag_seconds = registry.histogram(
+    "bot_event_loop_lag_seconds", "Опоздание пробуждения цикла событий относительно таймера")
+loop_lag_max = registry.gauge(
+    "bot_event_loop_lag_max_seconds", "Наибольшее опоздание цикла событий с прошлого чтения метрик")
+
+
+class HandlerMetrics(BaseMiddleware):
+    """Внутренний middleware aiogram: время и ошибки по имени функции-обработчика"""
+
+    async def __call__(self, handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+                       event: Any, data: Dict[str, Any]) -> Any:
+        name = data["handler"].callback.__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            handler_errors.inc(name)
+            raise
+        finally:
+            handler_seconds.observe(time.perf_counter() - started, name)
+
+
+class LoopLagMonitor:
+    """Спит по interval секунд и замеряет, насколько позже просыпается.
+
+    Опоздание - время, на которое цикл событий был занят чужим кодом, например
+    блокирующим requests.get или тяжёлым разбором в корутине.
+    """
+
+    def __init__(self, interval: float = LAG_INTERVAL):
+        self.interval = interval
+        self.max_lag = 0.0
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - started - self.interval)
+            loop_lag_seconds.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def take_max(self) -> float:
+        """Наибольшее опоздание с прошлого вызова"""
+        lag, self.max_lag = self.max_lag, 0.0
+        return lag
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+
+class MetricsServer:
+    """GET /metrics в текстовом формате Prometheus; заодно запускает монитор цикла событий"""
+
+    def __init__(self, metrics_registry: Registry = registry, lag_interval: float = LAG_INTERVAL):
+        self.registry = metrics_registry
+        self.lag_monitor = LoopLagMonitor(lag_interval)
+        self.runner: Optional[web.AppRunner] = None
+        self.port: Optional[int] = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        loop_lag_max.set(self.lag_monitor.take_max())
+        return web.Response(body=self.registry.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+    async def start(self, host: str, port: int):
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        self.port = self.runner.addresses[0][1]
+        self.lag_monitor.start()
+        logger.info(f"Metrics available at http://{host}:{self.port}/metrics")
+
+    async def stop(self):
+        await self.lag_monitor.stop()
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
@@ -0,0 +1,89 @@
+import time
+from array import array
+from bisect import bisect_left
+from typing import List, NamedTuple, Optional
+
+# Курсы обновляются раз в 5 минут: 288 замеров = сутки
+DEFAULT_DEPTH = 288
+
+
+class WindowStats(NamedTuple):
+    count: int
+    first: float
+    last: float
+    low: float
+    high: float
+    mean: float
+
+    @property
+    def change(self) -> float:
+        return self.last - self.first
+
+    @property
+    def change_percent(self) -> float:
+        return (self.last - self.first) / self.first * 100 if self.first else 0.0
+
+
+class RateHistory:
+    """Кольцевой буфер последних depth замеров курса одной валюты.
+
+    Время и значения лежат в двух массивах double фиксированного размера,
+    поэтому память не растёт после заполнения, а добавление - O(1).
+    """
+
+    __slots__ = ('depth', 'timestamps', 'values', 'start', 'size')
+
+    def __init__(self, depth: int = DEFAULT_DEPTH):
+        self.depth = depth
+        self.timestamps = array('d', bytes(8 * depth))
+        self.values = array('d', bytes(8 * depth))
+        self.start = 0
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def append(self, value: float, timestamp: Optional[float] = None):
+        if timestamp is None:
+            timestamp = time.time()
+        if self.size < self.depth:
+            i = (self.start + self.size) % self.depth
+            self.size += 1
+        else:
+            # Буфер заполнен: перезаписываем самый старый замер
+            i = self.start
+            self.start = (self.start + 1) % self.depth
+        self.timestamps[i] = timestamp
+        self.values[i] = value
+
+    def _timestamp_at(self, i: int) -> float:
+        return self.timestamps[(self.start + i) % self.depth]
+
+    def _segments(self, lo: int) -> List[array]:
+        """Значения с логического индекса lo до конца одним или двумя срезами"""
+        begin = self.start + lo
+        end = self.start + self.size
+        if end <= self.depth:
+            return [self.values[begin:end]]
+        if begin >= self.depth:
+            return [self.values[begin - self.depth:end - self.depth]]
+        return [self.values[begin:], self.values[:end - self.depth]]
+
+    def window(self, seconds: float, now: Optional[float] = None) -> Optional[WindowStats]:
+        """Статистика за последние seconds секунд, None если замеров нет"""
+        if not self.size:
+            return None
+        since = (time.time() if now is None else now) - seconds
+        lo = bisect_left(range(self.size), since, key=self._timestamp_at)
+        if lo == self.size:
+            return None
+        segments = self._segments(lo)
+        count = self.size - lo
+        return WindowStats(
+            count=count,
+            first=segments[0][0],
+            last=segments[-1][-1],
+            low=min(min(segment) for segment in segments),
+            high=max(max(segment) for segment in segments),
+            mean=sum(sum(segment) for segment in segments) / count
+        )
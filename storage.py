@@ -0,0 +1,152 @@
+import logging
+import os
+import pickle
+import sqlite3
+from typing import Dict, Iterable, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _LegacyObject:
+    """Заглушка для классов из старых pickle-файлов (Rate, GlobalRates)"""
+
+
+class _LegacyUnpickler(pickle.Unpickler):
+    # Бот запускается как __main__, поэтому классы в pickle записаны под этим модулем
+    def find_class(self, module, name):
+        if name in ('Rate', 'GlobalRates'):
+            return _LegacyObject
+        return super().find_class(module, name)
+
+
+def _load_pickle(path: str):
+    with open(path, 'rb') as f:
+        return _LegacyUnpickler(f).load()
+
+
+class BotStorage:
+    """Подписчики и последние курсы бота в SQLite (WAL).
+
+    Подписка и отписка - одна строка в таблице вместо перезаписи всего
+    файла, каждая запись атомарна за счёт транзакции.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY
+            );
+            CREATE TABLE IF NOT EXISTS rates (
+                code TEXT PRIMARY KEY,
+                current REAL NOT NULL,
+                previous REAL
+            );
+            CREATE TABLE IF NOT EXISTS watchlist (
+                user_id INTEGER NOT NULL,
+                symbol TEXT NOT NULL,
+                PRIMARY KEY (user_id, symbol)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS alerts (
+                alert_id INTEGER PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                symbol TEXT NOT NULL,
+                direction TEXT NOT NULL,
+                threshold REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_alerts_user ON alerts (user_id);
+        """)
+
+    def close(self):
+        self.conn.close()
+
+    def add_user(self, user_id: int):
+        with self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO users (user_id) VALUES (?)", (user_id,))
+
+    def remove_user(self, user_id: int):
+        with self.conn:
+            self.conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+
+    def add_users(self, user_ids: Iterable[int]):
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO users (user_id) VALUES (?)",
+                                  ((user_id,) for user_id in user_ids))
+
+    def remove_users(self, user_ids: Iterable[int]):
+        with self.conn:
+            self.conn.executemany("DELETE FROM users WHERE user_id = ?", ((user_id,) for user_id in user_ids))
+
+    def load_users(self) -> Set[int]:
+        return {user_id for user_id, in self.conn.execute("SELECT user_id FROM users")}
+
+    def add_watch(self, user_id: int, symbol: str):
+        with self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO watchlist (user_id, symbol) VALUES (?, ?)", (user_id, symbol))
+
+    def remove_watch(self, user_id: int, symbol: str):
+        with self.conn:
+            self.conn.execute("DELETE FROM watchlist WHERE user_id = ? AND symbol = ?", (user_id, symbol))
+
+    def load_watchlist(self) -> List[Tuple[int, str]]:
+        return self.conn.execute("SELECT user_id, symbol FROM watchlist").fetchall()
+
+    def add_alert(self, user_id: int, symbol: str, direction: str, threshold: float) -> int:
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO alerts (user_id, symbol, direction, threshold) VALUES (?, ?, ?, ?)",
+                (user_id, symbol, direction, threshold)
+            )
+        return cursor.lastrowid
+
+    def remove_alerts(self, alert_ids: Iterable[int]):
+        with self.conn:
+            self.conn.executemany("DELETE FROM alerts WHERE alert_id = ?", ((alert_id,) for alert_id in alert_ids))
+
+    def user_alerts(self, user_id: int) -> List[Tuple[int, int, str, str, float]]:
+        return self.conn.execute(
+            "SELECT alert_id, user_id, symbol, direction, threshold FROM alerts WHERE user_id = ? ORDER BY alert_id",
+            (user_id,)
+        ).fetchall()
+
+    def load_alerts(self) -> List[Tuple[int, int, str, str, float]]:
+        return self.conn.execute("SELECT alert_id, user_id, symbol, direction, threshold FROM alerts").fetchall()
+
+    def save_rates(self, rates: Dict[str, Tuple[float, float]]):
+        """rates - {код: (current, previous)}, сохраняются одной транзакцией"""
+        with self.conn:
+            self.conn.executemany("""
+                INSERT INTO rates (code, current, previous) VALUES (?, ?, ?)
+                ON CONFLICT (code) DO UPDATE SET current = excluded.current, previous = excluded.previous
+            """, ((code, current, previous) for code, (current, previous) in rates.items()))
+
+    def load_rates(self) -> Dict[str, Tuple[float, float]]:
+        return {code: (current, previous)
+                for code, current, previous in self.conn.execute("SELECT code, current, previous FROM rates")}
+
+    def is_empty(self) -> bool:
+        return (self.conn.execute("SELECT 1 FROM users LIMIT 1").fetchone() is None
+                and self.conn.execute("SELECT 1 FROM rates LIMIT 1").fetchone() is None)
+
+    def migrate_pickles(self, users_file: str, rates_file: str) -> bool:
+        """Переносит users.pkl и rates.pkl в базу, старые файлы переименовываются в *.migrated"""
+        files = [path for path in (users_file, rates_file) if os.path.exists(path)]
+        if not files:
+            return False
+        if not self.is_empty():
+            logger.warning(f"Storage {self.path} is not empty, skipping migration of {', '.join(files)}")
+            return False
+
+        # Сначала читаем оба файла, чтобы битый pickle не оставил базу заполненной наполовину
+        users = _load_pickle(users_file) if os.path.exists(users_file) else set()
+        rates = _load_pickle(rates_file).rates if os.path.exists(rates_file) else {}
+        self.add_users(users)
+        self.save_rates({code: (rate.current, rate.previous) for code, rate in rates.items()})
+        logger.info(f"Migrated {len(users)} users and {len(rates)} rates from pickle files")
+
+        for path in files:
+            os.replace(path, path + '.migrated')
+        return True
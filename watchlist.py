@@ -0,0 +1,77 @@
+from collections import Counter
+from typing import Dict, Iterable, List, Set
+
+# Монеты, которые бот показывает всем, и их ключи в GlobalRates
+DEFAULT_COINS = {'bitcoin': 'BTC', 'ethereum': 'ETH'}
+# Тикеры, которые пользователи вводят вместо id CoinGecko
+COIN_ALIASES = {'btc': 'bitcoin', 'eth': 'ethereum'}
+
+# Ограничение на длину списка ids в одном запросе simple/price
+MAX_IDS_LENGTH = 1500
+
+
+def is_currency(symbol: str) -> bool:
+    """Коды ЦБ хранятся заглавными буквами, id CoinGecko - строчными"""
+    return symbol.isupper()
+
+
+def coin_key(coin_id: str) -> str:
+    return DEFAULT_COINS.get(coin_id, coin_id)
+
+
+def chunk_ids(coin_ids: Iterable[str], max_length: int = MAX_IDS_LENGTH) -> List[List[str]]:
+    """Разбивает ids на группы, чтобы параметр ids=a,b,c не превышал max_length"""
+    chunks, chunk, length = [], [], 0
+    for coin_id in sorted(coin_ids):
+        if chunk and length + len(coin_id) + 1 > max_length:
+            chunks.append(chunk)
+            chunk, length = [], 0
+        chunk.append(coin_id)
+        length += len(coin_id) + 1
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+class Watchlists:
+    """Списки отслеживаемых символов пользователей.
+
+    Счётчик подписчиков на каждый символ даёт объединение всех списков без
+    обхода пользователей, поэтому обновление курсов зависит только от числа
+    разных символов.
+    """
+
+    def __init__(self):
+        self.by_user: Dict[int, Set[str]] = {}
+        self.counts: Counter = Counter()
+
+    def load(self, items: Iterable[tuple]):
+        for user_id, symbol in items:
+            self.add(user_id, symbol)
+
+    def add(self, user_id: int, symbol: str) -> bool:
+        symbols = self.by_user.setdefault(user_id, set())
+        if symbol in symbols:
+            return False
+        symbols.add(symbol)
+        self.counts[symbol] += 1
+        return True
+
+    def remove(self, user_id: int, symbol: str) -> bool:
+        symbols = self.by_user.get(user_id)
+        if not symbols or symbol not in symbols:
+            return False
+        symbols.remove(symbol)
+        if not symbols:
+            del self.by_user[user_id]
+        self.counts[symbol] -= 1
+        if not self.counts[symbol]:
+            del self.counts[symbol]
+        return True
+
+    def of(self, user_id: int) -> List[str]:
+        return sorted(self.by_user.get(user_id, ()))
+
+    def coins(self) -> Set[str]:
+        """id всех монет, которые нужно запрашивать у CoinGecko"""
+        return set(DEFAULT_COINS) | {symbol for symbol in self.counts if not is_currency(symbol)}
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+from collections import Counter
+from typing import List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 64
+DEFAULT_QUEUE_SIZE = 1024
+# Столько запрос Telegram ждёт места в очереди; потом 503, и Telegram повторит доставку позже
+ENQUEUE_TIMEOUT = 5.0
+# Столько при остановке дорабатываются уже принятые обновления
+DRAIN_TIMEOUT = 30.0
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def shard_key(update: Update) -> int:
+    """Чат обновления (или пользователь, или само обновление, если их нет)"""
+    try:
+        event = update.event
+    except LookupError:
+        # Тип обновления неизвестен этой версии aiogram
+        return update.update_id
+    chat = getattr(event, "chat", None) or getattr(getattr(event, "message", None), "chat", None)
+    if chat is not None:
+        return chat.id
+    user = getattr(event, "from_user", None)
+    return user.id if user is not None else update.update_id
+
+
+class UpdatePipeline:
+    """Ограниченный пул обработчиков обновлений.
+
+    Обновления раскладываются по очередям воркеров по чату, поэтому сообщения
+    одного чата обрабатываются по порядку, а разных чатов - параллельно.
+    Очереди ограничены: когда они заполнены, submit ждёт места, а по таймауту
+    отказывает, и источник обновлений сам притормаживает.
+    """
+
+    def __init__(self, bot: Bot, dp: Dispatcher, workers: int = DEFAULT_WORKERS,
+                 queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.bot = bot
+        self.dp = dp
+        self.queues = [asyncio.Queue(max(1, queue_size // workers)) for _ in range(workers)]
+        self.tasks: List[asyncio.Task] = []
+        self.accepting = False
+        # processed / failed / rejected / dropped
+        self.stats = Counter()
+
+    def start(self):
+        self.tasks = [asyncio.create_task(self._worker(queue)) for queue in self.queues]
+        self.accepting = True
+
+    def pending(self) -> int:
+        return sum(queue.qsize() for queue in self.queues)
+
+    async def submit(self, update: Update, timeout: float = ENQUEUE_TIMEOUT) -> bool:
+        """Постановка в очередь своего чата; False - пул остановлен или переполнен"""
+        if not self.accepting:
+            self.stats['rejected'] += 1
+            return False
+        queue = self.queues[shard_key(update) % len(self.queues)]
+        try:
+            await asyncio.wait_for(queue.put(update), timeout)
+        except asyncio.TimeoutError:
+            self.stats['rejected'] += 1
+            return False
+        return True
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            update = await queue.get()
+            try:
+                await self.dp.feed_update(self.bot, update)
+                self.stats['processed'] += 1
+            except Exception as e:
+                self.stats['failed'] += 1
+                logger.exception(f"Update {update.update_id} failed: {e}")
+            finally:
+                queue.task_done()
+
+    async def drain(self, timeout: float = DRAIN_TIMEOUT):
+        """Перестаёт принимать обновления и дожидается обработки принятых"""
+        self.accepting = False
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self.queues)), timeout)
+        except asyncio.TimeoutError:
+            dropped = self.pending()
+            self.stats['dropped'] += dropped
+            logger.warning(f"Drain timed out, {dropped} updates dropped")
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+
+class WebhookServer:
+    """aiohttp-сервер, принимающий обновления Telegram в UpdatePipeline.
+
+    На запрос Telegram отвечаем, как только обновление встало в очередь; при
+    переполнении - 503, и Telegram доставит его повторно. Следующие запросы
+    Telegram не шлёт, пока не получит ответы на max_connections текущих.
+    """
+
+    def __init__(self, bot: Bot, dp: Dispatcher, path: str = "/webhook", secret: Optional[str] = None,
+                 workers: int = DEFAULT_WORKERS, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 enqueue_timeout: float = ENQUEUE_TIMEOUT):
+        self.bot = bot
+        self.dp = dp
+        self.path = path
+        self.secret = secret
+        self.enqueue_timeout = enqueue_timeout
+        self.pipeline = UpdatePipeline(bot, dp, workers, queue_size)
+        self.runner: Optional[web.AppRunner] = None
+        self.port: Optional[int] = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret and request.headers.get(SECRET_HEADER) != self.secret:
+            return web.Response(status=401)
+        update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        if await self.pipeline.submit(update, self.enqueue_timeout):
+            return web.Response()
+        return web.Response(status=503)
+
+    async def start(self, host: str, port: int):
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        self.pipeline.start()
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        self.port = self.runner.addresses[0][1]
+        logger.info(f"Webhook server listening on {host}:{self.port}{self.path}")
+
+    async def setup(self, host: str, port: int, url: str, max_connections: int = 40):
+        """Запуск сервера и регистрация webhook; при ошибке сервер останавливается"""
+        await self.start(host, port)
+        try:
+            await self.bot.set_webhook(url, secret_token=self.secret, max_connections=max_connections,
+                                       allowed_updates=self.dp.resolve_used_update_types())
+        except Exception:
+            await self.stop()
+            raise
+        logger.info(f"Webhook set to {url}")
+
+    async def stop(self, drain_timeout: float = DRAIN_TIMEOUT):
+        """Остановка: сервер закрывается, принятые обновления дорабатываются.
+
+        Webhook в Telegram не снимается: пока бот перезапускается, Telegram
+        копит обновления и доставит их новому процессу.
+        """
+        if self.runner is not None:
+            # Ждёт запросы, которые уже ставят обновления в очередь
+            await self.runner.cleanup()
+            self.runner = None
+        await self.pipeline.drain(drain_timeout)
+        logger.info(f"Webhook server stopped: {self.pipeline.stats['processed']} processed, "
+                    f"{self.pipeline.stats['failed']} failed, {self.pipeline.stats['rejected']} rejected")